@@ -0,0 +1,36 @@
+from comparador.apply import DEFAULT_APPLY_BATCH_SIZE, DirectApply, apply_differences, apply_store
+from comparador.catalog import (
+    DEFAULT_CATALOG_TTL, CatalogCache, CommonTableMatcher, count_rows, detect_primary_key, fetch_column_names,
+    fetch_text_columns, iter_tables, list_columns, list_common_tables, list_tables
+)
+from comparador.checkpoint import (
+    DEFAULT_CHECKPOINT_DIR, DEFAULT_CHECKPOINT_RANGES, Checkpoint, CheckpointedComparison, checkpoint_path,
+    latest_checkpoint
+)
+from comparador.connections import (
+    DEFAULT_RETRIES, ConnectionPool, PooledConnection, connect_dsn, is_connection_error, retry_delays
+)
+from comparador.checksum import DEFAULT_CHECKSUM_ROWS, changed_ranges, common_dialect, detect_dialect
+from comparador.fetch import DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE, iter_batches, iter_rows, prefetch
+from comparador.multiset import (
+    DEFAULT_SPILL_PARTITIONS, MultisetComparison, SpillPartitions, multiset_differences
+)
+from comparador.partition import (
+    DEFAULT_MAX_CONNECTIONS, DEFAULT_PARTITIONS, PartitionedComparison, partition_ranges
+)
+from comparador.processes import DEFAULT_PROCESSES, ProcessPool, pack_batch, row_digest
+from comparador.progress import Progress, ProgressReporter, format_progress
+from comparador.render import (
+    EXTENSIONS, RENDERERS, render_csv, render_insert, render_json, render_value, render_values
+)
+from comparador.results import ResultFile, ResultStore, format_column_counts
+from comparador.rules import CompareRules, parse_rules
+from comparador.schema import Schema, canonical
+from comparador.snapshot import DEFAULT_SNAPSHOT_DIR, IncrementalComparison, Snapshot, snapshot_path
+from comparador.sql import NULL_RANGE, build_select, key_order, keys_condition, range_condition
+from comparador.sync import (
+    DB1_TO_DB2, DB2_TO_DB1, DEFAULT_SYNC_BATCH_SIZE, SyncScript, export_sync, sync_statements, write_sync_script
+)
+from comparador.engine import (
+    CHANGED, ONLY_DB1, ONLY_DB2, Comparison, compare_table, merge_join, resolve_key_columns
+)
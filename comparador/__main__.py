@@ -0,0 +1,5 @@
+import sys
+
+from comparador.cli import main
+
+sys.exit(main())
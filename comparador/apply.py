@@ -0,0 +1,131 @@
+"""Aplicação direta das diferenças no banco de destino.
+
+Em vez de gerar um script para colar em um cliente SQL, executa comandos
+parametrizados com executemany (fast_executemany no pyodbc), agrupados por
+texto do comando e confirmados em transações de batch_size diferenças. Os
+valores vão como parâmetros, sem montar literais SQL à mão.
+"""
+from comparador.connections import connect_dsn
+from comparador.engine import CHANGED, ONLY_DB1, ONLY_DB2
+from comparador.progress import ProgressReporter
+from comparador.sync import DB1_TO_DB2, SyncScript, check_store, oriented, oriented_schemas, target_name
+
+# Diferenças por transação
+DEFAULT_APPLY_BATCH_SIZE = 1000
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+class DirectApply:
+    # Acumula os parâmetros de cada comando e executa cada grupo com um único
+    # executemany: primeiro os DELETEs, depois os UPDATEs e por fim os INSERTs
+    def __init__(self, cursor, table_name, source, target, key_columns):
+        self.cursor = cursor
+        self.table_name = table_name
+        # Mesmo pareamento de colunas e chave do script de sincronização
+        self.script = SyncScript(table_name, source, target, key_columns)
+        names = [target.names[j] for _, j, _ in self.script.pairs]
+        self.insert_sql = f"INSERT INTO {table_name} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        self.groups = {DELETE: {}, UPDATE: {}, INSERT: {}}
+
+    def key_condition(self, row):
+        # Partes nulas da chave usam IS NULL, pois "= ?" com NULL nunca casa
+        conditions, params = [], []
+        for index in self.script.key_indexes:
+            name = self.script.target.names[index]
+            if row[index] is None:
+                conditions.append(f"{name} IS NULL")
+            else:
+                conditions.append(f"{name} = ?")
+                params.append(row[index])
+        return " AND ".join(conditions), params
+
+    def add(self, kind, source_row, target_row):
+        # kind já é relativo à direção (veja sync.oriented)
+        if kind == ONLY_DB1:
+            self.queue(INSERT, self.insert_sql, [source_row[i] for i, _, _ in self.script.pairs])
+        elif kind == ONLY_DB2:
+            condition, params = self.key_condition(target_row)
+            self.queue(DELETE, f"DELETE FROM {self.table_name} WHERE {condition}", params)
+        elif kind == CHANGED:
+            changed = self.script.changed_pairs(source_row, target_row)
+            if changed:
+                condition, params = self.key_condition(target_row)
+                assignments = ", ".join(f"{self.script.target.names[j]} = ?" for _, j in changed)
+                self.queue(UPDATE, f"UPDATE {self.table_name} SET {assignments} WHERE {condition}",
+                           [source_row[i] for i, _ in changed] + params)
+
+    def queue(self, group, sql, params):
+        self.groups[group].setdefault(sql, []).append(params)
+
+    def execute(self):
+        # Executa o que está pendente e retorna quantas linhas de cada tipo foram enviadas
+        counts = {}
+        for group, statements in self.groups.items():
+            counts[group] = 0
+            for sql, params in statements.items():
+                self.cursor.executemany(sql, params)
+                counts[group] += len(params)
+            statements.clear()
+        return counts
+
+
+def apply_differences(connection, differences, table_name, schema1, schema2, key_columns, direction=DB1_TO_DB2,
+                      batch_size=DEFAULT_APPLY_BATCH_SIZE, atomic=False, progress=None):
+    # Aplica as diferenças (tipo, linha_db1, linha_db2) na conexão do banco de destino.
+    # Cada lote de batch_size diferenças é confirmado ao terminar; com atomic, tudo
+    # fica em uma única transação. Em caso de erro a transação aberta é desfeita
+    # e a exceção é repassada. Retorna as linhas inseridas, alteradas e apagadas.
+    source, target = oriented_schemas(schema1, schema2, direction)
+    cursor = connection.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        # pyodbc: envia os parâmetros de cada executemany em bloco, não linha a linha
+        cursor.fast_executemany = True
+
+    applier = DirectApply(cursor, table_name, source, target, key_columns)
+    counts = {INSERT: 0, UPDATE: 0, DELETE: 0}
+    pending = 0
+
+    def flush():
+        batch_counts = applier.execute()
+        if not atomic:
+            connection.commit()
+        for group, count in batch_counts.items():
+            counts[group] += count
+        if progress:
+            progress.advance(pending)
+
+    try:
+        for kind, source_row, target_row in oriented(differences, direction):
+            applier.add(kind, source_row, target_row)
+            pending += 1
+            if pending >= batch_size:
+                flush()
+                pending = 0
+        flush()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return counts
+
+
+def apply_store(store, direction=DB1_TO_DB2, batch_size=DEFAULT_APPLY_BATCH_SIZE, atomic=False, on_progress=None,
+                connect=connect_dsn):
+    # Aplica no banco de destino as diferenças gravadas em um results.ResultStore;
+    # on_progress recebe um progress.Progress a cada lote confirmado
+    check_store(store)
+    progress = ProgressReporter(len(store), on_progress) if on_progress else None
+    connection = connect(target_name(store.names, direction))
+    try:
+        counts = apply_differences(connection, store.differences(), store.table_name, store.schema1, store.schema2,
+                                   store.key_columns, direction, batch_size, atomic, progress)
+    finally:
+        connection.close()
+    if progress:
+        progress.finish()
+    return counts
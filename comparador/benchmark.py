@@ -0,0 +1,393 @@
+"""Medição de desempenho do motor com tabelas sintéticas.
+
+Gera pares de tabelas com número de linhas, tipos e largura das colunas e
+taxa de diferenças configuráveis, em bancos locais (SQLite, um arquivo por
+banco, pelo sqlite3), em DSNs ODBC (ex.: o driver ODBC do SQLite) ou por
+qualquer função connect(nome) DB-API informada como "módulo:função". Cada
+caso é comparado como na ComparisonThread (PartitionedComparison gravando em
+um ResultStore) em um processo novo, para que o pico de memória seja só o
+dele, e depois exportado. O relatório traz linhas/s, pico de memória (RSS)
+e o tempo de leitura (execute/fetch nos drivers), de comparação (o restante)
+e de formatação (exportação). As medições podem ser gravadas como base e
+comparadas nas próximas execuções, acusando regressões; a base só é usada
+com a mesma configuração (banco, lote, threads, partições e processos). O
+pico de memória inclui o maior processo auxiliar, exceto no Windows.
+
+Uso: python -m comparador.benchmark [--rows N] [--case nome ...] [--save-baseline]
+"""
+import argparse
+import ctypes
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from comparador.connections import connect_dsn
+from comparador.fetch import DEFAULT_BATCH_SIZE
+from comparador.partition import PartitionedComparison
+from comparador.processes import ProcessPool
+from comparador.results import ResultStore
+
+DEFAULT_BASELINE = os.path.join(os.path.expanduser("~"), ".comparador", "benchmark.json")
+# Queda de linhas/s ou aumento de memória, em relação à base, considerado regressão
+DEFAULT_TOLERANCE = 0.15
+# Linhas por executemany ao gerar as tabelas
+_INSERT_BATCH = 5000
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+# Casos padrão: nome -> (linhas, colunas além da chave, fração de linhas diferentes)
+DEFAULT_CASES = {
+    "estreita": (200000, "int,int,real", 0.01),
+    "mista": (100000, "int,text:30,real,decimal,date,datetime", 0.05),
+    "larga": (30000, ",".join(["text:100"] * 20), 0.01),
+    "iguais": (200000, "int,text:20,real", 0.0),
+}
+
+_SQL_TYPES = {"int": "INTEGER", "text": "VARCHAR({width})", "real": "FLOAT", "decimal": "DECIMAL(12, 2)",
+              "date": "DATE", "datetime": "TIMESTAMP"}
+
+
+def parse_columns(text):
+    # "int,text:30,real" -> [("int", None), ("text", 30), ("real", None)]
+    columns = []
+    for item in text.split(","):
+        kind, _, width = item.strip().partition(":")
+        if kind not in _SQL_TYPES:
+            raise ValueError(f"Tipo de coluna desconhecido: {kind} (use {', '.join(_SQL_TYPES)})")
+        columns.append((kind, int(width) if width else (20 if kind == "text" else None)))
+    return columns
+
+
+def column_value(rng, kind, width):
+    if kind == "int":
+        return rng.randrange(10 ** 9)
+    if kind == "text":
+        return "".join(rng.choices(string.ascii_letters, k=width))
+    if kind == "real":
+        return rng.random() * 1e6
+    if kind == "decimal":
+        return round(rng.uniform(-1e6, 1e6), 2)
+    if kind == "date":
+        return f"{rng.randrange(2000, 2030)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+    return (f"{rng.randrange(2000, 2030)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} "
+            f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}")
+
+
+def generate_tables(connect, db1, db2, table_name, rows, columns, difference_rate, seed=0):
+    # Cria a tabela nos dois bancos com as mesmas linhas, menos as diferenças: um terço
+    # alteradas em uma coluna, um terço só no banco 1 e um terço só no banco 2
+    rng = random.Random(seed)
+    names = [f"c{i}" for i in range(1, len(columns) + 1)]
+    definitions = ", ".join(f"{name} {_SQL_TYPES[kind].format(width=width)}"
+                            for name, (kind, width) in zip(names, columns))
+    insert = f"INSERT INTO {table_name} VALUES ({', '.join('?' * (len(columns) + 1))})"
+
+    differences = int(rows * difference_rate)
+    sample = rng.sample(range(rows), 2 * (differences // 3))
+    changed = set(sample[:differences // 3])
+    missing = set(sample[differences // 3:])
+    extra = differences - len(sample)
+
+    connections = [connect(db1), connect(db2)]
+    try:
+        cursors = [conn.cursor() for conn in connections]
+        for cursor in cursors:
+            try:
+                cursor.execute(f"DROP TABLE {table_name}")
+            except Exception:
+                pass
+            cursor.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, {definitions})")
+
+        batches = ([], [])
+        for key in range(rows + extra):
+            row = (key,) + tuple(column_value(rng, kind, width) for kind, width in columns)
+            if key < rows:
+                batches[0].append(row)
+            if key in changed:
+                index = rng.randrange(1, len(row))
+                row = row[:index] + (column_value(rng, *columns[index - 1]),) + row[index + 1:]
+            if key not in missing:
+                batches[1].append(row)
+            for cursor, batch in zip(cursors, batches):
+                if len(batch) >= _INSERT_BATCH:
+                    cursor.executemany(insert, batch)
+                    batch.clear()
+        for cursor, batch in zip(cursors, batches):
+            if batch:
+                cursor.executemany(insert, batch)
+        for conn in connections:
+            conn.commit()
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+class SQLiteDatabases:
+    # connect(nome) para bancos SQLite locais, um arquivo por nome no diretório
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, name):
+        import sqlite3
+        return sqlite3.connect(os.path.join(self.directory, f"{name}.sqlite"), check_same_thread=False)
+
+
+def load_connect(adapter, directory):
+    # "sqlite" (padrão), "odbc" (DSNs) ou "módulo:função" que recebe o nome do banco
+    if adapter == "sqlite":
+        return SQLiteDatabases(directory)
+    if adapter == "odbc":
+        return connect_dsn
+    module, _, function = adapter.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+class FetchTimer:
+    # Soma o tempo gasto dentro do driver (execute e fetch) por todas as threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.seconds += seconds
+
+
+class TimedCursor:
+    _TIMED = ("execute", "executemany", "fetchone", "fetchmany", "fetchall")
+
+    def __init__(self, cursor, timer):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_timer", timer)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if name not in self._TIMED:
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self._timer.add(time.perf_counter() - start)
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class TimedConnection:
+    def __init__(self, connection, timer):
+        self._connection = connection
+        self._timer = timer
+
+    def cursor(self):
+        return TimedCursor(self._connection.cursor(), self._timer)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def peak_rss():
+    # Pico de memória residente deste processo somado ao do maior processo auxiliar (ProcessPool)
+    # já encerrado, em bytes; None se não for possível medir. RUSAGE_CHILDREN traz o pico do maior
+    # filho, não a soma de todos: com -j N, o total real pode chegar a N vezes essa parcela.
+    # No Windows, os processos auxiliares não são contados.
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss():
+    if sys.platform != "win32":
+        return None
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def run_case(adapter, directory, db1, db2, table_name, batch_size, concurrent, partitions, processes):
+    # Executado em um processo novo por caso; retorna as medições
+    connect = load_connect(adapter, directory)
+    timer = FetchTimer()
+    process_pool = ProcessPool(processes) if processes > 0 else None
+    try:
+        comparison = PartitionedComparison(db1, db2, table_name, key_columns=["id"], batch_size=batch_size,
+                                           concurrent=concurrent, connect=lambda name: TimedConnection(
+                                               connect(name), timer),
+                                           process_pool=process_pool, partitions=partitions)
+        start = time.perf_counter()
+        store = comparison.run_to_store(ResultStore(table_name, db1=db1, db2=db2))
+        compare_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="comparador-") as output:
+            store.export(output, "insert", process_pool)
+        render_seconds = time.perf_counter() - start
+        store.release()
+    finally:
+        if process_pool:
+            process_pool.close()
+
+    return {"differences": len(store), "compare_seconds": compare_seconds, "fetch_seconds": timer.seconds,
+            "render_seconds": render_seconds, "peak_rss": peak_rss()}
+
+
+def measure(case_name, rows, columns, difference_rate, args, directory):
+    table_name = f"bench_{case_name}"
+    connect = load_connect(args.adapter, directory)
+    generate_tables(connect, args.db1, args.db2, table_name, rows, parse_columns(columns), difference_rate, args.seed)
+
+    # Um processo novo (spawn) por caso: o pico de memória não inclui a geração nem os casos anteriores
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        result = executor.submit(run_case, args.adapter, directory, args.db1, args.db2, table_name,
+                                 args.batch_size, args.concurrent, args.partitions, args.processes).result()
+    result["rows"] = rows
+    # Linhas dos dois bancos por segundo de comparação, como o progresso da interface
+    result["rows_per_second"] = 2 * rows / result["compare_seconds"] if result["compare_seconds"] else 0.0
+    return result
+
+
+def format_bytes(size):
+    if size is None:
+        return "n/d"
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def baseline_key(name, rows, columns, difference_rate, args):
+    # A base só vale para o mesmo caso, volume e configuração: outro lote, leitura em threads,
+    # partições, processos, banco ou semente mudam o desempenho esperado
+    return (f"{name}/{rows}/{columns}/{difference_rate}/adapter={args.adapter}/seed={args.seed}"
+            f"/batch={args.batch_size}/concurrent={int(args.concurrent)}/partitions={args.partitions}"
+            f"/processes={args.processes}")
+
+
+def compare_baseline(result, baseline, tolerance):
+    # Mensagens de regressão em relação à base do mesmo caso
+    messages = []
+    if baseline.get("rows_per_second") and result["rows_per_second"] < baseline["rows_per_second"] * (1 - tolerance):
+        drop = 1 - result["rows_per_second"] / baseline["rows_per_second"]
+        messages.append(f"linhas/s caiu {drop:.0%} (base {baseline['rows_per_second']:,.0f})")
+    if baseline.get("peak_rss") and result["peak_rss"] and result["peak_rss"] > baseline["peak_rss"] * (1 + tolerance):
+        growth = result["peak_rss"] / baseline["peak_rss"] - 1
+        messages.append(f"memória subiu {growth:.0%} (base {format_bytes(baseline['peak_rss'])})")
+    return messages
+
+
+def load_baselines(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baselines(path, baselines):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="comparador.benchmark",
+                                     description="Mede o desempenho da comparação com tabelas sintéticas.")
+    parser.add_argument("--case", dest="cases", action="append", choices=sorted(DEFAULT_CASES),
+                        help="caso padrão a executar (pode ser repetido; padrão: todos)")
+    parser.add_argument("--columns",
+                        help="caso próprio: colunas além da chave, ex.: 'int,text:40,real,decimal,date,datetime'")
+    parser.add_argument("--differences", type=float, default=0.01,
+                        help="caso próprio: fração de linhas diferentes (padrão: 0.01)")
+    parser.add_argument("--rows", type=int, help="linhas por tabela (substitui as dos casos)")
+    parser.add_argument("--seed", type=int, default=0, help="semente dos dados gerados")
+    parser.add_argument("--adapter", default="sqlite",
+                        help="bancos usados: sqlite (arquivos locais, padrão), odbc (DSNs) ou 'módulo:função' "
+                             "que recebe o nome do banco e devolve uma conexão DB-API")
+    parser.add_argument("--db1", default="bench1", help="nome ou DSN do banco 1 (padrão: bench1)")
+    parser.add_argument("--db2", default="bench2", help="nome ou DSN do banco 2 (padrão: bench2)")
+    parser.add_argument("--directory", help="diretório dos bancos SQLite (padrão: temporário)")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"linhas por fetchmany (padrão: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="lê os dois bancos em threads, como a interface; o tempo de leitura passa a se "
+                             "sobrepor ao de comparação")
+    parser.add_argument("--partitions", type=int, default=1, help="partições da chave por tabela")
+    parser.add_argument("-j", "--processes", type=int, default=0, help="processos auxiliares (padrão: 0)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"arquivo das bases (padrão: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="grava as medições como a nova base")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"variação aceita em relação à base (padrão: {DEFAULT_TOLERANCE})")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.columns:
+        cases = {"proprio": (args.rows or 100000, args.columns, args.differences)}
+    else:
+        cases = {name: DEFAULT_CASES[name] for name in args.cases or DEFAULT_CASES}
+    try:
+        for _, columns, _ in cases.values():
+            parse_columns(columns)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    baselines = load_baselines(args.baseline)
+    regressions = 0
+    with tempfile.TemporaryDirectory(prefix="comparador-bench-") as temporary:
+        directory = args.directory or temporary
+        os.makedirs(directory, exist_ok=True)
+        print(f"{'caso':<10} {'linhas':>9} {'difer.':>7} {'linhas/s':>10} {'RSS pico':>9} "
+              f"{'leitura':>8} {'compar.':>8} {'format.':>8}")
+        for name, (rows, columns, difference_rate) in cases.items():
+            rows = args.rows or rows
+            result = measure(name, rows, columns, difference_rate, args, directory)
+            diff_seconds = max(0.0, result["compare_seconds"] - result["fetch_seconds"])
+            print(f"{name:<10} {rows:>9,} {result['differences']:>7,} {result['rows_per_second']:>10,.0f} "
+                  f"{format_bytes(result['peak_rss']):>9} {result['fetch_seconds']:>7.2f}s {diff_seconds:>7.2f}s "
+                  f"{result['render_seconds']:>7.2f}s")
+
+            key = baseline_key(name, rows, columns, difference_rate, args)
+            for message in compare_baseline(result, baselines.get(key, {}), args.tolerance):
+                print(f"{name}: regressão: {message}")
+                regressions += 1
+            if args.save_baseline:
+                baselines[key] = {"rows_per_second": result["rows_per_second"], "peak_rss": result["peak_rss"]}
+
+    if args.save_baseline:
+        save_baselines(args.baseline, baselines)
+        print(f"Base gravada em {args.baseline}")
+    return EXIT_REGRESSION if regressions else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
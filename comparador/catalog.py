@@ -0,0 +1,194 @@
+"""Consultas ao catálogo dos bancos (chave primária e colunas das tabelas)."""
+import threading
+import time
+
+# Segundos em que as listas de tabelas e colunas de um DSN são reaproveitadas
+DEFAULT_CATALOG_TTL = 300
+# Tabelas lidas do catálogo por vez ao listar em blocos
+DEFAULT_TABLE_CHUNK = 500
+# Tipos que o pyodbc descreve como str, mas que não são texto no banco (SQL Server)
+_NOT_TEXT_TYPES = ("uniqueidentifier", "xml")
+
+
+def split_table_name(table_name):
+    # Separa "schema.tabela" em (schema, tabela); schema vazio vira None
+    schema, _, table = table_name.rpartition(".")
+    return schema or None, table
+
+
+def detect_primary_key(cursor, table_name):
+    # Usa o catálogo ODBC (SQLPrimaryKeys) para descobrir a chave primária.
+    # Drivers ou conexões DB-API sem suporte a primaryKeys retornam lista vazia.
+    schema, table = split_table_name(table_name)
+    try:
+        rows = cursor.primaryKeys(table=table, schema=schema)
+        # Colunas do resultado: table_cat, table_schem, table_name, column_name, key_seq, pk_name
+        key_columns = sorted((row[4], row[3]) for row in rows)
+    except Exception:
+        return []
+    return [column for _, column in key_columns]
+
+
+def fetch_column_names(cursor, table_name):
+    # Lê apenas a descrição do resultado, sem trazer nenhuma linha
+    cursor.execute(f"SELECT * FROM {table_name} WHERE 1 = 0")
+    columns = [column[0] for column in cursor.description]
+    cursor.fetchall()
+    return columns
+
+
+def fetch_text_columns(cursor, table_name, columns, column_types=None):
+    # Colunas de texto entre columns, pelo tipo da descrição do resultado (sem trazer linhas).
+    # column_types (fetch_column_types) descarta as que o driver descreve como str sem serem
+    # texto no banco, onde uma collation não se aplica
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name} WHERE 1 = 0")
+    text_columns = [column for column, description in zip(columns, cursor.description)
+                    if description[1] is str and (column_types or {}).get(column.lower()) not in _NOT_TEXT_TYPES]
+    cursor.fetchall()
+    return text_columns
+
+
+def catalog_columns(cursor, table_name):
+    # Linhas do catálogo ODBC (SQLColumns) da tabela, sem executar nada nela; None sem suporte
+    # a columns. O nome passado ao driver é um padrão (_ e % são curingas), então o
+    # resultado é filtrado pelo nome exato.
+    schema, table = split_table_name(table_name)
+    try:
+        rows = cursor.columns(table=table, schema=schema).fetchall()
+    except Exception:
+        return None
+    # Colunas do resultado: table_cat, table_schem, table_name, column_name, data_type,
+    # type_name (5), ..., ordinal_position (16)
+    return [row for row in rows if row[2].lower() == table.lower()
+            and (schema is None or (row[1] or "").lower() == schema.lower())]
+
+
+def list_columns(cursor, table_name):
+    # Colunas pelo catálogo; sem suporte a columns, lê a descrição
+    rows = catalog_columns(cursor, table_name)
+    if not rows:
+        return fetch_column_names(cursor, table_name)
+    return [row[3] for row in sorted(rows, key=lambda row: row[16])]
+
+
+def fetch_column_types(cursor, table_name):
+    # Nome do tipo no banco (ex.: "uniqueidentifier", "datetime2") de cada coluna, pelo nome em
+    # minúsculas; vazio sem suporte a columns. O tipo Python da descrição não basta: o pyodbc
+    # descreve uniqueidentifier e xml do SQL Server como str
+    return {row[3].lower(): row[5].lower() for row in catalog_columns(cursor, table_name) or ()}
+
+
+def iter_tables(cursor, chunk_size=DEFAULT_TABLE_CHUNK):
+    # Lê a lista de tabelas do catálogo em blocos, para quem mostra o resultado aos poucos
+    rows = cursor.tables(tableType='TABLE')
+    while True:
+        chunk = rows.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield [row.table_name for row in chunk]
+
+
+def list_tables(cursor):
+    return sorted(table for chunk in iter_tables(cursor) for table in chunk)
+
+
+def list_common_tables(cursor1, cursor2):
+    return sorted(set(list_tables(cursor1)) & set(list_tables(cursor2)))
+
+
+class CommonTableMatcher:
+    # Cruza as listas dos dois bancos conforme os blocos chegam: add devolve as
+    # tabelas que acabaram de aparecer nos dois lados (side é 0 ou 1)
+    def __init__(self):
+        self.seen = (set(), set())
+
+    def add(self, side, tables):
+        mine, other = self.seen[side], self.seen[1 - side]
+        new = []
+        for table in tables:
+            if table not in mine:
+                mine.add(table)
+                if table in other:
+                    new.append(table)
+        return new
+
+    def common_tables(self):
+        return sorted(self.seen[0] & self.seen[1])
+
+
+def count_rows(cursor, table_name, sql_condition=""):
+    query = f"SELECT COUNT(*) FROM {table_name}"
+    if sql_condition:
+        query += f" WHERE {sql_condition}"
+    cursor.execute(query)
+    return cursor.fetchone()[0]
+
+
+class CatalogCache:
+    # Listas de tabelas e de colunas por DSN, guardadas por ttl segundos para que
+    # comparações repetidas na mesma sessão não voltem ao catálogo (nem conectem).
+    # connect costuma ser connections.ConnectionPool.connect.
+    def __init__(self, connect, ttl=DEFAULT_CATALOG_TTL, clock=time.monotonic):
+        self.connect = connect
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def cached(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and self.clock() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, self.clock())
+        return value
+
+    def get(self, key, load):
+        value = self.cached(key)
+        if value is None:
+            value = self.store(key, load())
+        return value
+
+    def query(self, dsn, function, *args):
+        conn = self.connect(dsn)
+        try:
+            return function(conn.cursor(), *args)
+        finally:
+            conn.close()
+
+    def tables(self, dsn):
+        return self.get((dsn, "tables"), lambda: self.query(dsn, list_tables))
+
+    def stream_tables(self, dsn, on_chunk):
+        # Como tables(), mas entrega cada bloco a on_chunk conforme chega do catálogo;
+        # com a lista em cache, entrega tudo de uma vez
+        tables = self.cached((dsn, "tables"))
+        if tables is not None:
+            on_chunk(tables)
+            return tables
+
+        conn = self.connect(dsn)
+        try:
+            tables = []
+            for chunk in iter_tables(conn.cursor()):
+                tables += chunk
+                on_chunk(chunk)
+        finally:
+            conn.close()
+        return self.store((dsn, "tables"), sorted(tables))
+
+    def common_tables(self, dsn1, dsn2):
+        return sorted(set(self.tables(dsn1)) & set(self.tables(dsn2)))
+
+    def columns(self, dsn, table_name):
+        return self.get((dsn, "columns", table_name), lambda: self.query(dsn, list_columns, table_name))
+
+    def invalidate(self, dsn=None):
+        # Sem DSN, esquece tudo (ex.: depois de aplicar alterações de estrutura)
+        with self.lock:
+            for key in [key for key in self.entries if dsn is None or key[0] == dsn]:
+                del self.entries[key]
@@ -0,0 +1,240 @@
+"""Comparação retomável, com checkpoint por faixa da chave.
+
+A tabela é dividida em faixas da chave como em partition.py, em mais faixas
+do que as comparadas ao mesmo tempo, para que cada uma seja curta. As
+diferenças de cada faixa vão para um results.ResultStore em um diretório do
+checkpoint e, quando a faixa termina, o arquivo de estado registra que ela
+está concluída. Se a conexão cai no meio de uma faixa, só ela é refeita,
+depois de reconectar com espera crescente (connections.retry_delays); a
+conexão inicial, a contagem e o planejamento das faixas também são repetidos.
+Se a execução inteira é interrompida (queda longa, processo encerrado), a
+próxima com resume=True reaproveita as faixas concluídas e compara só as
+demais. A primeira e a última faixa são abertas (veja partition_ranges) e,
+como as linhas incluídas desde então fora dos limites antigos caem nelas, são
+sempre comparadas de novo ao retomar, assim como a faixa da chave NULL. O
+estado guarda também os argumentos da comparação, para "retomar a última"
+sem informá-los de novo. Ao terminar, o checkpoint é apagado.
+
+O progresso de uma faixa só avança quando ela é concluída, de modo que uma
+faixa refeita não conta duas vezes; as linhas das faixas reaproveitadas,
+gravadas no estado, são contadas uma vez no início.
+"""
+import os
+import pickle
+import shutil
+import threading
+
+from comparador.connections import (
+    DEFAULT_MAX_RETRY_DELAY, DEFAULT_RETRIES, DEFAULT_RETRY_DELAY, is_connection_error, retry_delays
+)
+from comparador.partition import PartitionedComparison
+from comparador.results import ResultStore
+from comparador.sql import NULL_RANGE
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".comparador", "checkpoints")
+# Faixas da chave com checkpoint (no mínimo; partitions maior prevalece)
+DEFAULT_CHECKPOINT_RANGES = 64
+
+_STATE_FILE = "state.pickle"
+
+
+def checkpoint_path(directory, db1, db2, table_name):
+    name = "_".join((db1, db2, table_name))
+    return os.path.join(directory, "".join(c if c.isalnum() or c in "._-" else "_" for c in name))
+
+
+def latest_checkpoint(directory=DEFAULT_CHECKPOINT_DIR):
+    # Argumentos da comparação interrompida mais recente em directory, ou None
+    if not os.path.isdir(directory):
+        return None
+    states = [os.path.join(directory, name, _STATE_FILE) for name in os.listdir(directory)]
+    states = [path for path in states if os.path.exists(path)]
+    if not states:
+        return None
+    state = Checkpoint(os.path.dirname(max(states, key=os.path.getmtime))).load()
+    return state and state["arguments"]
+
+
+class Checkpoint:
+    # Diretório com o arquivo de estado e um ResultStore por faixa concluída
+    def __init__(self, path):
+        self.path = path
+        self.state = None
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, _STATE_FILE), "rb") as file:
+                self.state = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.state = None
+        return self.state
+
+    def start(self, signature, arguments, ranges):
+        self.clear()
+        self.state = {"signature": signature, "arguments": arguments, "ranges": ranges, "done": {}, "progress": {}}
+        self.save()
+        return self.state
+
+    def save(self):
+        # Grava em um arquivo temporário e troca, para nunca deixar um estado pela metade
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, _STATE_FILE)
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(self.state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def store_directory(self, number):
+        return os.path.join(self.path, f"partition_{number}")
+
+    def done(self, number):
+        # Arquivo .meta do resultado da faixa, se ela já foi concluída
+        return self.state["done"].get(number)
+
+    def mark_done(self, number, meta_path, progress=(0, 0)):
+        # progress: (linhas, bytes) lidos na faixa, para o progresso de uma execução retomada
+        self.state["done"][number] = os.path.relpath(meta_path, self.path)
+        self.state.setdefault("progress", {})[number] = progress
+        self.save()
+
+    def done_progress(self):
+        # (linhas, bytes) somados das faixas concluídas; estados antigos não têm a contagem
+        counts = [self.state.get("progress", {}).get(number, (0, 0)) for number in self.state["done"]]
+        return sum(rows for rows, _ in counts), sum(nbytes for _, nbytes in counts)
+
+    def reopen(self, numbers):
+        # Faixas concluídas que devem ser comparadas de novo
+        for number in numbers:
+            if self.state["done"].pop(number, None):
+                self.state.get("progress", {}).pop(number, None)
+                shutil.rmtree(self.store_directory(number), ignore_errors=True)
+        self.save()
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class PartitionProgress:
+    # Linhas e bytes de uma tentativa de faixa, no lugar do ProgressReporter: só são repassados
+    # a ele quando a faixa é concluída. Os lotes dos dois bancos podem chegar de threads diferentes
+    def __init__(self):
+        self.rows = 0
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def advance(self, rows, nbytes=0):
+        with self.lock:
+            self.rows += rows
+            self.nbytes += nbytes
+
+
+class CheckpointedComparison(PartitionedComparison):
+    # PartitionedComparison retomável (veja o início do módulo); aceita os mesmos argumentos.
+    # checkpoint_path é o diretório do checkpoint desta tabela (checkpoint_path()); com
+    # resume=False, um checkpoint anterior é descartado. on_retry(tentativa, espera, erro)
+    # é chamado antes de cada nova tentativa de uma faixa.
+    def __init__(self, *args, checkpoint_path, resume=True, checkpoint_ranges=DEFAULT_CHECKPOINT_RANGES,
+                 retries=DEFAULT_RETRIES, retry_delay=DEFAULT_RETRY_DELAY, max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
+                 on_retry=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.checkpoint_lock = threading.Lock()
+        self.resume = resume
+        self.checkpoint_ranges = checkpoint_ranges
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_retry = on_retry
+        self.state = None
+
+    def arguments(self):
+        # O suficiente para recriar a comparação ao "retomar a última"
+        return {"db1": self.db1, "db2": self.db2, "table_name": self.table_name, "sql_condition": self.sql_condition,
+                "selected_columns": self.selected_columns, "key_columns": self.key_columns,
+                "batch_size": self.batch_size, "checksum_rows": self.checksum_rows, "rules": self.rules,
+                "partitions": self.partitions, "max_connections": self.max_connections}
+
+    def signature(self):
+        # Outra tabela, condição, colunas, chave ou regra invalidam as faixas já concluídas
+        return repr((self.db1, self.db2, self.table_name, self.sql_condition, self.selected_columns,
+                     self.key_columns, str(self.rules or "")))
+
+    def open(self):
+        # Conecta, conta e planeja as faixas, de novo a cada queda de conexão
+        self.stopped.clear()
+        return self.retrying(self.open_once)
+
+    def open_once(self):
+        progress = super().open()
+        try:
+            self.state = self.load_state()
+        except Exception:
+            self.release_connections()
+            raise
+        return progress
+
+    def load_state(self):
+        state = self.checkpoint.load() if self.resume else None
+        if state is None or state["signature"] != self.signature():
+            # Sem faixas (chave que não pode ser dividida), a tabela inteira é uma faixa só
+            ranges = self.plan_ranges(max(self.partitions, self.checkpoint_ranges)) or [None]
+            return self.checkpoint.start(self.signature(), self.arguments(), ranges)
+        # Linhas incluídas depois da interrupção abaixo do antigo MIN, acima do antigo MAX ou com a
+        # chave NULL caem nessas faixas, que por isso não são reaproveitadas
+        self.checkpoint.reopen([number for number, key_range in enumerate(state["ranges"])
+                                if key_range == NULL_RANGE
+                                or (key_range is not None and None in key_range[:2])])
+        return state
+
+    def differences(self, progress=None):
+        self.release_connections()
+        return self.compare_checkpointed(self.state["ranges"], progress)
+
+    def compare_checkpointed(self, ranges, progress):
+        if progress:
+            progress.resume(*self.checkpoint.done_progress())
+        yield from self.compare_partitions(ranges, progress)
+        # Terminou: a próxima execução começa do zero
+        self.checkpoint.clear()
+
+    def partition_store(self, number):
+        return ResultStore(self.table_name, self.checkpoint.store_directory(number), db1=self.db1, db2=self.db2)
+
+    def compare_partition(self, number, key_range, progress):
+        meta_path = self.checkpoint.done(number)
+        if meta_path:
+            # Concluída em uma execução anterior: o resultado é reaberto do disco
+            store = ResultStore.open(os.path.join(self.checkpoint.path, meta_path))
+            if store.schema1 is not None:
+                self.set_partition_schemas(store.schema1, store.schema2, store.key_columns)
+            return store
+
+        store, counted = self.retrying(self.compare_attempt, number, key_range)
+        if not self.stopped.is_set():
+            with self.checkpoint_lock:
+                self.checkpoint.mark_done(number, store.meta_path, (counted.rows, counted.nbytes))
+            if progress:
+                progress.advance(counted.rows, counted.nbytes)
+        return store
+
+    def compare_attempt(self, number, key_range):
+        # Uma tentativa da faixa, com a contagem própria: uma tentativa interrompida não avança o progresso
+        counted = PartitionProgress()
+        return super().compare_partition(number, key_range, counted), counted
+
+    def retrying(self, operation, *args):
+        # operation(*args), repetida depois de cada erro de conexão enquanto houver tentativas
+        delays = retry_delays(self.retries, self.retry_delay, self.max_retry_delay)
+        attempt = 0
+        while True:
+            try:
+                return operation(*args)
+            except Exception as e:
+                delay = next(delays, None) if is_connection_error(e) else None
+                if delay is None or self.stopped.is_set():
+                    raise
+                attempt += 1
+                if self.on_retry:
+                    self.on_retry(attempt, delay, e)
+                # Espera interrompida se a comparação for encerrada
+                if self.stopped.wait(delay):
+                    raise
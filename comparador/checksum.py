@@ -0,0 +1,190 @@
+"""Pré-verificação por checksum agregado no servidor, por faixas da chave.
+
+Cada faixa da chave tem seu COUNT e hash agregado calculados nos dois bancos;
+faixas iguais são puladas e as diferentes são bisseccionadas até o tamanho
+mínimo, de modo que só as faixas com diferenças trafegam linha a linha.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from comparador.catalog import fetch_column_types
+from comparador.schema import plain_name
+from comparador.sql import build_select, range_condition
+
+SQL_DBMS_NAME = 17  # pyodbc.SQL_DBMS_NAME
+
+# Faixas com até esse número de linhas deixam de ser divididas
+DEFAULT_CHECKSUM_ROWS = 50000
+
+# Limite de divisões, para chaves float/datetime que nunca ficam indivisíveis
+MAX_DEPTH = 64
+
+
+def _sqlserver_text(column, type_name):
+    # Datas com todas as casas (a conversão implícita perde os segundos), float com 17
+    # dígitos e tipos que CONCAT_WS não converte sozinho
+    if type_name in ("datetime", "datetime2", "smalldatetime", "date", "time", "datetimeoffset"):
+        return f"CONVERT(VARCHAR(40), {column}, 126)"
+    if type_name in ("float", "real"):
+        return f"CONVERT(VARCHAR(40), {column}, 3)"
+    if type_name in ("binary", "varbinary", "image", "timestamp", "rowversion"):
+        return f"CONVERT(VARCHAR(MAX), CAST({column} AS VARBINARY(MAX)), 1)"
+    if type_name in ("xml", "text", "ntext", "sql_variant"):
+        return f"CAST({column} AS NVARCHAR(MAX))"
+    return column
+
+
+def _oracle_text(column, type_name):
+    # O formato implícito de datas vem do NLS da sessão e, no padrão, não tem a hora
+    if type_name == "date":
+        return f"TO_CHAR({column}, 'YYYY-MM-DD HH24:MI:SS')"
+    if type_name.startswith("timestamp"):
+        return f"TO_CHAR({column}, 'YYYY-MM-DD HH24:MI:SS.FF9')"
+    return column
+
+
+# Conversão explícita de cada coluna para texto, pelo nome do tipo no catálogo
+_TEXTS = {
+    "sqlserver": _sqlserver_text,
+    "oracle": _oracle_text,
+}
+
+# Hash agregado por SGBD, de (colunas, colunas como texto); bancos sem suporte não fazem a
+# pré-verificação. Cada linha tem um hash não linear (MD5, ORA_HASH) e os hashes são somados:
+# com XOR (CHECKSUM_AGG, BIT_XOR de CRC32), duas linhas que trocam valores entre si dão o
+# mesmo agregado. CONCAT_WS e || somem com os NULLs, então um indicador por coluna no fim
+# separa (NULL, 'a') de ('a', NULL)
+_AGGREGATES = {
+    "sqlserver": lambda columns, texts: (
+        "SUM(CAST(CAST(HASHBYTES('MD5', CONCAT_WS('|', "
+        + ", ".join(texts + [f"IIF({column} IS NULL, '1', '0')" for column in columns])
+        + ")) AS BINARY(4)) AS BIGINT))"),
+    "mysql": lambda columns, texts: (
+        "SUM(CAST(CONV(SUBSTR(MD5(CONCAT_WS('|', "
+        + ", ".join(texts + [f"({column} IS NULL)" for column in columns])
+        + ")), 1, 8), 16, 10) AS UNSIGNED))"),
+    "postgresql": lambda columns, texts: (
+        f"SUM(('x' || SUBSTR(MD5(ROW({', '.join(columns)})::TEXT), 1, 8))::BIT(32)::INT)"),
+    "oracle": lambda columns, texts: (
+        "SUM(ORA_HASH(" + " || '|' || ".join(texts + [f"NVL2({column}, '1', '0')" for column in columns])
+        + "))"),
+}
+
+_DBMS_NAMES = (
+    ("sql server", "sqlserver"),
+    ("mysql", "mysql"),
+    ("mariadb", "mysql"),
+    ("postgres", "postgresql"),
+    ("oracle", "oracle"),
+)
+
+
+def detect_dialect(cursor):
+    try:
+        dbms_name = cursor.connection.getinfo(SQL_DBMS_NAME).lower()
+    except Exception:
+        return None
+    for marker, dialect in _DBMS_NAMES:
+        if marker in dbms_name:
+            return dialect
+    return None
+
+
+def common_dialect(cursor1, cursor2):
+    # Os checksums só são comparáveis quando os dois bancos usam o mesmo SGBD
+    dialect = detect_dialect(cursor1)
+    if dialect is not None and dialect == detect_dialect(cursor2):
+        return dialect
+    return None
+
+
+def checksum_aggregate(cursor1, cursor2, table_name, columns, dialect):
+    # Expressão do hash agregado das colunas. A conversão explícita para texto só é usada
+    # quando a coluna tem o mesmo tipo nos dois bancos; com tipos diferentes, os textos
+    # (e a faixa) já diferem de qualquer jeito
+    texts = list(columns)
+    if dialect in _TEXTS:
+        types1 = fetch_column_types(cursor1, table_name)
+        types2 = fetch_column_types(cursor2, table_name)
+        for i, column in enumerate(columns):
+            type_name = types1.get(plain_name(column))
+            if type_name and type_name == types2.get(plain_name(column)):
+                texts[i] = _TEXTS[dialect](column, type_name)
+    return _AGGREGATES[dialect](list(columns), texts)
+
+
+def key_bounds(cursor1, cursor2, table_name, key_column, sql_condition="", key_range=None):
+    # Menor e maior valor da chave nos dois bancos, dentro de key_range se informada
+    condition, params = range_condition(key_column, key_range) if key_range else (None, [])
+    query = build_select(table_name, [f"MIN({key_column})", f"MAX({key_column})"], sql_condition,
+                         extra_condition=condition)
+    bounds = []
+    for cursor in (cursor1, cursor2):
+        cursor.execute(*((query, params) if params else (query,)))
+        start, end = cursor.fetchone()
+        if start is not None:
+            bounds += [start, end]
+    if not bounds:
+        return None
+    return min(bounds), max(bounds), True
+
+
+def split_range(key_range):
+    # Divide a faixa ao meio; retorna None quando a faixa não pode ser dividida
+    start, end, inclusive = key_range
+    if type(start) is not type(end) or isinstance(start, bool):
+        return None
+    if isinstance(start, int):
+        middle = start + (end - start + 1) // 2
+    elif isinstance(start, (float, Decimal, datetime)):
+        middle = start + (end - start) / 2
+    elif isinstance(start, date):
+        middle = start + timedelta(days=((end - start).days + 1) // 2)
+    else:
+        return None
+    if not (start < middle and (middle <= end if inclusive else middle < end)):
+        return None
+    return (start, middle, False), (middle, end, inclusive)
+
+
+def changed_ranges(cursor1, cursor2, table_name, key_column, columns, dialect, sql_condition="",
+                   min_rows=DEFAULT_CHECKSUM_ROWS, on_skip=None, key_range=None):
+    # Produz, em ordem crescente da chave, as faixas cujos checksums diferem.
+    # on_skip(linhas) recebe a quantidade de linhas dispensadas por faixas iguais.
+    # key_range limita a verificação a uma faixa; sem ela, a tabela inteira é verificada.
+    # As divisões usam os limites lidos agora, mas a primeira e a última faixa continuam
+    # abertas como key_range, para não perder linhas incluídas fora desses limites.
+    if key_range is None:
+        key_range = (None, None, True)
+    bounds = key_bounds(cursor1, cursor2, table_name, key_column, sql_condition, key_range)
+    if bounds is None:
+        return
+
+    aggregate = ["COUNT(*)", checksum_aggregate(cursor1, cursor2, table_name, columns, dialect)]
+    pending = [(key_range, bounds, 0)]
+    while pending:
+        key_range, bounds, depth = pending.pop()
+        condition, params = range_condition(key_column, key_range)
+        query = build_select(table_name, aggregate, sql_condition, extra_condition=condition)
+
+        cursor1.execute(query, params)
+        count1, checksum1 = cursor1.fetchone()
+        cursor2.execute(query, params)
+        count2, checksum2 = cursor2.fetchone()
+
+        if count1 == count2 and checksum1 == checksum2:
+            if on_skip and count1:
+                on_skip(count1 + count2)
+            continue
+
+        halves = None
+        if max(count1, count2) > min_rows and depth < MAX_DEPTH:
+            halves = split_range(bounds)
+        if halves is None:
+            yield key_range
+        else:
+            lower, upper = halves
+            start, end, inclusive = key_range
+            # A metade inferior entra por último na pilha para sair primeiro
+            pending.append(((upper[0], end, inclusive), upper, depth + 1))
+            pending.append(((start, lower[1], False), lower, depth + 1))
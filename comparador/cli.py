@@ -0,0 +1,256 @@
+"""Comparação pela linha de comando, sem PyQt5.
+
+Uso: python -m comparador DSN1 DSN2 -t TABELA [-t TABELA ...] [opções]
+
+Código de saída: 0 se as tabelas são iguais, 1 se há diferenças, 2 em caso de erro.
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from comparador.apply import DEFAULT_APPLY_BATCH_SIZE, DELETE, INSERT, UPDATE, apply_store
+from comparador.catalog import list_common_tables
+from comparador.checkpoint import DEFAULT_CHECKPOINT_DIR, CheckpointedComparison, checkpoint_path
+from comparador.checksum import DEFAULT_CHECKSUM_ROWS
+from comparador.connections import DEFAULT_RETRIES, ConnectionPool
+from comparador.engine import CHANGED, ONLY_DB1, ONLY_DB2
+from comparador.fetch import DEFAULT_BATCH_SIZE
+from comparador.multiset import DEFAULT_SPILL_PARTITIONS, MultisetComparison
+from comparador.partition import DEFAULT_MAX_CONNECTIONS, PartitionedComparison
+from comparador.processes import ProcessPool
+from comparador.progress import format_progress
+from comparador.render import RENDERERS
+from comparador.results import ResultStore, format_column_counts
+from comparador.rules import CompareRules
+from comparador.snapshot import DEFAULT_SNAPSHOT_DIR, IncrementalComparison, snapshot_path
+from comparador.sync import DEFAULT_SYNC_BATCH_SIZE, DIRECTIONS, export_sync
+
+EXIT_EQUAL = 0
+EXIT_DIFFERENT = 1
+EXIT_ERROR = 2
+
+
+def parse_list(text):
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def parse_batch_size(text):
+    # "5000" vale para os dois bancos; "5000,20000" define o lote de cada banco
+    sizes = [int(size) for size in parse_list(text)]
+    if len(sizes) == 1:
+        return sizes[0]
+    if len(sizes) == 2:
+        return tuple(sizes)
+    raise argparse.ArgumentTypeError("informe um tamanho de lote ou dois separados por vírgula")
+
+
+def parse_compare_rules(text):
+    try:
+        return CompareRules.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="comparador", description="Compara tabelas entre dois DSNs ODBC.")
+    parser.add_argument("db1", help="DSN do banco 1")
+    parser.add_argument("db2", help="DSN do banco 2")
+    parser.add_argument("-t", "--table", dest="tables", action="append", default=[],
+                        help="tabela a comparar (pode ser repetido)")
+    parser.add_argument("--all-tables", action="store_true", help="compara todas as tabelas em comum")
+    parser.add_argument("-c", "--columns", type=parse_list, default=[], help="colunas separadas por vírgula")
+    parser.add_argument("-w", "--where", default="", help="condição SQL (sem o WHERE)")
+    parser.add_argument("-k", "--key", type=parse_list, default=[],
+                        help="colunas da chave separadas por vírgula (padrão: chave primária)")
+    parser.add_argument("-r", "--rules", type=parse_compare_rules, default=CompareRules(),
+                        help="regras por coluna, ex.: 'nome:case,trim; valor:round=2; data:truncate=minute; obs:ignore'")
+    parser.add_argument("-b", "--batch-size", type=parse_batch_size, default=DEFAULT_BATCH_SIZE,
+                        help=f"linhas por fetchmany, uma para os dois bancos ou 'lote1,lote2' (padrão: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("-p", "--parallel", type=int, default=1, help="tabelas comparadas em paralelo")
+    parser.add_argument("--partitions", type=int, default=1,
+                        help="divide cada tabela em N faixas da chave comparadas em paralelo")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help=f"conexões simultâneas por banco para as partições de uma tabela (padrão: {DEFAULT_MAX_CONNECTIONS})")
+    parser.add_argument("--checksum-rows", type=int, default=0,
+                        help=f"pula faixas iguais por checksum, dividindo até N linhas (ex.: {DEFAULT_CHECKSUM_ROWS})")
+    parser.add_argument("-j", "--processes", type=int, default=0,
+                        help="processos auxiliares para normalizar, comparar e formatar as linhas "
+                             "(padrão: 0, tudo no processo principal)")
+    parser.add_argument("--watermark",
+                        help="coluna de versão (rowversion, data de alteração): compara só as linhas alteradas "
+                             "desde a execução anterior, a partir de um snapshot local")
+    parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR,
+                        help=f"diretório dos snapshots da comparação incremental (padrão: {DEFAULT_SNAPSHOT_DIR})")
+    parser.add_argument("--skip-deletes", action="store_true",
+                        help="na comparação incremental, não lê as chaves para procurar linhas apagadas")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="grava um checkpoint por faixa da chave e reconecta ao perder a conexão; "
+                             "a tabela pode ser retomada com --resume se a execução for interrompida")
+    parser.add_argument("--resume", action="store_true",
+                        help="retoma a comparação interrompida com as mesmas opções, a partir do checkpoint "
+                             "(implica --checkpoint)")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR,
+                        help=f"diretório dos checkpoints (padrão: {DEFAULT_CHECKPOINT_DIR})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"novas tentativas de uma faixa depois de perder a conexão (padrão: {DEFAULT_RETRIES})")
+    parser.add_argument("--unordered", action="store_true",
+                        help="tabela sem chave: compara as linhas inteiras como multiconjunto, sem ORDER BY, "
+                             "usando arquivos temporários")
+    parser.add_argument("--spill-partitions", type=int, default=DEFAULT_SPILL_PARTITIONS,
+                        help=f"arquivos temporários por banco em --unordered; a memória usada é a de um deles "
+                             f"(padrão: {DEFAULT_SPILL_PARTITIONS})")
+    parser.add_argument("--serial-fetch", action="store_true", help="lê os dois bancos na mesma thread")
+    parser.add_argument("-o", "--output", help="diretório onde as linhas diferentes são gravadas, um arquivo por tabela e banco")
+    parser.add_argument("--results-dir",
+                        help="grava também o resultado binário de cada tabela neste diretório, "
+                             "para reabrir depois com ResultStore.open sem consultar os bancos")
+    parser.add_argument("-f", "--format", choices=sorted(RENDERERS), default="insert",
+                        help="formato dos arquivos de saída (padrão: insert)")
+    parser.add_argument("-s", "--sync", choices=DIRECTIONS,
+                        help="grava também um script de sincronização no diretório de saída: "
+                             "db1-db2 deixa o banco 2 igual ao 1, db2-db1 o contrário")
+    parser.add_argument("--sync-batch-size", type=int, default=DEFAULT_SYNC_BATCH_SIZE,
+                        help=f"linhas por INSERT e chaves por DELETE no script (padrão: {DEFAULT_SYNC_BATCH_SIZE})")
+    parser.add_argument("-a", "--apply", choices=DIRECTIONS,
+                        help="aplica as diferenças direto no banco de destino: db1-db2 altera o banco 2, db2-db1 o banco 1")
+    parser.add_argument("--apply-batch-size", type=int, default=DEFAULT_APPLY_BATCH_SIZE,
+                        help=f"diferenças por transação ao aplicar (padrão: {DEFAULT_APPLY_BATCH_SIZE})")
+    parser.add_argument("--atomic", action="store_true",
+                        help="aplica cada tabela em uma única transação, desfeita por inteiro em caso de erro")
+    parser.add_argument("--progress", action="store_true", help="mostra o progresso em stderr")
+    return parser
+
+
+class TableResult:
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.counts = {ONLY_DB1: 0, ONLY_DB2: 0, CHANGED: 0}
+        self.column_counts = {}
+        self.error = None
+        self.applied = None
+
+    def has_differences(self):
+        return any(self.counts.values())
+
+
+def compare_one(args, table_name, connect, process_pool=None):
+    result = TableResult(table_name)
+
+    on_progress = None
+    if args.progress:
+        def on_progress(progress):
+            print(f"{table_name}: {progress.percent}% · {format_progress(progress)}", file=sys.stderr)
+
+    def on_mismatch(messages):
+        # Avisada uma vez por tabela, antes das linhas
+        for message in messages:
+            print(f"{table_name}: esquema diferente: {message}", file=sys.stderr)
+
+    comparison_args = (args.db1, args.db2, table_name, args.where, args.columns, args.key, args.batch_size,
+                       not args.serial_fetch, args.checksum_rows, on_progress, on_mismatch, connect, args.rules,
+                       process_pool)
+    if args.watermark:
+        comparison = IncrementalComparison(*comparison_args,
+                                           snapshot_path=snapshot_path(args.snapshot_dir, args.db1, args.db2,
+                                                                       table_name),
+                                           watermark_column=args.watermark, track_deletes=not args.skip_deletes)
+    elif args.checkpoint or args.resume:
+        def on_retry(attempt, delay, error):
+            print(f"{table_name}: conexão perdida ({error}); tentativa {attempt} em {delay}s", file=sys.stderr)
+
+        comparison = CheckpointedComparison(*comparison_args, partitions=args.partitions,
+                                            max_connections=args.max_connections,
+                                            checkpoint_path=checkpoint_path(args.checkpoint_dir, args.db1, args.db2,
+                                                                            table_name),
+                                            resume=args.resume, retries=args.retries, on_retry=on_retry)
+    elif args.unordered:
+        comparison = MultisetComparison(*comparison_args, partitions=args.spill_partitions)
+    else:
+        # Com uma partição só, PartitionedComparison se comporta como Comparison
+        comparison = PartitionedComparison(*comparison_args, partitions=args.partitions,
+                                           max_connections=args.max_connections)
+    try:
+        if args.output or args.apply or args.results_dir:
+            # As diferenças vão para um arquivo (temporário, sem --results-dir) conforme
+            # aparecem e só são formatadas na exportação
+            store = comparison.run_to_store(ResultStore(table_name, args.results_dir, db1=args.db1, db2=args.db2))
+            if args.output:
+                store.export(args.output, args.format, process_pool)
+                if args.sync:
+                    export_sync(store, args.output, args.sync, args.sync_batch_size)
+            if args.apply and len(store):
+                result.applied = apply_store(store, args.apply, args.apply_batch_size, args.atomic, on_progress,
+                                             connect)
+        else:
+            comparison.run()
+    except Exception as e:
+        result.error = str(e)
+    result.counts = comparison.counts
+    result.column_counts = comparison.column_counts
+    return result
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.sync and not args.output:
+        parser.error("--sync exige o diretório de saída (-o)")
+    if args.rules and (args.sync or args.apply):
+        parser.error("--sync e --apply não podem ser usados com --rules")
+    if args.unordered and (args.watermark or args.key):
+        parser.error("--unordered não pode ser usado com --watermark nem com --key")
+    if (args.checkpoint or args.resume) and (args.watermark or args.unordered):
+        parser.error("--checkpoint e --resume não podem ser usados com --watermark nem com --unordered")
+    if args.unordered and (args.sync or args.apply):
+        parser.error("--sync e --apply não podem ser usados com --unordered")
+
+    # As conexões abertas para listar as tabelas e para cada comparação são reaproveitadas
+    pool = ConnectionPool()
+    # Os processos auxiliares também são criados uma vez e atendem todas as tabelas
+    process_pool = ProcessPool(args.processes) if args.processes > 0 else None
+    try:
+        tables = list(args.tables)
+        if args.all_tables:
+            try:
+                conn1 = pool.connect(args.db1)
+                conn2 = pool.connect(args.db2)
+                try:
+                    tables += [table for table in list_common_tables(conn1.cursor(), conn2.cursor())
+                               if table not in tables]
+                finally:
+                    conn1.close()
+                    conn2.close()
+            except Exception as e:
+                print(f"Erro ao listar tabelas comuns: {e}", file=sys.stderr)
+                return EXIT_ERROR
+        if not tables:
+            print("Informe ao menos uma tabela com -t ou use --all-tables.", file=sys.stderr)
+            return EXIT_ERROR
+
+        # Cada tabela usa o seu próprio par de conexões, emprestado do pool
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+            results = list(executor.map(lambda table: compare_one(args, table, pool.connect, process_pool), tables))
+    finally:
+        pool.close()
+        if process_pool:
+            process_pool.close()
+
+    for result in results:
+        if result.error:
+            print(f"{result.table_name}: erro: {result.error}")
+        elif result.has_differences():
+            print(f"{result.table_name}: {result.counts[ONLY_DB1]} somente em {args.db1}, "
+                  f"{result.counts[ONLY_DB2]} somente em {args.db2}, {result.counts[CHANGED]} alteradas")
+        else:
+            print(f"{result.table_name}: iguais")
+        if result.column_counts:
+            print(f"{result.table_name}: colunas alteradas: {format_column_counts(result.column_counts)}")
+        if result.applied:
+            print(f"{result.table_name}: aplicado: {result.applied[INSERT]} inseridas, "
+                  f"{result.applied[UPDATE]} alteradas, {result.applied[DELETE]} apagadas")
+
+    if any(result.error for result in results):
+        return EXIT_ERROR
+    if any(result.has_differences() for result in results):
+        return EXIT_DIFFERENT
+    return EXIT_EQUAL
@@ -0,0 +1,155 @@
+"""Abertura de conexões ODBC por DSN e pool de conexões reaproveitadas.
+
+Com TLS, abrir uma conexão com um SQL Server remoto custa de 1 a 2 s.
+ConnectionPool guarda as conexões devolvidas por DSN e as entrega de novo
+na próxima operação (listar tabelas, ler colunas, comparar, aplicar),
+verificando antes se ainda respondem e descartando as ociosas há muito tempo.
+is_connection_error e retry_delays decidem quando e depois de quanto tempo
+uma operação interrompida pela rede é tentada de novo.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+# Segundos que uma conexão pode ficar parada no pool antes de ser fechada
+DEFAULT_IDLE_TIMEOUT = 300
+# Conexões paradas mantidas por DSN
+DEFAULT_MAX_IDLE = 4
+# Conexões paradas há mais do que isso são testadas antes de serem reaproveitadas
+DEFAULT_CHECK_AFTER = 30
+# Novas tentativas depois de perder a conexão; a espera dobra a cada uma, até o máximo (segundos)
+DEFAULT_RETRIES = 5
+DEFAULT_RETRY_DELAY = 2
+DEFAULT_MAX_RETRY_DELAY = 60
+
+
+def connect_dsn(dsn):
+    # pyodbc só é importado ao conectar, para que o motor funcione com
+    # qualquer conexão DB-API já aberta (ex.: sqlite3 nos testes de desempenho)
+    import pyodbc
+    return pyodbc.connect(f"DSN={dsn}")
+
+
+def is_connection_error(error):
+    # Erros de rede ou conexão, que podem passar com uma nova tentativa: SQLSTATE 08xxx é a
+    # classe "connection exception" e HYT00/HYT01 são os tempos esgotados do ODBC (o pyodbc
+    # traz o SQLSTATE em args[0], o psycopg em sqlstate/pgcode). Outros OperationalError,
+    # como tabela inexistente ou deadlock, falhariam de novo e não são repetidos
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    sqlstate = getattr(error, "sqlstate", None) or getattr(error, "pgcode", None)
+    if sqlstate is None and error.args:
+        sqlstate = error.args[0]
+    return isinstance(sqlstate, str) and sqlstate.startswith(("08", "HYT"))
+
+
+def retry_delays(retries=DEFAULT_RETRIES, delay=DEFAULT_RETRY_DELAY, max_delay=DEFAULT_MAX_RETRY_DELAY):
+    # Esperas antes de cada nova tentativa: delay, 2 * delay, 4 * delay... até max_delay
+    for attempt in range(retries):
+        yield min(delay * 2 ** attempt, max_delay)
+
+
+class PooledConnection:
+    # Conexão emprestada pelo pool: close() a devolve em vez de fechá-la, então
+    # o motor pode usar connect=pool.connect sem mudar nada
+    def __init__(self, pool, dsn, connection):
+        self._pool = pool
+        self._dsn = dsn
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise AttributeError(f"A conexão com {self._dsn} já foi devolvida ao pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._dsn, self._connection)
+            self._connection = None
+
+    def discard(self):
+        # Fecha de verdade, para conexões que deram erro e não devem voltar ao pool
+        if self._connection is not None:
+            self._pool.discard(self._connection)
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, connect=connect_dsn, max_idle=DEFAULT_MAX_IDLE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 check_after=DEFAULT_CHECK_AFTER, health_query="SELECT 1", clock=time.monotonic):
+        self._connect = connect
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.health_query = health_query
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        # DSN -> deque de (conexão, momento em que foi devolvida), a mais recente no fim
+        self.idle = defaultdict(deque)
+
+    def connect(self, dsn):
+        # Reaproveita a conexão parada mais recente do DSN ou abre uma nova
+        while True:
+            with self.lock:
+                self.evict_idle_locked()
+                if not self.idle[dsn]:
+                    break
+                connection, released_at = self.idle[dsn].pop()
+            if self.clock() - released_at < self.check_after or self.is_alive(connection):
+                return PooledConnection(self, dsn, connection)
+            self.discard(connection)
+        return PooledConnection(self, dsn, self._connect(dsn))
+
+    def is_alive(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.health_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def release(self, dsn, connection):
+        # Desfaz qualquer transação pendente para a conexão voltar limpa
+        try:
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+        with self.lock:
+            idle = self.idle[dsn]
+            idle.append((connection, self.clock()))
+            while len(idle) > self.max_idle:
+                self.discard(idle.popleft()[0])
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def evict_idle_locked(self):
+        now = self.clock()
+        for idle in self.idle.values():
+            while idle and now - idle[0][1] > self.idle_timeout:
+                self.discard(idle.popleft()[0])
+
+    def evict_idle(self):
+        with self.lock:
+            self.evict_idle_locked()
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                while idle:
+                    self.discard(idle.popleft()[0])
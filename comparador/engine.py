@@ -0,0 +1,405 @@
+"""Motor de comparação de tabelas por merge join ordenado pela chave.
+
+Não depende de PyQt5: as janelas (teste7.py) e a linha de comando (cli.py)
+são apenas camadas sobre Comparison.
+"""
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+
+from comparador.catalog import (count_rows, detect_primary_key, fetch_column_names, fetch_column_types,
+                                fetch_text_columns)
+from comparador.checksum import changed_ranges, common_dialect, detect_dialect
+from comparador.connections import connect_dsn
+from comparador.fetch import DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE, iter_batches, iter_rows, prefetch
+from comparador.progress import ProgressReporter, estimate_batch_bytes
+from comparador.render import render_insert
+from comparador.schema import Schema, plain_name
+from comparador.sql import NULL_RANGE, build_select, key_order, range_condition
+
+# Classificação das linhas diferentes
+ONLY_DB1 = "only_db1"
+ONLY_DB2 = "only_db2"
+CHANGED = "changed"
+
+
+def resolve_key_columns(cursor, table_name, selected_columns=None, key_columns=None):
+    # Retorna (colunas da chave, colunas do SELECT, chave aceita NULL).
+    # Sem chave informada ou detectada, a linha inteira passa a ser a chave;
+    # só a chave primária do catálogo é garantidamente NOT NULL.
+    null_safe = bool(key_columns)
+    key_columns = list(key_columns or detect_primary_key(cursor, table_name))
+    selected_columns = list(selected_columns or [])
+
+    if not key_columns:
+        key_columns = selected_columns or fetch_column_names(cursor, table_name)
+        return key_columns, selected_columns, True
+
+    # As colunas da chave precisam estar no SELECT para ordenar e parear as linhas
+    if selected_columns:
+        selected = {plain_name(column) for column in selected_columns}
+        missing = [column for column in key_columns if plain_name(column) not in selected]
+        selected_columns = missing + selected_columns
+    return key_columns, selected_columns, null_safe
+
+
+def common_columns(cursor1, cursor2, table_name):
+    # Colunas presentes nos dois bancos, na ordem do banco 1
+    names2 = {plain_name(column) for column in fetch_column_names(cursor2, table_name)}
+    return [column for column in fetch_column_names(cursor1, table_name) if plain_name(column) in names2]
+
+
+def apply_rules(cursor1, cursor2, table_name, key_columns, columns, rules, dialect):
+    # Aplica as regras de comparação (rules.CompareRules) à projeção. Retorna
+    # (chave, colunas, expressões do SELECT, colunas normalizadas no cliente).
+    names = columns or common_columns(cursor1, cursor2, table_name)
+    key_names = {plain_name(column) for column in key_columns}
+    whole_row = key_names >= {plain_name(column) for column in names}
+
+    # Sem chave própria, a linha inteira é a chave e as colunas ignoradas saem dela também
+    ignored_keys = [column for column in key_columns if rules.ignores(column)]
+    if ignored_keys and not whole_row:
+        raise ValueError(f"As colunas da chave não podem ser ignoradas: {', '.join(ignored_keys)}")
+    key_columns = rules.keep(key_columns)
+    columns = rules.keep(names)
+
+    select_columns, client_columns = rules.projection(columns, dialect)
+    # O ORDER BY usa o valor já normalizado pelo servidor; normalizar a chave só no
+    # cliente mudaria a ordem das linhas e quebraria o merge join
+    client_keys = [column for column in client_columns if plain_name(column) in key_names]
+    if client_keys:
+        raise ValueError(f"As regras das colunas da chave {', '.join(client_keys)} não podem ser aplicadas "
+                         f"no servidor deste banco")
+    return key_columns, columns, select_columns, client_columns
+
+
+def make_key(key_indexes, null_safe=False):
+    if not null_safe:
+        return itemgetter(*key_indexes)
+
+    # NULL ordena antes de qualquer valor, como no ORDER BY de sql.key_order
+    def key(row):
+        return tuple((0, None) if row[i] is None else (1, row[i]) for i in key_indexes)
+
+    return key
+
+
+def key_order_by(cursor, table_name, key_columns, rules=None):
+    # ORDER BY da chave para o SGBD do cursor (veja sql.key_order). Colunas normalizadas
+    # pelas regras são ordenadas pela expressão normalizada (a mesma do SELECT), com a
+    # ordenação do tipo da coluna original
+    dialect = detect_dialect(cursor)
+    if dialect is None:
+        return list(key_columns)
+    # O tipo do catálogo distingue uniqueidentifier e xml, que o driver descreve como texto
+    column_types = {column: type_name for column, type_name in fetch_column_types(cursor, table_name).items()
+                    if column in {key.lower() for key in key_columns}}
+    text_columns = fetch_text_columns(cursor, table_name, key_columns, column_types)
+    expressions = {column: rules.expression(column, dialect) for column in key_columns
+                   if rules and rules.normalizes(column)}
+    return key_order(key_columns, dialect, text_columns, column_types, expressions)
+
+
+def _ordered(rows, key, side):
+    # Garante que a sequência realmente chega ordenada pela chave; uma ordenação
+    # diferente (ex.: collation do servidor) tornaria o merge join incorreto.
+    previous = None
+    first = True
+    for row in rows:
+        current = key(row)
+        if not first and current < previous:
+            raise ValueError(f"As linhas do banco {side} não estão ordenadas pela chave: {current!r} após {previous!r}")
+        previous = current
+        first = False
+        yield current, row
+
+
+def merge_join(rows1, rows2, key1, key2=None, equal=None):
+    # Percorre as duas sequências ordenadas em uma única passada e produz
+    # (tipo, linha_db1, linha_db2) apenas para as linhas diferentes.
+    # equal(row1, row2) substitui a comparação das tuplas (veja Schema.row_comparer).
+    key2 = key2 or key1
+    rows1 = _ordered(rows1, key1, 1)
+    rows2 = _ordered(rows2, key2, 2)
+
+    k1, row1 = next(rows1, (None, None))
+    k2, row2 = next(rows2, (None, None))
+
+    while row1 is not None or row2 is not None:
+        if row2 is None or (row1 is not None and k1 < k2):
+            yield ONLY_DB1, row1, None
+            k1, row1 = next(rows1, (None, None))
+        elif row1 is None or k2 < k1:
+            yield ONLY_DB2, None, row2
+            k2, row2 = next(rows2, (None, None))
+        else:
+            changed = not equal(row1, row2) if equal else tuple(row1) != tuple(row2)
+            if changed:
+                yield CHANGED, row1, row2
+            k1, row1 = next(rows1, (None, None))
+            k2, row2 = next(rows2, (None, None))
+
+
+def _counted(batches, on_batch):
+    for batch in batches:
+        on_batch(batch)
+        yield batch
+
+
+def _same_digest(item1, item2):
+    return item1[1] == item2[1]
+
+
+def merge_prepared(rows1, rows2):
+    # merge_join sobre (chave, resumo, linha) de processes.ProcessPool.prepare: a chave
+    # já vem calculada e duas linhas são iguais quando os resumos são iguais
+    for kind, item1, item2 in merge_join(rows1, rows2, itemgetter(0), equal=_same_digest):
+        yield kind, None if item1 is None else item1[2], None if item2 is None else item2[2]
+
+
+def compare_table(cursor1, cursor2, table_name, sql_condition="", selected_columns=None, key_columns=None,
+                  progress=None, batch_size=DEFAULT_BATCH_SIZE, concurrent=True, queue_size=DEFAULT_QUEUE_SIZE,
+                  checksum_rows=None, on_schema=None, rules=None, key_range=None, process_pool=None,
+                  on_changed=None):
+    # Compara a tabela nos dois cursores lendo ambos os lados ordenados pela chave.
+    # progress (um ProgressReporter) avança a cada lote lido de qualquer um dos lados.
+    # batch_size pode ser um número ou um par (lote do banco 1, lote do banco 2).
+    # Com concurrent, cada banco é lido por uma thread própria (veja fetch.prefetch).
+    # Com checksum_rows, faixas da chave com checksum igual nos dois bancos são puladas
+    # e as demais são divididas até esse número de linhas (veja checksum.changed_ranges).
+    # on_schema(schema1, schema2, key_columns) é chamado uma vez, assim que as colunas de cada banco
+    # são conhecidas, com a chave efetivamente usada (informada, primária ou a linha inteira).
+    # rules (rules.CompareRules) ignora ou normaliza colunas, no SELECT quando possível.
+    # key_range restringe a comparação a uma faixa da primeira coluna da chave (veja partition.py).
+    # process_pool (processes.ProcessPool) tira do GIL a normalização, a chave e a igualdade das linhas.
+    # on_changed(colunas) recebe, antes de cada linha alterada, os nomes (banco 1) das colunas diferentes.
+    batch_size1, batch_size2 = batch_size if isinstance(batch_size, (tuple, list)) else (batch_size, batch_size)
+
+    key_columns, columns, null_safe = resolve_key_columns(cursor1, table_name, selected_columns, key_columns)
+
+    dialect = common_dialect(cursor1, cursor2) if rules or checksum_rows else None
+    select_columns, client_columns = columns, []
+    if rules:
+        key_columns, columns, select_columns, client_columns = apply_rules(cursor1, cursor2, table_name, key_columns,
+                                                                          columns, rules, dialect)
+
+    on_batch = on_skip = None
+    if progress:
+        on_skip = progress.advance
+
+        def on_batch(batch):
+            progress.advance(len(batch), estimate_batch_bytes(batch))
+
+    # None representa a tabela inteira, sem restrição de faixa
+    key_ranges = [key_range]
+    # Com a chave normalizada, as faixas (sobre o valor original) não separam as linhas do mesmo jeito
+    if (checksum_rows and key_range != NULL_RANGE
+            and not (rules and any(rules.normalizes(column) for column in key_columns))):
+        if dialect:
+            checksum_columns = columns or fetch_column_names(cursor1, table_name)
+            key_ranges = changed_ranges(cursor1, cursor2, table_name, key_columns[0], checksum_columns, dialect,
+                                        sql_condition, checksum_rows, on_skip, key_range)
+            if null_safe and key_range is None:
+                # As faixas não incluem a chave NULL: essas linhas vêm antes, comparadas uma a uma,
+                # na mesma ordem de make_key (como a partição NULL_RANGE de partition.py)
+                key_ranges = chain([NULL_RANGE], key_ranges)
+
+    # Cada banco ordena a chave na ordem em que o merge join compara os valores
+    order_by1 = key_order_by(cursor1, table_name, key_columns, rules)
+    order_by2 = key_order_by(cursor2, table_name, key_columns, rules)
+
+    schema1 = schema2 = None
+    for key_range in key_ranges:
+        condition, params = range_condition(key_columns[0], key_range) if key_range else (None, [])
+        for cursor, order_by in ((cursor1, order_by1), (cursor2, order_by2)):
+            query = build_select(table_name, select_columns, sql_condition, order_by, condition)
+            cursor.execute(*((query, params) if params else (query,)))
+
+        if schema1 is None:
+            # As colunas são as mesmas em todas as faixas: o esquema é montado uma vez só
+            schema1 = Schema(cursor1.description)
+            schema2 = Schema(cursor2.description)
+            if on_schema:
+                on_schema(schema1, schema2, key_columns)
+            # Cada lado calcula a posição da chave, pois SELECT * pode trazer ordens diferentes
+            key1 = make_key(schema1.indexes(key_columns), null_safe)
+            key2 = make_key(schema2.indexes(key_columns), null_safe)
+            equal = schema1.row_comparer(schema2)
+            normalize1 = rules.normalizer(schema1, client_columns) if client_columns else None
+            normalize2 = rules.normalizer(schema2, client_columns) if client_columns else None
+            differ = schema1.column_differ(schema2)
+            if process_pool:
+                plan1, plan2 = process_pool.plans(schema1, schema2, key_columns, null_safe, rules, client_columns)
+
+        batches1 = iter_batches(cursor1, batch_size1)
+        batches2 = iter_batches(cursor2, batch_size2)
+        if process_pool:
+            # Os lotes são contados ao sair do banco, antes de ir para os processos
+            if on_batch:
+                batches1 = _counted(batches1, on_batch)
+                batches2 = _counted(batches2, on_batch)
+            batches1 = process_pool.prepare(batches1, plan1)
+            batches2 = process_pool.prepare(batches2, plan2)
+        elif normalize1:
+            # A normalização no cliente roda antes da fila, na thread de leitura de cada banco
+            batches1 = map(normalize1, batches1)
+            batches2 = map(normalize2, batches2)
+        if concurrent:
+            batches1 = prefetch(batches1, queue_size)
+            batches2 = prefetch(batches2, queue_size)
+
+        if process_pool:
+            differences = merge_prepared(iter_rows(batches1), iter_rows(batches2))
+        else:
+            differences = merge_join(iter_rows(batches1, on_batch), iter_rows(batches2, on_batch), key1, key2, equal)
+
+        for kind, row1, row2 in differences:
+            # As colunas diferentes são procuradas só nas linhas já marcadas como alteradas
+            if on_changed and kind == CHANGED:
+                on_changed(differ(row1, row2))
+            yield kind, row1, row2
+
+
+class Comparison:
+    # Comparação completa de uma tabela entre dois DSNs, independente de Qt.
+    # Pode ser percorrida como iterador de (tipo, linha_db1, linha_db2) ou
+    # executada com run(on_difference); on_progress recebe um progress.Progress e
+    # on_mismatch a lista de diferenças de estrutura entre os bancos, se houver.
+    # rules é um rules.CompareRules com as colunas ignoradas ou normalizadas e
+    # process_pool um processes.ProcessPool para as etapas de CPU. changed_columns e
+    # column_counts dizem quais colunas diferem nas linhas alteradas.
+    def __init__(self, db1, db2, table_name, sql_condition="", selected_columns=None, key_columns=None,
+                 batch_size=DEFAULT_BATCH_SIZE, concurrent=True, checksum_rows=None, on_progress=None,
+                 on_mismatch=None, connect=connect_dsn, rules=None, process_pool=None):
+        self.db1 = db1
+        self.db2 = db2
+        self.table_name = table_name
+        self.sql_condition = sql_condition
+        self.selected_columns = selected_columns
+        self.key_columns = key_columns
+        self.batch_size = batch_size
+        self.concurrent = concurrent
+        self.checksum_rows = checksum_rows
+        self.on_progress = on_progress
+        self.on_mismatch = on_mismatch
+        self.connect = connect
+        self.rules = rules
+        self.process_pool = process_pool
+
+        self.counts = {ONLY_DB1: 0, ONLY_DB2: 0, CHANGED: 0}
+        # Colunas diferentes da última linha alterada e quantas vezes cada coluna mudou
+        self.changed_columns = None
+        self.column_counts = Counter()
+        self.conn1 = None
+        self.conn2 = None
+        self.cursor1 = None
+        self.cursor2 = None
+        self.schema1 = None
+        self.schema2 = None
+        self.resolved_key_columns = None
+        self.mismatches = []
+        # SGBD de cada banco (checksum.detect_dialect), conhecido ao conectar
+        self.dialects = (None, None)
+
+    def __iter__(self):
+        differences = None
+        try:
+            progress = self.open()
+            differences = self.differences(progress)
+            for kind, row1, row2 in differences:
+                self.counts[kind] += 1
+                yield kind, row1, row2
+
+            if progress:
+                progress.finish()
+        finally:
+            # Encerra as leituras e os cursores antes de fechar (ou devolver ao pool) as conexões
+            if differences is not None:
+                differences.close()
+            self.release_connections()
+
+    def open(self):
+        # Conecta aos dois bancos; com on_progress, retorna o ProgressReporter da comparação
+        try:
+            self.conn1 = self.connect(self.db1)
+            self.conn2 = self.connect(self.db2)
+            self.cursor1 = self.conn1.cursor()
+            self.cursor2 = self.conn2.cursor()
+            self.dialects = (detect_dialect(self.cursor1), detect_dialect(self.cursor2))
+            if not self.on_progress:
+                return None
+            return ProgressReporter(self.total_rows(), self.on_progress)
+        except Exception:
+            self.release_connections()
+            raise
+
+    def total_rows(self):
+        # Cada linha lida de qualquer um dos lados conta como processada
+        return (count_rows(self.cursor1, self.table_name, self.sql_condition)
+                + count_rows(self.cursor2, self.table_name, self.sql_condition))
+
+    def differences(self, progress=None):
+        # (tipo, linha_db1, linha_db2) da tabela, lida pelos cursores já abertos
+        return compare_table(self.cursor1, self.cursor2, self.table_name, self.sql_condition, self.selected_columns,
+                             self.key_columns, progress, self.batch_size, self.concurrent,
+                             checksum_rows=self.checksum_rows, on_schema=self.set_schemas, rules=self.rules,
+                             process_pool=self.process_pool, on_changed=self.set_changed_columns)
+
+    def release_connections(self):
+        # Fecha os cursores e fecha (ou devolve ao pool) as conexões; pode ser chamado mais de uma vez
+        for cursor in (self.cursor1, self.cursor2):
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+        for conn in (self.conn1, self.conn2):
+            if conn is not None:
+                conn.close()
+        self.conn1 = self.conn2 = None
+
+    def run(self, on_difference=None):
+        for kind, row1, row2 in self:
+            if on_difference:
+                on_difference(kind, row1, row2)
+        return self.counts
+
+    def has_differences(self):
+        return any(self.counts.values())
+
+    def set_schemas(self, schema1, schema2, key_columns):
+        # Colunas de tipo diferente ou ausentes em um dos bancos são avisadas uma
+        # vez aqui e não contam como diferença em cada linha
+        self.schema1 = schema1
+        self.schema2 = schema2
+        self.resolved_key_columns = key_columns
+        self.mismatches = schema1.mismatches(schema2)
+        if self.mismatches and self.on_mismatch:
+            self.on_mismatch(self.mismatches)
+
+    def set_changed_columns(self, columns):
+        self.changed_columns = columns
+        self.column_counts.update(columns)
+
+    def columns(self):
+        # Nomes das colunas retornadas por cada banco na consulta em andamento
+        return self.schema1.names, self.schema2.names
+
+    def render_inserts(self, row1, row2):
+        # INSERTs das linhas de cada lado (None para o lado ausente)
+        statement1 = render_insert(self.table_name, self.schema1, row1) if row1 else None
+        statement2 = render_insert(self.table_name, self.schema2, row2) if row2 else None
+        return statement1, statement2
+
+    def run_to_store(self, store):
+        # Grava as diferenças no results.ResultStore conforme aparecem, sem acumular na memória
+        try:
+            for kind, row1, row2 in self:
+                store.add(row1, row2, self.schema1, self.schema2, self.changed_columns if kind == CHANGED else None)
+            # A chave permite gerar o script de sincronização a partir do resultado (veja sync.py)
+            store.key_columns = self.resolved_key_columns
+            store.rules = self.rules
+            store.dialects = self.dialects
+        finally:
+            store.close()
+        return store
@@ -0,0 +1,71 @@
+"""Leitura das linhas em lotes com fetchmany."""
+import queue
+import threading
+
+# Linhas por chamada ao driver; ajustável por banco conforme a latência da rede
+DEFAULT_BATCH_SIZE = 5000
+
+
+def iter_batches(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    # arraysize informa ao driver quantas linhas trazer por ida ao servidor
+    cursor.arraysize = batch_size
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def iter_rows(batches, on_batch=None):
+    # Achata os lotes em linhas; on_batch(lote) é chamado uma vez por lote
+    for batch in batches:
+        if on_batch:
+            on_batch(batch)
+        yield from batch
+
+
+# Lotes que cada lado pode adiantar antes de esperar o comparador
+DEFAULT_QUEUE_SIZE = 4
+
+_END = object()
+
+
+def prefetch(batches, queue_size=DEFAULT_QUEUE_SIZE):
+    # Lê os lotes em uma thread produtora e os entrega por uma fila limitada.
+    # O pyodbc libera o GIL durante o fetch, então as leituras dos dois bancos
+    # se sobrepõem; a fila cheia bloqueia o lado mais rápido (backpressure).
+    batch_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = batch_queue.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Libera a produtora caso o comparador pare antes do fim (erro ou cancelamento)
+        stop.set()
+        producer.join()
@@ -0,0 +1,164 @@
+"""Comparação de tabelas sem chave como multiconjuntos de linhas.
+
+Sem chave e sem poder ordenar no servidor, parear as linhas pela posição
+não faz sentido. Cada linha lida, em qualquer ordem, vira um resumo (hash)
+da linha inteira e é gravada em um de N arquivos temporários pelo prefixo
+do resumo, um conjunto de arquivos por banco. Cada partição é então
+comparada sozinha, contando quantas vezes cada resumo aparece em cada lado:
+linhas repetidas contam uma a uma e a memória usada é a de uma partição,
+não a da tabela.
+"""
+import os
+import pickle
+import struct
+import tempfile
+from collections import Counter
+from itertools import zip_longest
+
+from comparador.checksum import common_dialect
+from comparador.engine import ONLY_DB1, ONLY_DB2, Comparison, common_columns
+from comparador.fetch import iter_batches, prefetch
+from comparador.processes import digest_columns, row_digest
+from comparador.progress import estimate_batch_bytes
+from comparador.schema import Schema
+from comparador.sql import build_select
+
+# Partições por banco: a maior partição precisa caber na memória
+DEFAULT_SPILL_PARTITIONS = 256
+# Bytes acumulados na memória antes de gravar nos arquivos das partições
+DEFAULT_SPILL_BUFFER = 32 * 1024 * 1024
+
+_DIGEST_SIZE = 16
+_LENGTH = struct.Struct(">I")
+_HEADER_SIZE = _DIGEST_SIZE + _LENGTH.size
+
+
+class SpillPartitions:
+    # Arquivos de um lado da comparação, um por partição do resumo. Cada registro
+    # é o resumo seguido da linha (pickle com prefixo de tamanho)
+    def __init__(self, directory, name, partitions=DEFAULT_SPILL_PARTITIONS, buffer_size=DEFAULT_SPILL_BUFFER):
+        self.paths = [os.path.join(directory, f"{name}_{number}.bin") for number in range(partitions)]
+        self.buffers = [[] for _ in range(partitions)]
+        self.buffered = 0
+        self.buffer_size = buffer_size
+
+    def add(self, digest, row):
+        data = pickle.dumps(tuple(row), protocol=pickle.HIGHEST_PROTOCOL)
+        number = int.from_bytes(digest[:4], "big") % len(self.paths)
+        self.buffers[number].append(digest + _LENGTH.pack(len(data)) + data)
+        self.buffered += _HEADER_SIZE + len(data)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        # Acrescenta os registros acumulados a cada arquivo, sem manter centenas de arquivos abertos
+        for path, buffer in zip(self.paths, self.buffers):
+            if buffer:
+                with open(path, "ab") as file:
+                    file.write(b"".join(buffer))
+                buffer.clear()
+        self.buffered = 0
+
+    def records(self, number, rows=True):
+        # (resumo, linha) da partição; com rows=False, a linha é pulada e vem None
+        path = self.paths[number]
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as file:
+            while True:
+                header = file.read(_HEADER_SIZE)
+                if not header:
+                    break
+                (length,) = _LENGTH.unpack_from(header, _DIGEST_SIZE)
+                if rows:
+                    yield header[:_DIGEST_SIZE], pickle.loads(file.read(length))
+                else:
+                    file.seek(length, os.SEEK_CUR)
+                    yield header[:_DIGEST_SIZE], None
+
+
+def multiset_differences(spill1, spill2):
+    # (tipo, linha_db1, linha_db2) das linhas que sobram em um dos lados, partição a partição.
+    # Uma linha que aparece 3 vezes no banco 1 e 1 vez no banco 2 sai 2 vezes como ONLY_DB1
+    for number in range(len(spill1.paths)):
+        surplus1 = Counter(digest for digest, _ in spill1.records(number, rows=False))
+        surplus2 = Counter()
+        for digest, _ in spill2.records(number, rows=False):
+            if surplus1.get(digest):
+                surplus1[digest] -= 1
+            else:
+                surplus2[digest] += 1
+        surplus1 = +surplus1
+
+        # As linhas só são lidas de novo (e desserializadas) nas partições com sobras
+        for spill, surplus, kind in ((spill1, surplus1, ONLY_DB1), (spill2, surplus2, ONLY_DB2)):
+            if not surplus:
+                continue
+            for digest, row in spill.records(number):
+                if surplus.get(digest):
+                    surplus[digest] -= 1
+                    yield (kind, row, None) if kind == ONLY_DB1 else (kind, None, row)
+
+
+class MultisetComparison(Comparison):
+    # Comparison sem chave e sem ORDER BY (veja o início do módulo); aceita os mesmos
+    # argumentos de Comparison. Só há linhas ONLY_DB1 e ONLY_DB2: sem chave, uma linha
+    # alterada aparece como removida de um lado e incluída no outro. directory é onde
+    # ficam os arquivos temporários (padrão: o diretório temporário do sistema).
+    def __init__(self, *args, partitions=DEFAULT_SPILL_PARTITIONS, directory=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.partitions = partitions
+        self.directory = directory
+
+    def differences(self, progress=None):
+        columns = list(self.selected_columns or [])
+        select_columns, client_columns = columns, []
+        if self.rules:
+            columns = self.rules.keep(columns or common_columns(self.cursor1, self.cursor2, self.table_name))
+            select_columns, client_columns = self.rules.projection(columns,
+                                                                   common_dialect(self.cursor1, self.cursor2))
+
+        query = build_select(self.table_name, select_columns, self.sql_condition)
+        self.cursor1.execute(query)
+        self.cursor2.execute(query)
+        schema1 = Schema(self.cursor1.description)
+        schema2 = Schema(self.cursor2.description)
+        # A linha inteira (as colunas dos dois bancos) faz o papel da chave
+        self.set_schemas(schema1, schema2, [schema1.names[i] for i, _, _ in schema1.column_pairs(schema2)])
+        return self.compare_spilled(schema1, schema2, client_columns, progress)
+
+    def run_to_store(self, store):
+        store.unordered = True
+        return super().run_to_store(store)
+
+    def compare_spilled(self, schema1, schema2, client_columns, progress):
+        directory = tempfile.TemporaryDirectory(prefix="comparador-", dir=self.directory)
+        batch_sizes = self.batch_size if isinstance(self.batch_size, (tuple, list)) else (self.batch_size,) * 2
+        streams = []
+        try:
+            spills = [SpillPartitions(directory.name, name, self.partitions) for name in ("db1", "db2")]
+            normalizers = []
+            for cursor, batch_size, schema in zip((self.cursor1, self.cursor2), batch_sizes, (schema1, schema2)):
+                batches = iter_batches(cursor, batch_size)
+                streams.append(prefetch(batches) if self.concurrent else batches)
+                normalizers.append(self.rules.normalizer(schema, client_columns) if client_columns else None)
+
+            # Os dois bancos são lidos lado a lado; cada lote vai para os arquivos das partições
+            sides = list(zip(spills, normalizers, digest_columns(schema1, schema2)))
+            for batches in zip_longest(*streams):
+                for batch, (spill, normalize, columns) in zip(batches, sides):
+                    if batch is None:
+                        continue
+                    if progress:
+                        progress.advance(len(batch), estimate_batch_bytes(batch))
+                    for row in normalize(batch) if normalize else batch:
+                        spill.add(row_digest(row, columns), row)
+            for spill in spills:
+                spill.flush()
+
+            yield from multiset_differences(*spills)
+        finally:
+            for stream in streams:
+                if hasattr(stream, "close"):
+                    stream.close()
+            directory.cleanup()
@@ -0,0 +1,204 @@
+"""Comparação de uma tabela grande em partições da chave, em paralelo.
+
+A primeira coluna da chave é dividida em K faixas pelos quantis de uma
+amostra da tabela (TABLESAMPLE, SAMPLE ou RAND(), conforme o SGBD), de modo
+que o servidor só ordena a amostra, e não a tabela inteira; em bancos sem
+amostragem conhecida, em faixas de mesma largura entre MIN e MAX. Chaves de
+texto não são divididas: cada servidor compararia os limites pela sua
+collation. Cada faixa é comparada por uma thread com o seu próprio par de
+conexões, no máximo max_connections por DSN ao mesmo tempo. As diferenças
+de cada partição vão para um results.ResultStore e são reproduzidas na ordem
+das faixas, de modo que o relatório final sai ordenado pela chave.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from comparador.catalog import count_rows, fetch_text_columns
+from comparador.checksum import detect_dialect, key_bounds
+from comparador.engine import CHANGED, Comparison, compare_table, resolve_key_columns
+from comparador.results import ResultStore
+from comparador.sql import NULL_RANGE, build_select
+
+DEFAULT_PARTITIONS = 4
+DEFAULT_MAX_CONNECTIONS = 4
+# Linhas da amostra por partição usadas para calcular os quantis
+DEFAULT_SAMPLE_ROWS = 100
+_MIN_SAMPLE_PERCENT = 0.0001
+
+# (tabela com a amostra, condição da amostra) de cerca de percent % das linhas, por SGBD.
+# O MySQL não tem TABLESAMPLE: percorre a tabela, mas também só ordena a amostra
+_SAMPLES = {
+    "sqlserver": lambda table, percent: (f"{table} TABLESAMPLE SYSTEM ({percent:.6f} PERCENT)", None),
+    "postgresql": lambda table, percent: (f"{table} TABLESAMPLE SYSTEM ({percent:.6f})", None),
+    "oracle": lambda table, percent: (f"{table} SAMPLE ({percent:.6f})", None),
+    "mysql": lambda table, percent: (table, f"RAND() < {percent / 100:.8f}"),
+}
+
+
+def sample_bounds(cursor, table_name, key_column, partitions, sql_condition="", dialect=None,
+                  sample_rows=DEFAULT_SAMPLE_ROWS):
+    # Divisões da chave nos K quantis de uma amostra de cerca de sample_rows linhas por partição.
+    # O COUNT percorre a tabela sem ordená-la; só a amostra volta ordenada pelo servidor, para
+    # que as divisões sigam a ordem (collation) em que ele compara as faixas
+    if dialect not in _SAMPLES:
+        return []
+    total = count_rows(cursor, table_name, sql_condition)
+    if not total:
+        return []
+    percent = 100 * partitions * sample_rows / total
+    condition = f"{key_column} IS NOT NULL"
+    source = table_name
+    if percent < 100:
+        source, sample_condition = _SAMPLES[dialect](table_name, max(percent, _MIN_SAMPLE_PERCENT))
+        if sample_condition:
+            condition += f" AND {sample_condition}"
+    cursor.execute(build_select(source, [key_column], sql_condition, [key_column], condition))
+    keys = [row[0] for row in cursor.fetchall()]
+    return [keys[len(keys) * i // partitions] for i in range(1, partitions)] if keys else []
+
+
+def interpolated_bounds(start, end, partitions):
+    # Divisões de mesma largura entre start e end, para chaves numéricas ou de data
+    if type(start) is not type(end) or isinstance(start, bool):
+        return []
+    if isinstance(start, int):
+        return [start + (end - start) * i // partitions for i in range(1, partitions)]
+    if isinstance(start, (float, Decimal, datetime)):
+        return [start + (end - start) * i / partitions for i in range(1, partitions)]
+    if isinstance(start, date):
+        return [start + timedelta(days=(end - start).days * i // partitions) for i in range(1, partitions)]
+    return []
+
+
+def partition_ranges(cursor1, cursor2, table_name, key_column, partitions, sql_condition=""):
+    # Faixas (início, fim, inclui_fim) contíguas que cobrem a chave dos dois bancos. A primeira
+    # não tem início e a última não tem fim: linhas incluídas abaixo do MIN ou acima do MAX
+    # durante a comparação (ou antes de retomá-la) também são lidas
+    key_range = key_bounds(cursor1, cursor2, table_name, key_column, sql_condition)
+    if key_range is None:
+        return []
+    start, end, _ = key_range
+    try:
+        bounds = sample_bounds(cursor1, table_name, key_column, partitions, sql_condition, detect_dialect(cursor1))
+    except Exception:
+        # Amostragem recusada (ex.: TABLESAMPLE em uma view): desfaz a transação abortada
+        try:
+            cursor1.connection.rollback()
+        except Exception:
+            pass
+        bounds = []
+    if not bounds:
+        # Sem amostra, divisões de mesma largura entre o MIN e o MAX
+        bounds = interpolated_bounds(start, end, partitions)
+
+    points = []
+    for bound in bounds:
+        if bound is not None and start < bound < end and (not points or bound > points[-1]):
+            points.append(bound)
+    edges = [None] + points + [None]
+    return [(edges[i], edges[i + 1], i + 2 == len(edges)) for i in range(len(edges) - 1)]
+
+
+class PartitionedComparison(Comparison):
+    # Comparison que divide a tabela em partitions faixas da chave e compara até
+    # max_connections delas ao mesmo tempo; aceita os mesmos argumentos de Comparison
+    def __init__(self, *args, partitions=DEFAULT_PARTITIONS, max_connections=DEFAULT_MAX_CONNECTIONS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.partitions = partitions
+        self.max_connections = max_connections
+        self.schema_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def differences(self, progress=None):
+        if self.partitions <= 1:
+            return super().differences(progress)
+        ranges = self.plan_ranges(self.partitions)
+        if len(ranges) <= 1:
+            return super().differences(progress)
+        # As conexões do planejamento são liberadas (ou voltam ao pool) antes das partições
+        self.release_connections()
+        return self.compare_partitions(ranges, progress)
+
+    def plan_ranges(self, partitions):
+        # Faixas da chave pelos cursores já abertos; vazia (ou uma só) quando a tabela não pode ser dividida
+        key_columns, _, null_safe = resolve_key_columns(self.cursor1, self.table_name, self.selected_columns,
+                                                        self.key_columns)
+        # Regras que normalizam a chave mudam a ordem em relação às faixas do valor original
+        if self.rules and any(self.rules.normalizes(column) for column in key_columns):
+            return []
+        # Texto (e o GUID, que o driver descreve como texto) é comparado aos limites pela collation
+        # de cada servidor: com collations ou SGBDs diferentes, a mesma chave cairia em faixas
+        # diferentes e apareceria como só no banco 1 e só no banco 2
+        if any(fetch_text_columns(cursor, self.table_name, key_columns[:1]) for cursor in (self.cursor1, self.cursor2)):
+            return []
+        ranges = partition_ranges(self.cursor1, self.cursor2, self.table_name, key_columns[0], partitions,
+                                  self.sql_condition)
+        if null_safe and len(ranges) > 1:
+            # Linhas com a chave NULL ficam numa partição própria, a primeira na ordem
+            ranges = [NULL_RANGE] + ranges
+        return ranges
+
+    def compare_partitions(self, ranges, progress):
+        self.stopped.clear()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(len(ranges), self.max_connections)))
+        futures = [executor.submit(self.compare_partition, number, key_range, progress)
+                   for number, key_range in enumerate(ranges)]
+        try:
+            # Cada partição é reproduzida assim que termina, na ordem das faixas
+            for future in futures:
+                store = future.result()
+                changed_columns = store.changed_columns()
+                for kind, row1, row2 in store.differences():
+                    if kind == CHANGED:
+                        self.set_changed_columns(next(changed_columns))
+                    yield kind, row1, row2
+                store.release()
+        finally:
+            self.stopped.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def partition_store(self, number):
+        return ResultStore(self.table_name, db1=self.db1, db2=self.db2)
+
+    def compare_partition(self, number, key_range, progress):
+        # key_range None compara a tabela inteira
+        store = self.partition_store(number)
+        conn1 = conn2 = differences = None
+        changed_columns = None
+
+        def on_changed(columns):
+            nonlocal changed_columns
+            changed_columns = columns
+
+        try:
+            conn1 = self.connect(self.db1)
+            conn2 = self.connect(self.db2)
+            differences = compare_table(conn1.cursor(), conn2.cursor(), self.table_name, self.sql_condition,
+                                        self.selected_columns, self.key_columns, progress, self.batch_size,
+                                        self.concurrent, checksum_rows=self.checksum_rows,
+                                        on_schema=self.set_partition_schemas, rules=self.rules, key_range=key_range,
+                                        process_pool=self.process_pool, on_changed=on_changed)
+            for kind, row1, row2 in differences:
+                if self.stopped.is_set():
+                    break
+                store.add(row1, row2, self.schema1, self.schema2, changed_columns if kind == CHANGED else None)
+            store.key_columns = self.resolved_key_columns
+            store.rules = self.rules
+        finally:
+            if differences is not None:
+                differences.close()
+            for conn in (conn1, conn2):
+                if conn is not None:
+                    conn.close()
+            store.close()
+        return store
+
+    def set_partition_schemas(self, schema1, schema2, key_columns):
+        # Todas as partições leem as mesmas colunas: só a primeira registra (e avisa) o esquema
+        with self.schema_lock:
+            if self.schema1 is None:
+                self.set_schemas(schema1, schema2, key_columns)
@@ -0,0 +1,139 @@
+"""Etapas de CPU da comparação em processos auxiliares (multiprocessing).
+
+Depois que a leitura fica rápida, o trabalho em Python (normalizar as
+colunas, extrair a chave, comparar as linhas e formatar o resultado) ocupa
+um único núcleo por causa do GIL. Com um ProcessPool, cada lote lido vai
+para um processo como um único bytes (pickle das tuplas, não uma lista de
+pyodbc.Row); o processo normaliza as colunas, extrai a chave e calcula um
+resumo (hash) das colunas comparadas. O processo principal só faz o merge
+join das chaves e compara os resumos. Na exportação, cada processo lê e
+formata um bloco do arquivo de resultado e devolve o texto pronto.
+"""
+import datetime
+import hashlib
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from comparador.engine import make_key
+from comparador.render import RENDERERS
+from comparador.results import read_records
+from comparador.schema import canonical
+
+DEFAULT_PROCESSES = os.cpu_count() or 1
+# Registros formatados por tarefa na exportação
+DEFAULT_RENDER_CHUNK = 5000
+
+# Tipos em que valores iguais têm sempre o mesmo repr; as demais colunas (Decimal,
+# tipos diferentes nos dois bancos, driver sem tipo) entram no resumo pela forma canônica
+_REPR_TYPES = (str, int, bool, float, bytes, bytearray, datetime.date, datetime.datetime, datetime.time)
+
+# Planos já montados neste processo, pelo bytes recebido; cada comparação tem o seu
+_plans = {}
+_MAX_PLANS = 64
+
+
+def pack_batch(batch):
+    # Um único bytes com as tuplas do lote: pyodbc.Row não é serializável e a
+    # lista de objetos custaria mais para atravessar o pipe
+    return pickle.dumps([tuple(row) for row in batch], protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def digest_columns(schema1, schema2):
+    # [(posição, usa a forma canônica)] de cada lado, com as colunas presentes nos dois
+    # bancos na mesma ordem, para que linhas iguais tenham o mesmo resumo
+    columns1, columns2 = [], []
+    for index1, index2, same_type in schema1.column_pairs(schema2):
+        convert = not (same_type and schema1.types[index1] in _REPR_TYPES)
+        columns1.append((index1, convert))
+        columns2.append((index2, convert))
+    return columns1, columns2
+
+
+def row_digest(row, columns):
+    values = tuple(canonical(row[i]) if convert else row[i] for i, convert in columns)
+    return hashlib.blake2b(repr(values).encode("utf-8"), digest_size=16).digest()
+
+
+class RowPlan:
+    # O que um processo precisa para preparar os lotes de um lado da comparação;
+    # as funções são montadas no próprio processo, a partir do plano serializado
+    def __init__(self, schema, key_columns, null_safe, digest_columns, rules=None, client_columns=()):
+        self.key = make_key(schema.indexes(key_columns), null_safe)
+        self.digest_columns = digest_columns
+        self.normalize = rules.normalizer(schema, client_columns) if client_columns else None
+
+    def prepare(self, rows):
+        # (chaves, resumos, linhas normalizadas ou None quando as linhas não mudam)
+        if self.normalize:
+            rows = self.normalize(rows)
+        keys = [self.key(row) for row in rows]
+        digests = [row_digest(row, self.digest_columns) for row in rows]
+        return keys, digests, rows if self.normalize else None
+
+
+def prepare_batch(plan_data, data):
+    plan = _plans.get(plan_data)
+    if plan is None:
+        if len(_plans) >= _MAX_PLANS:
+            _plans.clear()
+        plan = _plans[plan_data] = RowPlan(*pickle.loads(plan_data))
+    return plan.prepare(pickle.loads(data))
+
+
+def render_chunk(path, table_name, schema, fmt, terminator, begin, end):
+    # Lê e formata os registros gravados entre begin e end do arquivo de resultado
+    render = RENDERERS[fmt]
+    return "".join(render(table_name, schema, row) + terminator for row in read_records(path, begin, end))
+
+
+class ProcessPool:
+    # Processos auxiliares compartilhados por todas as comparações da sessão, como
+    # connections.ConnectionPool; window é quantas tarefas de cada lado ficam em
+    # andamento antes de esperar a primeira (limita a memória dos lotes adiantados)
+    def __init__(self, processes=DEFAULT_PROCESSES, window=None, render_chunk_size=DEFAULT_RENDER_CHUNK):
+        self.processes = processes
+        self.window = window or processes
+        self.render_chunk_size = render_chunk_size
+        self.executor = ProcessPoolExecutor(max_workers=processes)
+
+    def plans(self, schema1, schema2, key_columns, null_safe, rules=None, client_columns=()):
+        # Um plano (RowPlan) por lado, serializado uma vez por comparação e enviado junto com cada lote
+        rules = rules if client_columns else None
+        return tuple(pickle.dumps((schema, list(key_columns), null_safe, columns, rules, list(client_columns)),
+                                  protocol=pickle.HIGHEST_PROTOCOL)
+                     for schema, columns in zip((schema1, schema2), digest_columns(schema1, schema2)))
+
+    def ordered(self, function, tasks):
+        # Como executor.map, mas com no máximo window tarefas em andamento. tasks produz
+        # (contexto, argumentos); sai (contexto, resultado) na ordem de entrada
+        pending = deque()
+        try:
+            for context, args in tasks:
+                pending.append((context, self.executor.submit(function, *args)))
+                if len(pending) >= self.window:
+                    context, future = pending.popleft()
+                    yield context, future.result()
+            while pending:
+                context, future = pending.popleft()
+                yield context, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def prepare(self, batches, plan):
+        # Lotes de (chave, resumo, linha), na mesma ordem dos lotes lidos
+        tasks = ((batch, (plan, pack_batch(batch))) for batch in batches)
+        for batch, (keys, digests, rows) in self.ordered(prepare_batch, tasks):
+            yield list(zip(keys, digests, batch if rows is None else rows))
+
+    def render(self, result_file, fmt, terminator):
+        # Texto formatado do results.ResultFile, em blocos, na ordem do arquivo
+        tasks = ((None, (result_file.path, result_file.table_name, result_file.schema, fmt, terminator, begin, end))
+                 for begin, end in result_file.chunks(self.render_chunk_size))
+        for _, text in self.ordered(render_chunk, tasks):
+            yield text
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,99 @@
+"""Relatório de progresso com emissão limitada, vazão e tempo restante."""
+import threading
+import time
+from collections import namedtuple
+
+Progress = namedtuple("Progress", "percent processed_rows total_rows rows_per_second bytes_per_second eta_seconds")
+
+# Intervalo mínimo entre atualizações quando o percentual não muda
+DEFAULT_INTERVAL = 0.5
+
+
+def estimate_batch_bytes(batch):
+    # Estima o volume do lote pelo tamanho da primeira linha, sem percorrer todas
+    if not batch:
+        return 0
+    row_bytes = sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+                    for value in batch[0] if value is not None)
+    return row_bytes * len(batch)
+
+
+class ProgressReporter:
+    # Acumula as linhas processadas e só chama callback(Progress) quando o
+    # percentual muda ou quando passa o intervalo, em vez de a cada linha.
+    # Pode ser compartilhado entre threads (ex.: partições da mesma tabela).
+    def __init__(self, total_rows, callback, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self.total_rows = total_rows
+        self.callback = callback
+        self.interval = interval
+        self.clock = clock
+
+        self.processed_rows = 0
+        self.processed_bytes = 0
+        # Linhas já processadas em uma execução anterior (resume): contam no percentual, não na vazão
+        self.resumed_rows = 0
+        self.resumed_bytes = 0
+        self.started_at = clock()
+        self.last_emit = self.started_at
+        self.last_percent = -1
+        self.lock = threading.Lock()
+
+    def percent(self):
+        if not self.total_rows:
+            return 0
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
+    def advance(self, rows, nbytes=0):
+        with self.lock:
+            self.processed_rows += rows
+            self.processed_bytes += nbytes
+
+            now = self.clock()
+            percent = self.percent()
+            if percent != self.last_percent or now - self.last_emit >= self.interval:
+                self.emit(percent, now)
+
+    def resume(self, rows, nbytes=0):
+        # Conta de uma vez o que uma execução anterior já processou (ex.: faixas de um checkpoint)
+        with self.lock:
+            self.resumed_rows += rows
+            self.resumed_bytes += nbytes
+            self.processed_rows += rows
+            self.processed_bytes += nbytes
+            self.emit(self.percent(), self.clock())
+
+    def finish(self):
+        with self.lock:
+            self.emit(100, self.clock())
+
+    def snapshot(self, percent, now):
+        elapsed = now - self.started_at
+        rows_per_second = (self.processed_rows - self.resumed_rows) / elapsed if elapsed > 0 else 0.0
+        bytes_per_second = (self.processed_bytes - self.resumed_bytes) / elapsed if elapsed > 0 else 0.0
+        eta_seconds = None
+        if rows_per_second and self.total_rows:
+            eta_seconds = max(0, self.total_rows - self.processed_rows) / rows_per_second
+        return Progress(percent, self.processed_rows, self.total_rows, rows_per_second, bytes_per_second, eta_seconds)
+
+    def emit(self, percent, now):
+        self.last_percent = percent
+        self.last_emit = now
+        self.callback(self.snapshot(percent, now))
+
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+def format_progress(progress):
+    # Texto para a barra de status: "12345 linhas/s · 3.2 MB/s · restante 00:04:12"
+    text = f"{progress.rows_per_second:.0f} linhas/s · {format_bytes(progress.bytes_per_second)}/s"
+    if progress.eta_seconds is not None:
+        minutes, seconds = divmod(int(progress.eta_seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        text += f" · restante {hours:02d}:{minutes:02d}:{seconds:02d}"
+    return text
@@ -0,0 +1,105 @@
+"""Formatação das linhas diferentes, feita só na exibição ou na exportação.
+
+Cada renderizador recebe (tabela, esquema, linha) com os valores originais
+da linha e devolve o texto de um registro, sem quebra de linha no final.
+O esquema (schema.Schema) já traz os nomes das colunas e o formatador de
+cada uma, escolhido uma vez pelo tipo informado em cursor.description.
+"""
+import csv
+import datetime
+import decimal
+import io
+import json
+import uuid
+
+
+def format_str(val):
+    # Duplica as aspas simples e as barras invertidas
+    val = val.replace("\\", "\\\\").replace("'", "''")
+    return f"'{val}'"
+
+
+def format_number(val):
+    return str(val)
+
+
+def format_bool(val):
+    return "1" if val else "0"
+
+
+def format_datetime(val):
+    return f"'{val.isoformat(' ')}'"
+
+
+def format_date(val):
+    return f"'{val.isoformat()}'"
+
+
+def format_bytes(val):
+    return f"0x{bytes(val).hex()}"
+
+
+def format_quoted(val):
+    return f"'{val}'"
+
+
+# Formatador por tipo Python; é o mesmo tipo que o pyodbc informa em cursor.description
+FORMATTERS = {
+    str: format_str,
+    int: format_number,
+    float: format_number,
+    decimal.Decimal: format_number,
+    bool: format_bool,
+    datetime.datetime: format_datetime,
+    datetime.date: format_date,
+    datetime.time: format_date,
+    bytes: format_bytes,
+    bytearray: format_bytes,
+    uuid.UUID: format_quoted,
+}
+
+
+def format_any(val):
+    # Para drivers que não informam o tipo da coluna, escolhe pelo valor
+    return FORMATTERS.get(type(val), format_number)(val)
+
+
+def render_value(val):
+    if val is None:
+        return 'NULL'
+    return format_any(val)
+
+
+def render_values(table_name, schema, row):
+    return f"({', '.join(schema.format_row(row))})"
+
+
+def render_insert(table_name, schema, row):
+    return f"INSERT INTO {table_name} ({schema.column_list}) VALUES {render_values(table_name, schema, row)}"
+
+
+def render_csv(table_name, schema, row):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(["" if val is None else val for val in row])
+    return buffer.getvalue()
+
+
+def render_json(table_name, schema, row):
+    # Tipos sem equivalente em JSON (Decimal, datetime, bytes) viram texto
+    return json.dumps(dict(zip(schema.names, row)), default=str, ensure_ascii=False)
+
+
+RENDERERS = {
+    "insert": render_insert,
+    "values": render_values,
+    "csv": render_csv,
+    "json": render_json,
+}
+
+# Extensão do arquivo exportado em cada formato
+EXTENSIONS = {
+    "insert": "sql",
+    "values": "sql",
+    "csv": "csv",
+    "json": "jsonl",
+}
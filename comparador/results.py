@@ -0,0 +1,309 @@
+"""Gravação incremental das linhas diferentes em arquivos (spill) no disco.
+
+Em vez de acumular listas de INSERTs na memória, cada lado da comparação
+grava suas linhas conforme aparecem, como tuplas com os valores originais
+(pickle com prefixo de tamanho) e um único cabeçalho com o esquema.
+ResultFile se comporta como uma sequência somente leitura (len, bool,
+índice, iteração) e só formata as linhas (render.RENDERERS) ao exibir ou exportar.
+ResultStore também guarda, um byte por diferença, de que lado veio cada uma,
+para refazer a sequência (tipo, linha_db1, linha_db2) sem reler os bancos,
+e as colunas diferentes de cada linha alterada.
+
+Ao lado de cada arquivo fica um índice (.idx) com a posição de cada registro
+em 8 bytes fixos; os dois são lidos por mmap, então a linha N é lida direto,
+sem percorrer o arquivo. Ao fechar, o ResultStore grava o restante do estado
+em um arquivo .meta, e ResultStore.open reabre o resultado depois, sem
+consultar os bancos.
+"""
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+from array import array
+from collections import Counter
+
+from comparador.engine import CHANGED, ONLY_DB1, ONLY_DB2
+from comparador.render import EXTENSIONS, RENDERERS, render_csv
+from comparador.schema import Schema
+
+_BIN_MAGIC = b"CMPRBIN1"
+_BIN_LENGTH = struct.Struct(">I")
+# Uma posição por registro no índice, na ordem de bytes da máquina (a do array("q") e do memoryview)
+_INDEX = struct.Struct("=q")
+
+# Códigos do lado de cada diferença: 1 = banco 1, 2 = banco 2, 3 = os dois (alterada)
+_KINDS = {1: ONLY_DB1, 2: ONLY_DB2, 3: CHANGED}
+
+
+class ResultFile:
+    # Com existing=True, reabre um arquivo já gravado (e o seu índice) somente para leitura
+    def __init__(self, path, table_name, owner=None, existing=False):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.table_name = table_name
+        self.schema = None
+        self.columns = None
+        # Posição de início de cada registro, para ler qualquer linha sem percorrer o arquivo:
+        # um array enquanto o arquivo é gravado, o índice mapeado quando é reaberto
+        self.offsets = array("q")
+        self.size = 0
+        # Mantém vivo o diretório temporário enquanto o arquivo é usado
+        self.owner = owner
+        self.mapped = None
+        self.mapped_index = None
+
+        if existing:
+            self.file = self.index_file = None
+            self.size = os.path.getsize(path)
+            if os.path.getsize(self.index_path):
+                with open(self.index_path, "rb") as file:
+                    self.mapped_index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.offsets = memoryview(self.mapped_index).cast("q")
+                self.schema = Schema(pickle.loads(self.view()[len(_BIN_MAGIC) + _BIN_LENGTH.size:self.offsets[0]]))
+                self.columns = self.schema.names
+        else:
+            self.file = open(path, "wb")
+            self.index_file = open(self.index_path, "wb")
+
+    def write(self, schema, row):
+        if self.schema is None:
+            self.schema = schema
+            self.columns = schema.names
+            self.write_bytes(_BIN_MAGIC + _bin_record(schema.description))
+        self.offsets.append(self.size)
+        self.index_file.write(_INDEX.pack(self.size))
+        self.write_bytes(_bin_record(tuple(row)))
+
+    def write_bytes(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        for file in (self.file, self.index_file):
+            if file and not file.closed:
+                file.flush()
+
+    def close(self):
+        for file in (self.file, self.index_file):
+            if file and not file.closed:
+                file.close()
+
+    def release(self):
+        # Desfaz os mapeamentos (no Windows, o arquivo mapeado não pode ser apagado)
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+            self.offsets = array("q")
+        for mapped in (self.mapped, self.mapped_index):
+            if mapped is not None:
+                mapped.close()
+        self.mapped = self.mapped_index = None
+
+    def view(self):
+        # O arquivo de dados mapeado na memória; mapeado de novo se cresceu desde então
+        self.flush()
+        if self.mapped is None or len(self.mapped) < self.size:
+            with open(self.path, "rb") as file:
+                self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapped
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __bool__(self):
+        return len(self.offsets) > 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError(index)
+        return next(self.records(index, index + 1))
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=0, stop=None):
+        # Tuplas com os valores originais das linhas [start, stop)
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        if start >= stop:
+            return
+        data = self.view()
+        for index in range(start, stop):
+            end = self.offsets[index + 1] if index + 1 < len(self.offsets) else self.size
+            yield pickle.loads(data[self.offsets[index] + _BIN_LENGTH.size:end])
+
+    def chunks(self, size):
+        # Posições (início, fim) de blocos de até size registros, para ler o arquivo em partes
+        self.flush()
+        for start in range(0, len(self.offsets), size):
+            stop = start + size
+            yield self.offsets[start], self.offsets[stop] if stop < len(self.offsets) else self.size
+
+    def rendered(self, fmt="insert", start=0, stop=None):
+        render = RENDERERS[fmt]
+        for row in self.records(start, stop):
+            yield render(self.table_name, self.schema, row)
+
+    def export(self, path, fmt="insert", process_pool=None):
+        # Grava o resultado formatado sem carregá-lo inteiro; csv inclui o cabeçalho.
+        # Com process_pool (processes.ProcessPool), os blocos são formatados em outros processos
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            if fmt == "csv" and self.schema:
+                file.write(render_csv(self.table_name, self.schema, self.schema.names) + "\n")
+            terminator = ";\n" if fmt in ("insert", "values") else "\n"
+            if process_pool:
+                for text in process_pool.render(self, fmt, terminator):
+                    file.write(text)
+            else:
+                for text in self.rendered(fmt):
+                    file.write(text + terminator)
+
+
+def _bin_record(value):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    return _BIN_LENGTH.pack(len(data)) + data
+
+
+def read_records(path, begin, end):
+    # Registros gravados entre as posições begin e end, sem depender do índice em memória
+    with open(path, "rb") as file:
+        file.seek(begin)
+        data = file.read(end - begin)
+    position = 0
+    while position < len(data):
+        (length,) = _BIN_LENGTH.unpack_from(data, position)
+        position += _BIN_LENGTH.size
+        yield pickle.loads(data[position:position + length])
+        position += length
+
+
+def format_column_counts(counts, limit=10):
+    # "valor (12), nome (3)", das colunas que mais mudaram nas linhas alteradas
+    counts = Counter(counts)
+    text = ", ".join(f"{column} ({count})" for column, count in counts.most_common(limit))
+    if len(counts) > limit:
+        text += f" e mais {len(counts) - limit}"
+    return text
+
+
+# Atributos do ResultStore gravados no arquivo .meta
+_META_FIELDS = ("table_name", "names", "file_prefix", "schema1", "schema2", "key_columns", "rules", "unordered",
+                "kinds", "column_indexes", "column_ends", "column_counts", "dialects")
+
+
+class ResultStore:
+    # Um ResultFile por banco; sem diretório, usa um temporário apagado junto com o objeto.
+    # Com um diretório informado, o resultado pode ser reaberto depois por ResultStore.open(meta_path)
+    def __init__(self, table_name, directory=None, db1="db1", db2="db2"):
+        self.table_name = table_name
+        self.temporary_directory = None
+        if directory is None:
+            self.temporary_directory = tempfile.TemporaryDirectory(prefix="comparador-")
+            directory = self.temporary_directory.name
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        self.names = (db1, db2)
+        self.schema1 = None
+        self.schema2 = None
+        self.key_columns = None
+        # Regras de comparação usadas: com elas as linhas gravadas estão normalizadas
+        self.rules = None
+        # Comparação sem chave (multiset.py): sem chave, um DELETE apagaria todas as cópias da linha
+        self.unordered = False
+        # SGBD de cada banco (checksum.detect_dialect), para os literais do script de sincronização
+        self.dialects = (None, None)
+        self.kinds = array("B")
+        # Posições (banco 1) das colunas diferentes de cada linha alterada, em sequência;
+        # column_ends marca onde termina cada linha
+        self.column_indexes = array("H")
+        self.column_ends = array("I")
+        self.column_counts = Counter()
+        self.file_prefix = "".join(c if c.isalnum() or c in "._-" else "_" for c in table_name)
+        self.db1, self.db2 = (ResultFile(path, table_name, self) for path in self.paths())
+
+    @classmethod
+    def open(cls, meta_path):
+        # Reabre, somente para leitura, um resultado gravado com ResultStore(directory=...) ou save()
+        with open(meta_path, "rb") as file:
+            state = pickle.load(file)
+        store = cls.__new__(cls)
+        # Resultados gravados antes de existir o campo
+        store.dialects = (None, None)
+        store.__dict__.update(state)
+        store.temporary_directory = None
+        store.directory = os.path.dirname(os.path.abspath(meta_path))
+        store.db1, store.db2 = (ResultFile(path, store.table_name, store, existing=True) for path in store.paths())
+        return store
+
+    def paths(self):
+        return [os.path.join(self.directory, f"{self.file_prefix}_{name}.bin") for name in self.names]
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, f"{self.file_prefix}.meta")
+
+    def add(self, row1, row2, schema1, schema2, changed_columns=None):
+        self.schema1 = schema1
+        self.schema2 = schema2
+        self.kinds.append((1 if row1 else 0) | (2 if row2 else 0))
+        if row1 and row2:
+            self.column_indexes.extend(schema1.index(column) for column in changed_columns or ())
+            self.column_ends.append(len(self.column_indexes))
+            self.column_counts.update(changed_columns or ())
+        if row1:
+            self.db1.write(schema1, row1)
+        if row2:
+            self.db2.write(schema2, row2)
+
+    def close(self):
+        # Fecha os arquivos e grava o .meta, que permite reabrir o resultado
+        self.db1.close()
+        self.db2.close()
+        with open(self.meta_path, "wb") as file:
+            pickle.dump({name: getattr(self, name) for name in _META_FIELDS}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def save(self, directory):
+        # Copia o resultado (por exemplo, de um diretório temporário) para directory; retorna o .meta
+        os.makedirs(directory, exist_ok=True)
+        self.close()
+        for source in [self.meta_path] + [name for path in self.paths() for name in (path, path + ".idx")]:
+            shutil.copyfile(source, os.path.join(directory, os.path.basename(source)))
+        return os.path.join(directory, os.path.basename(self.meta_path))
+
+    def release(self):
+        self.db1.release()
+        self.db2.release()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def differences(self):
+        # (tipo, linha_db1, linha_db2) na ordem em que a comparação as encontrou
+        rows1 = iter(self.db1)
+        rows2 = iter(self.db2)
+        for code in self.kinds:
+            row1 = next(rows1) if code & 1 else None
+            row2 = next(rows2) if code & 2 else None
+            yield _KINDS[code], row1, row2
+
+    def changed_columns(self):
+        # Nomes das colunas diferentes de cada linha alterada, na ordem de differences()
+        start = 0
+        for end in self.column_ends:
+            yield [self.schema1.names[i] for i in self.column_indexes[start:end]]
+            start = end
+
+    def export(self, directory, fmt="insert", process_pool=None):
+        # Exporta cada lado com diferenças no formato pedido; retorna os arquivos gravados
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, result_file in zip(self.names, (self.db1, self.db2)):
+            if result_file:
+                path = os.path.join(directory, f"{self.file_prefix}_{name}.{EXTENSIONS[fmt]}")
+                result_file.export(path, fmt, process_pool)
+                paths.append(path)
+        return paths
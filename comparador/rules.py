@@ -0,0 +1,179 @@
+"""Regras de comparação por coluna.
+
+Cada coluna pode ser ignorada ou normalizada antes da comparação: sem
+diferenciar maiúsculas (case), sem espaços nas pontas (trim), números
+arredondados (round=N) e datas truncadas (truncate=second|minute|hour|day).
+Colunas ignoradas saem do SELECT. As normalizações viram expressões no
+SELECT quando os dois bancos usam o mesmo SGBD e ele tem a função; senão
+são aplicadas no cliente, coluna a coluna sobre cada lote lido.
+
+Formato em texto: "nome:case,trim; valor:round=2; alterado_em:truncate=minute; obs:ignore"
+"""
+import datetime
+import decimal
+
+from comparador.schema import plain_name
+
+IGNORE = "ignore"
+CASE = "case"
+TRIM = "trim"
+ROUND = "round"
+TRUNCATE = "truncate"
+KINDS = (IGNORE, CASE, TRIM, ROUND, TRUNCATE)
+
+TRUNCATE_UNITS = ("second", "minute", "hour", "day")
+
+_ORACLE_UNITS = {"minute": "MI", "hour": "HH", "day": "DD"}
+
+# Campos zerados ao truncar um datetime em cada unidade
+_TRUNCATE_FIELDS = {
+    "second": {"microsecond": 0},
+    "minute": {"second": 0, "microsecond": 0},
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0},
+}
+
+
+def sql_expression(kind, arg, column, dialect):
+    # Expressão SQL da regra sobre column, ou None se o SGBD não tem como aplicá-la
+    if kind == CASE:
+        return f"UPPER({column})"
+    if kind == TRIM:
+        return f"LTRIM(RTRIM({column}))" if dialect == "sqlserver" else f"TRIM({column})"
+    if kind == ROUND:
+        return f"ROUND({column}, {arg})"
+    if kind == TRUNCATE:
+        if dialect == "postgresql":
+            return f"date_trunc('{arg}', {column})"
+        if dialect == "sqlserver" and arg != "second":
+            return f"DATEADD({arg}, DATEDIFF({arg}, 0, {column}), 0)"
+        if dialect == "oracle" and arg != "second":
+            return f"TRUNC({column}, '{_ORACLE_UNITS[arg]}')"
+    return None
+
+
+def client_function(kind, arg):
+    # Mesma regra aplicada em Python a um valor (NULL passa direto)
+    if kind == CASE:
+        return lambda val: val.upper() if isinstance(val, str) else val
+    if kind == TRIM:
+        return lambda val: val.strip(" ") if isinstance(val, str) else val
+    if kind == ROUND:
+        return lambda val: round(val, arg) if isinstance(val, (float, decimal.Decimal)) else val
+    if kind == TRUNCATE:
+        fields = _TRUNCATE_FIELDS[arg]
+        return lambda val: val.replace(**fields) if isinstance(val, datetime.datetime) else val
+    raise ValueError(f"Regra sem aplicação no cliente: {kind}")
+
+
+def _compose(functions):
+    def apply(val):
+        for function in functions:
+            val = function(val)
+        return val
+    return apply
+
+
+def parse_rules(text):
+    # "col:regra[=arg][,regra...]; col2:..." -> {coluna: [(regra, argumento)]}
+    rules = {}
+    for item in text.split(";"):
+        if not item.strip():
+            continue
+        column, separator, specs = item.partition(":")
+        if not separator or not column.strip():
+            raise ValueError(f"Regra inválida (use coluna:regra): {item.strip()!r}")
+        for spec in specs.split(","):
+            kind, _, arg = spec.strip().partition("=")
+            kind = kind.strip().lower()
+            if kind == ROUND:
+                try:
+                    arg = int(arg)
+                except ValueError:
+                    raise ValueError(f"round exige o número de casas: {spec.strip()!r}")
+            elif kind == TRUNCATE:
+                arg = arg.strip().lower()
+                if arg not in TRUNCATE_UNITS:
+                    raise ValueError(f"truncate exige uma unidade ({', '.join(TRUNCATE_UNITS)}): {spec.strip()!r}")
+            elif kind in KINDS:
+                arg = None
+            else:
+                raise ValueError(f"Regra desconhecida: {kind!r} (use {', '.join(KINDS)})")
+            rules.setdefault(column.strip(), []).append((kind, arg))
+    return rules
+
+
+class CompareRules:
+    def __init__(self, rules=None):
+        # rules: {coluna: [(regra, argumento)]}, como devolve parse_rules
+        self.columns = {plain_name(column): column for column in rules or {}}
+        self.rules = {plain_name(column): list(column_rules) for column, column_rules in (rules or {}).items()}
+
+    @classmethod
+    def parse(cls, text):
+        return cls(parse_rules(text))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __str__(self):
+        specs = []
+        for name, column_rules in self.rules.items():
+            text = ",".join(kind if arg is None else f"{kind}={arg}" for kind, arg in column_rules)
+            specs.append(f"{self.columns[name]}:{text}")
+        return "; ".join(specs)
+
+    def ignores(self, column):
+        return any(kind == IGNORE for kind, _ in self.rules.get(plain_name(column), ()))
+
+    def normalizes(self, column):
+        return any(kind != IGNORE for kind, _ in self.rules.get(plain_name(column), ()))
+
+    def keep(self, columns):
+        return [column for column in columns if not self.ignores(column)]
+
+    def expression(self, column, dialect):
+        # Expressão SQL com todas as normalizações de column (a própria coluna se não há
+        # nenhuma), ou None se alguma regra não tem expressão no SGBD
+        expression = column
+        for kind, arg in self.rules.get(plain_name(column), ()):
+            if kind != IGNORE:
+                expression = sql_expression(kind, arg, expression, dialect) if dialect else None
+                if expression is None:
+                    break
+        return expression
+
+    def projection(self, columns, dialect):
+        # (expressões do SELECT, colunas normalizadas no cliente). Uma coluna só vai para
+        # o servidor se todas as suas regras têm expressão no SGBD; o alias mantém o nome.
+        expressions, client_columns = [], []
+        for column in columns:
+            expression = self.expression(column, dialect)
+            if not self.normalizes(column):
+                expressions.append(column)
+            elif expression is None:
+                expressions.append(column)
+                client_columns.append(column)
+            else:
+                expressions.append(f"{expression} AS {column}")
+        return expressions, client_columns
+
+    def normalizer(self, schema, client_columns):
+        # Função lote -> lote que normaliza as colunas client_columns; None se não há nenhuma
+        functions = {}
+        for column in client_columns:
+            column_rules = [(kind, arg) for kind, arg in self.rules[plain_name(column)] if kind != IGNORE]
+            functions[schema.index(column)] = _compose([client_function(kind, arg) for kind, arg in column_rules])
+        if not functions:
+            return None
+
+        def normalize(batch):
+            # Transpõe o lote para aplicar cada regra a uma coluna inteira de uma vez
+            if not batch:
+                return batch
+            columns = list(zip(*batch))
+            for index, function in functions.items():
+                columns[index] = [None if val is None else function(val) for val in columns[index]]
+            return list(zip(*columns))
+
+        return normalize
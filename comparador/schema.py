@@ -0,0 +1,121 @@
+"""Esquema de uma consulta: nomes, tipos e formatadores das colunas.
+
+Montado uma vez a partir de cursor.description e reaproveitado pela
+comparação e por todos os renderizadores, em vez de ser refeito a cada
+linha diferente. Os esquemas dos dois bancos são comparados antes das
+linhas, para que uma diferença de tipo apareça uma vez só.
+"""
+import datetime
+import decimal
+
+from comparador.render import FORMATTERS, format_any
+
+_NUMBERS = (int, float, decimal.Decimal)
+
+
+def plain_name(column):
+    # Remove delimitadores ([col], "col") para comparar nomes de colunas
+    return column.strip('[]"`').lower()
+
+
+def type_name(type_code):
+    return getattr(type_code, "__name__", str(type_code))
+
+
+def canonical(val):
+    # Forma comum para comparar valores de colunas com tipos diferentes nos dois
+    # bancos (ex.: INT e DECIMAL, DATE e VARCHAR); números iguais têm a mesma forma
+    if val is None or isinstance(val, bool):
+        return val
+    if isinstance(val, _NUMBERS):
+        try:
+            return decimal.Decimal(str(val)).normalize()
+        except decimal.InvalidOperation:
+            return str(val)
+    if isinstance(val, (datetime.date, datetime.time)):
+        return val.isoformat()
+    if isinstance(val, (bytes, bytearray)):
+        return bytes(val).hex()
+    return str(val)
+
+
+class Schema:
+    def __init__(self, description):
+        # Só os 7 campos da DB-API, para o esquema poder ser gravado junto com o resultado
+        self.description = [tuple(column[:7]) for column in description]
+        self.names = [column[0] for column in self.description]
+        self.types = [column[1] for column in self.description]
+        self.plain_names = [plain_name(name) for name in self.names]
+        self.column_list = ", ".join(self.names)
+        self.formatters = [FORMATTERS.get(type_code, format_any) for type_code in self.types]
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, column):
+        return self.plain_names.index(plain_name(column))
+
+    def indexes(self, columns):
+        return [self.index(column) for column in columns]
+
+    def format_row(self, row):
+        return ['NULL' if val is None else formatter(val) for formatter, val in zip(self.formatters, row)]
+
+    def same_type(self, index, other, other_index):
+        # Drivers sem tipo na descrição (type_code None) são tratados como compatíveis
+        type1, type2 = self.types[index], other.types[other_index]
+        return type1 is None or type2 is None or type1 == type2
+
+    def mismatches(self, other):
+        # Diferenças de estrutura entre os dois bancos, uma mensagem por coluna
+        messages = []
+        other_names = set(other.plain_names)
+        for index, name in enumerate(self.plain_names):
+            if name not in other_names:
+                messages.append(f"coluna {self.names[index]} só existe no banco 1")
+            else:
+                other_index = other.plain_names.index(name)
+                if not self.same_type(index, other, other_index):
+                    messages.append(f"coluna {self.names[index]}: {type_name(self.types[index])} no banco 1 e "
+                                    f"{type_name(other.types[other_index])} no banco 2")
+        names = set(self.plain_names)
+        messages += [f"coluna {other.names[index]} só existe no banco 2"
+                     for index, name in enumerate(other.plain_names) if name not in names]
+        return messages
+
+    def column_pairs(self, other):
+        # (posição aqui, posição no outro esquema, mesmo tipo) das colunas presentes nos dois
+        pairs = []
+        for index, name in enumerate(self.plain_names):
+            if name in other.plain_names:
+                other_index = other.plain_names.index(name)
+                pairs.append((index, other_index, self.same_type(index, other, other_index)))
+        return pairs
+
+    def column_differ(self, other):
+        # differ(row1, row2) -> nomes (deste esquema) das colunas com valores diferentes,
+        # pareadas como em row_comparer; usado só nas linhas já marcadas como alteradas
+        pairs = self.column_pairs(other)
+
+        def differ(row1, row2):
+            return [self.names[i1] for i1, i2, same_type in pairs
+                    if (row1[i1] != row2[i2] if same_type else canonical(row1[i1]) != canonical(row2[i2]))]
+
+        return differ
+
+    def row_comparer(self, other):
+        # None quando as linhas podem ser comparadas direto como tuplas. Senão,
+        # equal(row1, row2) pareia as colunas pelo nome, ignora as que só existem
+        # em um dos bancos e compara pela forma canônica as que mudaram de tipo.
+        if self.plain_names == other.plain_names and not self.mismatches(other):
+            return None
+
+        pairs = self.column_pairs(other)
+        same = [(i1, i2) for i1, i2, same_type in pairs if same_type]
+        converted = [(i1, i2) for i1, i2, same_type in pairs if not same_type]
+
+        def equal(row1, row2):
+            return (all(row1[i1] == row2[i2] for i1, i2 in same)
+                    and all(canonical(row1[i1]) == canonical(row2[i2]) for i1, i2 in converted))
+
+        return equal
@@ -0,0 +1,244 @@
+"""Comparação incremental a partir de um snapshot local dos dois bancos.
+
+O snapshot é um arquivo SQLite por par de DSNs e tabela com, para cada
+banco, chave -> resumo (hash) da linha e a marca d'água: o maior valor já
+lido de uma coluna de versão (rowversion, data de alteração). As execuções
+seguintes só leem as linhas com a coluna a partir da marca, somada à
+sql_condition, e atualizam o snapshot no lugar; as chaves apagadas desde
+então são encontradas lendo só as colunas da chave. As chaves com resumos
+diferentes saem do próprio snapshot e só essas linhas são relidas dos
+bancos, pela chave, para o relatório.
+"""
+import os
+import pickle
+import sqlite3
+
+from comparador.catalog import detect_primary_key
+from comparador.checksum import common_dialect
+from comparador.engine import Comparison, apply_rules, make_key, merge_join, resolve_key_columns
+from comparador.fetch import iter_batches
+from comparador.processes import digest_columns, row_digest
+from comparador.progress import estimate_batch_bytes
+from comparador.schema import Schema, canonical
+from comparador.sql import build_select, keys_condition
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".comparador", "snapshots")
+# Chaves por consulta ao reler as linhas diferentes
+DEFAULT_KEY_BATCH = 500
+
+_SIDES = (1, 2)
+
+
+def snapshot_path(directory, db1, db2, table_name):
+    name = "_".join((db1, db2, table_name))
+    return os.path.join(directory, "".join(c if c.isalnum() or c in "._-" else "_" for c in name) + ".sqlite")
+
+
+def key_text(key):
+    # Identidade da chave no snapshot: INT e DECIMAL iguais nos dois bancos viram o mesmo texto
+    return repr(tuple(canonical(val) for val in key))
+
+
+def sort_key(key):
+    # NULL antes de qualquer valor, como make_key(null_safe=True)
+    return tuple((val is not None, val) for val in key)
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS rows (side INTEGER, key TEXT, key_values BLOB, "
+                                "digest BLOB, PRIMARY KEY (side, key)) WITHOUT ROWID")
+
+    def get(self, name, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, name, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, pickle.dumps(value)))
+
+    def reset(self):
+        self.connection.execute("DELETE FROM meta")
+        self.connection.execute("DELETE FROM rows")
+
+    def update(self, side, entries):
+        # entries: (texto da chave, valores da chave, resumo)
+        self.connection.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                                    ((side, text, pickle.dumps(key), digest) for text, key, digest in entries))
+
+    def keep_only(self, side, texts):
+        # Remove do lado as chaves que não estão mais no banco (apagadas desde o snapshot)
+        self.connection.execute("CREATE TEMP TABLE seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        try:
+            self.connection.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((text,) for text in texts))
+            self.connection.execute("DELETE FROM rows WHERE side = ? AND key NOT IN (SELECT key FROM seen)", (side,))
+        finally:
+            self.connection.execute("DROP TABLE temp.seen")
+
+    def differing_keys(self):
+        # Valores das chaves ausentes em um dos lados ou com resumos diferentes
+        rows = self.connection.execute(
+            "SELECT a.key_values FROM rows a LEFT JOIN rows b ON b.side = 2 AND b.key = a.key "
+            "WHERE a.side = 1 AND (b.digest IS NULL OR b.digest <> a.digest) "
+            "UNION ALL "
+            "SELECT b.key_values FROM rows b WHERE b.side = 2 "
+            "AND NOT EXISTS (SELECT 1 FROM rows a WHERE a.side = 1 AND a.key = b.key)")
+        return [pickle.loads(row[0]) for row in rows]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class IncrementalComparison(Comparison):
+    # Comparison que lê só as linhas alteradas desde a execução anterior (veja o início
+    # do módulo); aceita os mesmos argumentos de Comparison. A coluna watermark_column
+    # entra na comparação como as demais: se ela é local de cada banco (rowversion),
+    # deve ser ignorada pelas regras ("coluna:ignore"). Com track_deletes=False, as
+    # chaves apagadas não são procuradas e continuam no snapshot.
+    def __init__(self, *args, snapshot_path, watermark_column, track_deletes=True,
+                 key_batch_size=DEFAULT_KEY_BATCH, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshot_path = snapshot_path
+        self.watermark_column = watermark_column
+        self.track_deletes = track_deletes
+        self.key_batch_size = key_batch_size
+        self.planned_columns = None
+
+    def open(self):
+        self.planned_columns = None
+        return super().open()
+
+    def plan_columns(self):
+        # (chave, colunas do SELECT, colunas normalizadas no cliente), resolvidas uma vez por execução
+        if self.planned_columns is not None:
+            return self.planned_columns
+        if not (self.key_columns or detect_primary_key(self.cursor1, self.table_name)):
+            raise ValueError("A comparação incremental exige uma chave (informada ou primária)")
+        key_columns, columns, _ = resolve_key_columns(self.cursor1, self.table_name, self.selected_columns,
+                                                      self.key_columns)
+        select_columns, client_columns = columns, []
+        if self.rules:
+            if any(self.rules.normalizes(column) for column in key_columns):
+                raise ValueError("A comparação incremental não aceita regras nas colunas da chave")
+            dialect = common_dialect(self.cursor1, self.cursor2)
+            key_columns, columns, select_columns, client_columns = apply_rules(
+                self.cursor1, self.cursor2, self.table_name, key_columns, columns, self.rules, dialect)
+        self.planned_columns = key_columns, select_columns, client_columns
+        return self.planned_columns
+
+    def signature(self, key_columns, select_columns, client_columns):
+        # Outra tabela, chave, colunas, condição ou regra invalidam o snapshot inteiro
+        return repr((self.table_name, self.sql_condition, key_columns, select_columns, client_columns,
+                     str(self.rules or ""), self.watermark_column))
+
+    def total_rows(self):
+        # Para o progresso, conta só as linhas que serão lidas: a partir da marca d'água de
+        # cada banco, ou a tabela inteira sem um snapshot válido
+        watermarks = (None, None)
+        if os.path.exists(self.snapshot_path):
+            snapshot = Snapshot(self.snapshot_path)
+            try:
+                if snapshot.get("signature") == self.signature(*self.plan_columns()):
+                    watermarks = [snapshot.get(f"watermark{side}") for side in _SIDES]
+            finally:
+                snapshot.close()
+        total = 0
+        for cursor, watermark in zip((self.cursor1, self.cursor2), watermarks):
+            condition = None if watermark is None else f"{self.watermark_column} >= ?"
+            query = build_select(self.table_name, ["COUNT(*)"], self.sql_condition, None, condition)
+            cursor.execute(*((query, [watermark]) if condition else (query,)))
+            total += cursor.fetchone()[0]
+        return total
+
+    def differences(self, progress=None):
+        cursors = (self.cursor1, self.cursor2)
+        key_columns, select_columns, client_columns = self.plan_columns()
+
+        snapshot = Snapshot(self.snapshot_path)
+        try:
+            signature = self.signature(key_columns, select_columns, client_columns)
+            if snapshot.get("signature") != signature:
+                snapshot.reset()
+                snapshot.set("signature", signature)
+
+            watermarks = [snapshot.get(f"watermark{side}") for side in _SIDES]
+            for cursor, watermark in zip(cursors, watermarks):
+                condition = None
+                if watermark is not None:
+                    # ">=" relê as linhas com a própria marca, que podem ter sido gravadas depois da leitura
+                    condition = f"{self.watermark_column} >= ?"
+                query = build_select(self.table_name, (select_columns or ["*"]) + [self.watermark_column],
+                                     self.sql_condition, None, condition)
+                cursor.execute(*((query, [watermark]) if condition else (query,)))
+
+            # A última coluna é a marca d'água; o esquema é o das colunas comparadas
+            schemas = [Schema(cursor.description[:-1]) for cursor in cursors]
+            self.set_schemas(schemas[0], schemas[1], key_columns)
+            for side, cursor, schema, columns_digest in zip(_SIDES, cursors, schemas, digest_columns(*schemas)):
+                watermark = self.read_changes(snapshot, side, cursor, schema, key_columns, columns_digest,
+                                              client_columns, progress)
+                if watermark is not None and (watermarks[side - 1] is None or watermark > watermarks[side - 1]):
+                    snapshot.set(f"watermark{side}", watermark)
+                if self.track_deletes and watermarks[side - 1] is not None:
+                    cursor.execute(build_select(self.table_name, key_columns, self.sql_condition))
+                    snapshot.keep_only(side, (key_text(key) for batch in iter_batches(cursor, self.batch_size)
+                                              for key in batch))
+            snapshot.commit()
+            keys = sorted(snapshot.differing_keys(), key=sort_key)
+        finally:
+            snapshot.close()
+
+        return self.reread(keys, key_columns, select_columns, client_columns, schemas)
+
+    def read_changes(self, snapshot, side, cursor, schema, key_columns, columns_digest, client_columns, progress):
+        # Grava no snapshot chave -> resumo das linhas lidas e retorna a maior marca d'água
+        key_indexes = schema.indexes(key_columns)
+        normalize = self.rules.normalizer(schema, client_columns) if client_columns else None
+        batch_size = self.batch_size[side - 1] if isinstance(self.batch_size, (tuple, list)) else self.batch_size
+        watermark = None
+        for batch in iter_batches(cursor, batch_size):
+            if progress:
+                progress.advance(len(batch), estimate_batch_bytes(batch))
+            if normalize:
+                batch = normalize(batch)
+            entries = []
+            for row in batch:
+                key = tuple(row[i] for i in key_indexes)
+                entries.append((key_text(key), key, row_digest(row, columns_digest)))
+                if row[-1] is not None and (watermark is None or row[-1] > watermark):
+                    watermark = row[-1]
+            snapshot.update(side, entries)
+        return watermark
+
+    def reread(self, keys, key_columns, select_columns, client_columns, schemas):
+        # Lê dos dois bancos só as linhas das chaves que diferem no snapshot, em lotes
+        # ordenados pela chave, e confirma a diferença com a comparação de sempre
+        schema1, schema2 = schemas
+        key1 = make_key(schema1.indexes(key_columns), True)
+        key2 = make_key(schema2.indexes(key_columns), True)
+        equal = schema1.row_comparer(schema2)
+        differ = schema1.column_differ(schema2)
+        normalizers = [self.rules.normalizer(schema, client_columns) if client_columns else None
+                       for schema in schemas]
+        for start in range(0, len(keys), self.key_batch_size):
+            condition, params = keys_condition(key_columns, keys[start:start + self.key_batch_size])
+            query = build_select(self.table_name, select_columns, self.sql_condition, None, condition)
+            rows = []
+            # O lote já vem inteiro para a memória: é ordenado aqui, na ordem do merge join,
+            # em vez de depender da collation de cada banco
+            for cursor, normalize, key in zip((self.cursor1, self.cursor2), normalizers, (key1, key2)):
+                cursor.execute(query, params)
+                side_rows = cursor.fetchall()
+                rows.append(sorted(normalize(side_rows) if normalize else side_rows, key=key))
+            for kind, row1, row2 in merge_join(rows[0], rows[1], key1, key2, equal):
+                if row1 is not None and row2 is not None:
+                    self.set_changed_columns(differ(row1, row2))
+                yield kind, row1, row2
@@ -0,0 +1,96 @@
+"""Montagem das consultas SQL enviadas aos bancos."""
+
+# Faixa especial com as linhas em que a coluna da chave é NULL
+NULL_RANGE = "null"
+
+# Ordenação binária do texto por SGBD (veja key_order); bancos ausentes (ex.: sqlite)
+# já ordenam o texto assim ou não são conhecidos e usam a ordenação padrão
+_BINARY_ORDER = {
+    "sqlserver": "{} COLLATE Latin1_General_BIN2",
+    "postgresql": '{} COLLATE "C"',
+    "mysql": "BINARY {}",
+    "oracle": "NLSSORT({}, 'NLS_SORT=BINARY')",
+}
+# Tipos do catálogo ordenados pelo SGBD de um jeito diferente do valor recebido no Python:
+# o uniqueidentifier do SQL Server compara os bytes fora da ordem do texto (os últimos 6
+# primeiro), então a chave é ordenada pelo texto do GUID, como o pyodbc o devolve
+_TEXT_ORDER = {
+    "sqlserver": {"uniqueidentifier": "CAST({} AS CHAR(36)) COLLATE Latin1_General_BIN2"},
+}
+# SGBDs que, sem NULLS FIRST, colocam NULL depois dos valores em ordem crescente
+_NULLS_LAST = ("postgresql", "oracle")
+
+
+def build_select(table_name, columns=None, sql_condition="", order_by=None, extra_condition=None):
+    query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+    conditions = [condition for condition in (sql_condition, extra_condition) if condition]
+    if len(conditions) == 1:
+        query += f" WHERE {conditions[0]}"
+    elif conditions:
+        # Parênteses preservam a precedência de OR dentro da condição do usuário
+        query += " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+    if order_by:
+        query += f" ORDER BY {', '.join(order_by)}"
+    return query
+
+
+def key_order(key_columns, dialect=None, text_columns=(), column_types=None, expressions=None):
+    # ORDER BY da chave na mesma ordem em que merge_join compara os valores no Python:
+    # texto pela ordem binária dos caracteres (a collation do banco pode ignorar maiúsculas
+    # e pontuação) e NULL antes de qualquer valor. Ordenar por outra collation impede o
+    # banco de usar o índice da chave, então só as colunas em text_columns a recebem.
+    # column_types traz o tipo do catálogo pelo nome em minúsculas (catalog.fetch_column_types).
+    # expressions ({coluna: expressão}) ordena a coluna por uma expressão sobre ela, como a
+    # normalização das regras: o alias não pode ser usado dentro de COLLATE ou de outra função
+    order = []
+    for column in key_columns:
+        expression = (expressions or {}).get(column, column)
+        type_name = (column_types or {}).get(column.lower())
+        if type_name in _TEXT_ORDER.get(dialect, {}):
+            expression = _TEXT_ORDER[dialect][type_name].format(expression)
+        elif column in text_columns and dialect in _BINARY_ORDER:
+            expression = _BINARY_ORDER[dialect].format(expression)
+        if dialect in _NULLS_LAST:
+            expression += " NULLS FIRST"
+        order.append(expression)
+    return order
+
+
+def range_condition(column, key_range):
+    # Faixa (início, fim, inclui_fim) da chave como condição parametrizada. Início ou fim None
+    # deixa a faixa aberta daquele lado, para incluir valores de fora dos limites lidos antes
+    if key_range == NULL_RANGE:
+        return f"{column} IS NULL", []
+    start, end, inclusive = key_range
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{column} {'<=' if inclusive else '<'} ?")
+        params.append(end)
+    return " AND ".join(conditions), params
+
+
+def keys_condition(key_columns, keys):
+    # Linhas com qualquer uma das chaves (tuplas de valores) como condição parametrizada;
+    # partes nulas usam IS NULL, pois "= ?" com NULL nunca casa
+    if len(key_columns) == 1:
+        column = key_columns[0]
+        values = [key[0] for key in keys if key[0] is not None]
+        conditions = [f"{column} IN ({', '.join('?' * len(values))})"] if values else []
+        if len(values) < len(keys):
+            conditions.append(f"{column} IS NULL")
+        return " OR ".join(conditions), values
+
+    conditions, params = [], []
+    for key in keys:
+        parts = []
+        for column, val in zip(key_columns, key):
+            if val is None:
+                parts.append(f"{column} IS NULL")
+            else:
+                parts.append(f"{column} = ?")
+                params.append(val)
+        conditions.append(f"({' AND '.join(parts)})")
+    return " OR ".join(conditions), params
@@ -0,0 +1,262 @@
+"""Script de sincronização a partir das diferenças de uma comparação.
+
+Na direção DB1_TO_DB2 o script, aplicado no banco 2, o deixa igual ao banco 1
+(e DB2_TO_DB1 faz o contrário). As linhas que só existem na origem viram
+INSERTs de várias linhas, as que só existem no destino viram DELETEs pela
+chave e as alteradas viram UPDATEs apenas das colunas que mudaram.
+
+Os literais seguem o SGBD do destino, e não os formatadores de exibição: a
+barra invertida só é escapada no MySQL, data e hora levam apenas as casas
+de fração de segundo que a coluna do destino aceita (DATETIME do SQL Server
+recusa um texto com 6 casas) e viram TO_TIMESTAMP/DATE no Oracle, booleanos
+viram TRUE/FALSE no PostgreSQL e binários usam a notação de cada SGBD.
+"""
+import datetime
+import os
+
+from comparador.engine import CHANGED, ONLY_DB1, ONLY_DB2
+from comparador.render import FORMATTERS, format_any, format_str
+from comparador.schema import canonical
+
+DB1_TO_DB2 = "db1-db2"
+DB2_TO_DB1 = "db2-db1"
+DIRECTIONS = (DB1_TO_DB2, DB2_TO_DB1)
+
+# Linhas por INSERT e chaves por DELETE; o SQL Server aceita até 1000 linhas em um VALUES
+DEFAULT_SYNC_BATCH_SIZE = 500
+
+
+def format_script_str(val):
+    # Só duplica as aspas simples: no SQL padrão e no SQL Server a barra invertida não é escape
+    val = val.replace("'", "''")
+    return f"'{val}'"
+
+
+def format_script_bool(val):
+    return "TRUE" if val else "FALSE"
+
+
+def format_bytea(val):
+    return f"'\\x{bytes(val).hex()}'::bytea"
+
+
+def format_hextoraw(val):
+    return f"HEXTORAW('{bytes(val).hex()}')"
+
+
+def format_hex_string(val):
+    return f"X'{bytes(val).hex()}'"
+
+
+def format_oracle_date(val):
+    return f"DATE '{val.isoformat()}'"
+
+
+# Formatadores que mudam conforme o SGBD do destino; os demais tipos usam render.FORMATTERS.
+# None é o SQL padrão, usado quando o SGBD do destino não é conhecido
+_DIALECT_FORMATTERS = {
+    None: {bytes: format_hex_string, bytearray: format_hex_string},
+    "mysql": {str: format_str},
+    "postgresql": {bool: format_script_bool, bytes: format_bytea, bytearray: format_bytea},
+    "oracle": {bytes: format_hextoraw, bytearray: format_hextoraw, datetime.date: format_oracle_date},
+}
+
+
+def datetime_formatter(digits, dialect=None):
+    # Data e hora com até digits casas de fração de segundo (truncadas); no Oracle o texto
+    # só vira data pelo NLS da sessão, então vai em TO_TIMESTAMP com o formato explícito
+    def format_datetime(val):
+        text = f"{val:%Y-%m-%d %H:%M:%S}"
+        mask = "YYYY-MM-DD HH24:MI:SS"
+        if digits:
+            text += f".{val.microsecond:06d}"[:digits + 1]
+            mask += f".FF{digits}"
+        if val.utcoffset() is not None:
+            text += val.isoformat()[-6:]
+            if dialect == "oracle":
+                return f"TO_TIMESTAMP_TZ('{text}', '{mask}TZH:TZM')"
+        if dialect == "oracle":
+            return f"TO_TIMESTAMP('{text}', '{mask}')"
+        return f"'{text}'"
+
+    return format_datetime
+
+
+def script_formatter(type_code, target_column, dialect=None):
+    # Formatador de literais para o script: type_code é o tipo do valor e target_column
+    # a descrição (DB-API) da coluna do destino, cuja escala limita a fração de segundo
+    if type_code is None:
+        # Drivers que não informam o tipo da coluna: escolhe pelo valor
+        return lambda val: script_formatter(type(val), target_column, dialect)(val)
+    if type_code is datetime.datetime:
+        scale = target_column[5]
+        return datetime_formatter(6 if scale is None else min(scale, 6), dialect)
+    formatters = _DIALECT_FORMATTERS.get(dialect, {})
+    if type_code in formatters:
+        return formatters[type_code]
+    if type_code is str:
+        return format_script_str
+    return FORMATTERS.get(type_code, format_any)
+
+
+class SyncScript:
+    # Acumula as diferenças e devolve os comandos conforme cada lote enche;
+    # source e target são os schema.Schema da origem e do destino e dialect o
+    # SGBD do destino (checksum.detect_dialect), None para o SQL padrão
+    def __init__(self, table_name, source, target, key_columns, batch_size=DEFAULT_SYNC_BATCH_SIZE, dialect=None):
+        self.table_name = table_name
+        self.source = source
+        self.target = target
+        self.batch_size = max(1, batch_size)
+
+        # Colunas pareadas pelo nome; as que só existem em um dos bancos ficam de fora
+        self.pairs = source.column_pairs(target)
+        self.key_indexes = target.indexes(key_columns)
+        self.insert_prefix = (f"INSERT INTO {table_name} "
+                              f"({', '.join(target.names[j] for _, j, _ in self.pairs)}) VALUES\n")
+        # Valores da origem (posição i) vão para a coluna j do destino; os da chave vêm do destino
+        self.source_formatters = {i: script_formatter(source.types[i], target.description[j], dialect)
+                                  for i, j, _ in self.pairs}
+        self.target_formatters = {j: script_formatter(target.types[j], target.description[j], dialect)
+                                  for j in self.key_indexes}
+
+        self.inserts = []
+        self.deletes = []
+
+    def format(self, formatters, index, val):
+        return 'NULL' if val is None else formatters[index](val)
+
+    def key_condition(self, row):
+        # Condição que localiza a linha do destino pela chave
+        conditions = []
+        for index in self.key_indexes:
+            name = self.target.names[index]
+            if row[index] is None:
+                conditions.append(f"{name} IS NULL")
+            else:
+                conditions.append(f"{name} = {self.format(self.target_formatters, index, row[index])}")
+        return " AND ".join(conditions)
+
+    def add(self, kind, source_row, target_row):
+        # kind já é relativo à direção: ONLY_DB1 = só na origem, ONLY_DB2 = só no destino
+        if kind == ONLY_DB1:
+            self.inserts.append(source_row)
+            if len(self.inserts) >= self.batch_size:
+                return [self.flush_inserts()]
+        elif kind == ONLY_DB2:
+            self.deletes.append(target_row)
+            if len(self.deletes) >= self.batch_size:
+                return [self.flush_deletes()]
+        elif kind == CHANGED:
+            statement = self.update(source_row, target_row)
+            if statement:
+                return [statement]
+        return []
+
+    def changed_pairs(self, source_row, target_row):
+        # (posição na origem, posição no destino) das colunas fora da chave que mudaram
+        changed = []
+        for i, j, same_type in self.pairs:
+            if j in self.key_indexes:
+                continue
+            new, old = source_row[i], target_row[j]
+            if new != old if same_type else canonical(new) != canonical(old):
+                changed.append((i, j))
+        return changed
+
+    def update(self, source_row, target_row):
+        assignments = [f"{self.target.names[j]} = {self.format(self.source_formatters, i, source_row[i])}"
+                       for i, j in self.changed_pairs(source_row, target_row)]
+        if not assignments:
+            return None
+        return f"UPDATE {self.table_name} SET {', '.join(assignments)} WHERE {self.key_condition(target_row)}"
+
+    def flush_inserts(self):
+        rows = ",\n".join(f"({', '.join(self.format(self.source_formatters, i, row[i]) for i, _, _ in self.pairs)})"
+                          for row in self.inserts)
+        self.inserts = []
+        return self.insert_prefix + rows
+
+    def flush_deletes(self):
+        rows, self.deletes = self.deletes, []
+        if len(self.key_indexes) == 1 and all(row[self.key_indexes[0]] is not None for row in rows):
+            index = self.key_indexes[0]
+            values = ", ".join(self.format(self.target_formatters, index, row[index]) for row in rows)
+            return f"DELETE FROM {self.table_name} WHERE {self.target.names[index]} IN ({values})"
+        conditions = "\nOR ".join(f"({self.key_condition(row)})" for row in rows)
+        return f"DELETE FROM {self.table_name} WHERE {conditions}"
+
+    def flush(self):
+        statements = []
+        if self.deletes:
+            statements.append(self.flush_deletes())
+        if self.inserts:
+            statements.append(self.flush_inserts())
+        return statements
+
+
+def oriented_schemas(schema1, schema2, direction):
+    # (origem, destino) conforme a direção
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Direção inválida: {direction!r}")
+    return (schema2, schema1) if direction == DB2_TO_DB1 else (schema1, schema2)
+
+
+def target_name(names, direction):
+    # Nome (DSN) do banco que recebe as alterações, dado o par (banco 1, banco 2)
+    return names[1] if direction == DB1_TO_DB2 else names[0]
+
+
+def oriented(differences, direction):
+    # Converte (tipo, linha_db1, linha_db2) em (tipo, linha_origem, linha_destino);
+    # ONLY_DB1 passa a significar "só na origem" e ONLY_DB2 "só no destino"
+    if direction != DB2_TO_DB1:
+        yield from differences
+        return
+    for kind, row1, row2 in differences:
+        yield {ONLY_DB1: ONLY_DB2, ONLY_DB2: ONLY_DB1}.get(kind, kind), row2, row1
+
+
+def sync_statements(differences, table_name, schema1, schema2, key_columns, direction=DB1_TO_DB2,
+                    batch_size=DEFAULT_SYNC_BATCH_SIZE, dialect=None):
+    # differences são tuplas (tipo, linha_db1, linha_db2), como as de Comparison;
+    # dialect é o SGBD do banco de destino
+    source, target = oriented_schemas(schema1, schema2, direction)
+    script = SyncScript(table_name, source, target, key_columns, batch_size, dialect)
+
+    for kind, source_row, target_row in oriented(differences, direction):
+        yield from script.add(kind, source_row, target_row)
+    yield from script.flush()
+
+
+def check_store(store):
+    # Com regras de comparação as linhas gravadas estão normalizadas (ou sem as colunas
+    # ignoradas) e não servem para reproduzir os dados da origem
+    if store.rules:
+        raise ValueError("Resultados comparados com regras de coluna não podem ser usados para sincronizar")
+    if store.unordered:
+        raise ValueError("Resultados da comparação sem chave não podem ser usados para sincronizar")
+
+
+def write_sync_script(store, path, direction=DB1_TO_DB2, batch_size=DEFAULT_SYNC_BATCH_SIZE):
+    # Gera o script a partir de um results.ResultStore já preenchido; retorna o número de comandos
+    check_store(store)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        # O par de SGBDs segue a ordem dos bancos, como o par de nomes
+        statements = sync_statements(store.differences(), store.table_name, store.schema1, store.schema2,
+                                     store.key_columns, direction, batch_size, target_name(store.dialects, direction))
+        for statement in statements:
+            file.write(statement + ";\n")
+            count += 1
+    return count
+
+
+def export_sync(store, directory, direction=DB1_TO_DB2, batch_size=DEFAULT_SYNC_BATCH_SIZE):
+    # Grava "<tabela>_sync_<destino>.sql" no diretório; None se não há diferenças
+    if not len(store):
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{store.file_prefix}_sync_{target_name(store.names, direction)}.sql")
+    write_sync_script(store, path, direction, batch_size)
+    return path
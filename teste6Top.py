@@ -6,104 +6,37 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from comparador import Comparison, ResultStore
+
 
 class ComparisonThread(QThread):
     update_progress = pyqtSignal(int)
-    comparison_done = pyqtSignal(list, list)
+    comparison_done = pyqtSignal(object, object)
+    error_occurred = pyqtSignal(str)
 
-    def __init__(self, db1, db2, table_name, sql_condition):
+    def __init__(self, db1, db2, table_name, sql_condition, key_columns=None):
         super().__init__()
         self.db1 = db1
         self.db2 = db2
         self.table_name = table_name
         self.sql_condition = sql_condition
+        self.key_columns = key_columns
+
+    def report_progress(self, progress):
+        # Chamado só quando o percentual muda ou a cada intervalo, não a cada linha
+        self.update_progress.emit(progress.percent)
 
     def run(self):
         try:
-            conn1 = pyodbc.connect(f"DSN={self.db1}")
-            conn2 = pyodbc.connect(f"DSN={self.db2}")
+            # A comparação em si fica em comparador.Comparison; a thread só repassa os resultados
+            comparison = Comparison(self.db1, self.db2, self.table_name, self.sql_condition, None, self.key_columns,
+                                    on_progress=self.report_progress)
 
-            cursor1 = conn1.cursor()
-            cursor2 = conn2.cursor()
+            # As diferenças vão direto para arquivos temporários; a janela recebe só os arquivos
+            store = ResultStore(self.table_name, db1=self.db1, db2=self.db2)
+            comparison.run_to_store(store)
 
-            total_rows_db1 = 0
-            total_rows_db2 = 0
-
-            try:
-                # Verifica se há uma condição SQL para incluir na consulta de contagem
-                if self.sql_condition:
-                    cursor1.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE {self.sql_condition}")
-                    total_rows_db1 = cursor1.fetchone()[0]
-
-                    cursor2.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE {self.sql_condition}")
-                    total_rows_db2 = cursor2.fetchone()[0]
-                else:
-                    cursor1.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-                    total_rows_db1 = cursor1.fetchone()[0]
-
-                    cursor2.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-                    total_rows_db2 = cursor2.fetchone()[0]
-            except pyodbc.Error as e:
-                # Trate a exceção de erro do banco de dados aqui
-                error_message = f"Erro de consulta SQL: {str(e)}"
-                self.error_occurred.emit(error_message)
-
-            total_rows = max(total_rows_db1, total_rows_db2)
-
-            if self.sql_condition:
-                cursor1.execute(f"SELECT * FROM {self.table_name} WHERE {self.sql_condition}")
-                cursor2.execute(f"SELECT * FROM {self.table_name} WHERE {self.sql_condition}")
-            else:
-                cursor1.execute(f"SELECT * FROM {self.table_name}")
-                cursor2.execute(f"SELECT * FROM {self.table_name}")
-
-            result_db1 = []
-            result_db2 = []
-
-            processed_rows = 0  # Inicializa o número de linhas processadas
-
-            while True:
-                row1 = cursor1.fetchone()
-                row2 = cursor2.fetchone()
-
-                if not row1 and not row2:
-                    break
-
-                processed_rows += 1  # Atualiza o número de linhas processadas
-                progress = int(processed_rows / total_rows * 100)
-                self.update_progress.emit(progress)  # Emitir progresso em tempo real
-
-                if row1 != row2:
-                    if row1:
-                        columns = [column[0] for column in cursor1.description]
-                        values = []
-                        for val in row1:
-                            if val is None:
-                                values.append('NULL')
-                            elif isinstance(val, str):
-                                # Duplica as aspas simples e as barras invertidas
-                                val = val.replace("\\", "\\\\").replace("'", "''")
-                                values.append(f"'{val}'")
-                            else:
-                                values.append(str(val))
-                        row1_str = ', '.join(values)
-                        result_db1.append(f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({row1_str});")
-                    if row2:
-                        columns = [column[0] for column in cursor2.description]
-                        values = []
-                        for val in row2:
-                            if val is None:
-                                values.append('NULL')
-                            elif isinstance(val, str):
-                                # Duplica as aspas simples e as barras invertidas
-                                val = val.replace("\\", "\\\\").replace("'", "''")
-                                values.append(f"'{val}'")
-                            else:
-                                values.append(str(val))
-                        row2_str = ', '.join(values)
-                        result_db2.append(f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({row2_str});")
-
-            self.comparison_done.emit(result_db1, result_db2)  # Emitir o sinal após o término da comparação
+            self.comparison_done.emit(store.db1, store.db2)  # Emitir o sinal após o término da comparação
 
         except pyodbc.Error as e:
             error_message = f"Erro de conexão: {str(e)}"
@@ -111,9 +44,7 @@ class ComparisonThread(QThread):
         except Exception as e:
             error_message = f"Erro: {str(e)}"
             self.error_occurred.emit(error_message)  # Emitir mensagem de erro
-        finally:
-            conn1.close()
-            conn2.close()
+
 class ResultDialog(QDialog):
     def __init__(self, db1, db2, table_name, result_db1, result_db2):
         super().__init__()
@@ -128,7 +59,7 @@ class ResultDialog(QDialog):
         label_db1 = QLabel(f"{len(result_db1)} Registros presentes somente no banco {db1} na tabela {table_name}:")
 
         text_browser_db1 = QTextBrowser()
-        text_browser_db1.setPlainText("\n".join([f"{str(row)};" for row in result_db1]))
+        text_browser_db1.setPlainText("\n".join([f"{str(row)};" for row in result_db1.rendered()]))
         text_browser_db1.setLineWrapMode(QTextBrowser.NoWrap)
         text_browser_db1.setOpenExternalLinks(True)
         text_browser_db1.setReadOnly(True)
@@ -140,7 +71,7 @@ class ResultDialog(QDialog):
 
         label_db2 = QLabel(f"{len(result_db2)} Registros presentes somente no banco {db2} na tabela {table_name}:")
         text_browser_db2 = QTextBrowser()
-        text_browser_db2.setPlainText("\n".join([f"{str(row)}" for row in result_db2]))
+        text_browser_db2.setPlainText("\n".join([f"{str(row)};" for row in result_db2.rendered()]))
         text_browser_db2.setLineWrapMode(QTextBrowser.NoWrap)
         text_browser_db2.setOpenExternalLinks(True)
         text_browser_db2.setReadOnly(True)
@@ -163,7 +94,7 @@ class ResultDialog(QDialog):
     def copy_result(self, data, table_name):
         # Implemente a ação de copiar os registros, por exemplo, copiando-os para a área de transferência
         clipboard = QApplication.clipboard()
-        clipboard.setText("\n".join([f"{str(row)}" for row in data]))
+        clipboard.setText("\n".join([f"{str(row)};" for row in data.rendered()]))
 
 class DatabaseComparer(QMainWindow):
     def __init__(self):
@@ -1,10 +1,22 @@
 import sys
+from collections import OrderedDict
+
 import pyodbc
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QComboBox,
-    QDialog, QProgressBar, QLabel, QTextBrowser, QMessageBox, QInputDialog, QRadioButton, QHBoxLayout, QDesktopWidget, QCheckBox, QScrollArea, QGridLayout
+    QDialog, QProgressBar, QLabel, QMessageBox, QInputDialog, QRadioButton, QHBoxLayout, QDesktopWidget, QCheckBox, QScrollArea, QGridLayout, QSpinBox,
+    QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QFileDialog
+)
+from PyQt5.QtCore import QThread, pyqtSignal, Qt, QAbstractTableModel, QModelIndex
+
+from comparador import (
+    DB1_TO_DB2, DB2_TO_DB1, DEFAULT_APPLY_BATCH_SIZE, DEFAULT_BATCH_SIZE, DEFAULT_CHECKPOINT_DIR,
+    DEFAULT_CHECKSUM_ROWS, DEFAULT_MAX_CONNECTIONS, DEFAULT_PROCESSES, DEFAULT_SNAPSHOT_DIR, CatalogCache,
+    CheckpointedComparison, CommonTableMatcher, CompareRules, ConnectionPool, IncrementalComparison,
+    MultisetComparison, PartitionedComparison, ProcessPool, ResultStore, apply_store, checkpoint_path, connect_dsn,
+    format_column_counts, format_progress, latest_checkpoint, render_insert, render_values, snapshot_path,
+    write_sync_script
 )
-from PyQt5.QtCore import QThread, pyqtSignal
 
 
 class ColumnSelectionWindow(QDialog):
@@ -82,121 +94,75 @@ class ColumnSelectionWindow(QDialog):
 
 class ComparisonThread(QThread):
     update_progress = pyqtSignal(int)
-    comparison_done = pyqtSignal(list, list)
-
-    def __init__(self, db1, db2, table_name, sql_condition, selected_columns):
+    update_status = pyqtSignal(str)
+    schema_mismatch = pyqtSignal(str)
+    comparison_done = pyqtSignal(object, object)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db1, db2, table_name, sql_condition, selected_columns, key_columns=None,
+                 batch_size=DEFAULT_BATCH_SIZE, checksum_rows=None, connect=connect_dsn, rules=None, partitions=1,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, process_pool=None, watermark_column="", unordered=False,
+                 checkpoint=False, resume=False):
         super().__init__()
         self.db1 = db1
         self.db2 = db2
         self.table_name = table_name
         self.sql_condition = sql_condition
         self.selected_columns = selected_columns
+        self.key_columns = key_columns
+        self.batch_size = batch_size
+        self.checksum_rows = checksum_rows
+        self.connect = connect
+        self.rules = rules
+        self.partitions = partitions
+        self.max_connections = max_connections
+        self.process_pool = process_pool
+        self.watermark_column = watermark_column
+        self.unordered = unordered
+        self.checkpoint = checkpoint
+        self.resume = resume
+
+    def report_progress(self, progress):
+        # Chamado só quando o percentual muda ou a cada intervalo, não a cada linha
+        self.update_progress.emit(progress.percent)
+        self.update_status.emit(format_progress(progress))
+
+    def report_retry(self, attempt, delay, error):
+        self.update_status.emit(f"Conexão perdida ({error}); tentativa {attempt} em {delay}s")
 
     def run(self):
         try:
-            conn1 = pyodbc.connect(f"DSN={self.db1}")
-            conn2 = pyodbc.connect(f"DSN={self.db2}")
-
-            cursor1 = conn1.cursor()
-            cursor2 = conn2.cursor()
+            # A comparação em si fica em comparador.Comparison; a thread só repassa os resultados
+            args = (self.db1, self.db2, self.table_name, self.sql_condition, self.selected_columns, self.key_columns,
+                    self.batch_size)
+            kwargs = dict(checksum_rows=self.checksum_rows, on_progress=self.report_progress,
+                          on_mismatch=lambda messages: self.schema_mismatch.emit("\n".join(messages)),
+                          connect=self.connect, rules=self.rules, process_pool=self.process_pool)
+            if self.watermark_column:
+                # Só as linhas alteradas desde a última comparação, a partir do snapshot local
+                comparison = IncrementalComparison(*args, **kwargs, watermark_column=self.watermark_column,
+                                                   snapshot_path=snapshot_path(DEFAULT_SNAPSHOT_DIR, self.db1,
+                                                                               self.db2, self.table_name))
+            elif self.unordered:
+                # Tabela sem chave: linhas inteiras comparadas como multiconjunto, sem ORDER BY
+                comparison = MultisetComparison(*args, **kwargs)
+            elif self.checkpoint:
+                # Checkpoint por faixa da chave: reconecta sozinha e pode ser retomada depois de uma queda
+                comparison = CheckpointedComparison(*args, **kwargs, partitions=self.partitions,
+                                                    max_connections=self.max_connections, resume=self.resume,
+                                                    on_retry=self.report_retry,
+                                                    checkpoint_path=checkpoint_path(DEFAULT_CHECKPOINT_DIR, self.db1,
+                                                                                    self.db2, self.table_name))
+            else:
+                # Com mais de uma partição, faixas da chave são comparadas em paralelo
+                comparison = PartitionedComparison(*args, **kwargs, partitions=self.partitions,
+                                                   max_connections=self.max_connections)
 
-            total_rows_db1 = 0
-            total_rows_db2 = 0
+            # As diferenças vão direto para arquivos temporários; a janela recebe só os arquivos
+            store = ResultStore(self.table_name, db1=self.db1, db2=self.db2)
+            comparison.run_to_store(store)
 
-            try:
-                # Verifica se há uma condição SQL para incluir na consulta de contagem
-                if self.sql_condition:
-                    cursor1.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE {self.sql_condition}")
-                    total_rows_db1 = cursor1.fetchone()[0]
-
-                    cursor2.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE {self.sql_condition}")
-                    total_rows_db2 = cursor2.fetchone()[0]
-                else:
-                    cursor1.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-                    total_rows_db1 = cursor1.fetchone()[0]
-
-                    cursor2.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-                    total_rows_db2 = cursor2.fetchone()[0]
-            except pyodbc.Error as e:
-                # Trate a exceção de erro do banco de dados aqui
-                error_message = f"Erro de consulta SQL: {str(e)}"
-                self.error_occurred.emit(error_message)
-
-            total_rows = max(total_rows_db1, total_rows_db2)
-            selected_columns_str = ", ".join(self.selected_columns)
-
-            if self.sql_condition:
-                if self.selected_columns:
-                    cursor1.execute(
-                        f"SELECT {', '.join(self.selected_columns)} FROM {self.table_name} WHERE {self.sql_condition}")
-                    cursor2.execute(
-                        f"SELECT {', '.join(self.selected_columns)} FROM {self.table_name} WHERE {self.sql_condition}")
-                else:
-                    cursor1.execute(f"SELECT * FROM {self.table_name} WHERE {self.sql_condition}")
-                    cursor2.execute(f"SELECT * FROM {self.table_name} WHERE {self.sql_condition}")
-            else:
-                if self.selected_columns:
-                    cursor1.execute(f"SELECT {', '.join(self.selected_columns)} FROM {self.table_name}")
-                    cursor2.execute(f"SELECT {', '.join(self.selected_columns)} FROM {self.table_name}")
-                else:
-                    cursor1.execute(f"SELECT * FROM {self.table_name}")
-                    cursor2.execute(f"SELECT * FROM {self.table_name}")
-
-            result_db1 = []
-            result_db2 = []
-
-            processed_rows = 0  # Inicializa o número de linhas processadas
-
-            while True:
-                row1 = cursor1.fetchone()
-                row2 = cursor2.fetchone()
-
-                if not row1 and not row2:
-                    break
-
-                processed_rows += 1  # Atualiza o número de linhas processadas
-                progress = int(processed_rows / total_rows * 100)
-                self.update_progress.emit(progress)  # Emitir progresso em tempo real
-                """
-                if row1 != row2:
-                    if row1:
-                        result_db1.append(row1)
-                    if row2:
-                        result_db2.append(row2)
-
-                """
-                if row1 != row2:
-                    if row1:
-                        columns = [column[0] for column in cursor1.description]
-                        values = []
-                        for val in row1:
-                            if val is None:
-                                values.append('NULL')
-                            elif isinstance(val, str):
-                                # Duplica as aspas simples e as barras invertidas
-                                val = val.replace("\\", "\\\\").replace("'", "''")
-                                values.append(f"'{val}'")
-                            else:
-                                values.append(str(val))
-                        row1_str = ', '.join(values)
-                        result_db1.append(f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({row1_str})")
-                    if row2:
-                        columns = [column[0] for column in cursor2.description]
-                        values = []
-                        for val in row2:
-                            if val is None:
-                                values.append('NULL')
-                            elif isinstance(val, str):
-                                # Duplica as aspas simples e as barras invertidas
-                                val = val.replace("\\", "\\\\").replace("'", "''")
-                                values.append(f"'{val}'")
-                            else:
-                                values.append(str(val))
-                        row2_str = ', '.join(values)
-                        result_db2.append(f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({row2_str})")
-
-
-            self.comparison_done.emit(result_db1, result_db2)  # Emitir o sinal após o término da comparação
+            self.comparison_done.emit(store.db1, store.db2)  # Emitir o sinal após o término da comparação
 
         except pyodbc.Error as e:
             error_message = f"Erro de conexão: {str(e)}"
@@ -204,19 +170,119 @@ class ComparisonThread(QThread):
         except Exception as e:
             error_message = f"Erro: {str(e)}"
             self.error_occurred.emit(error_message)  # Emitir mensagem de erro
-        finally:
-            conn1.close()
-            conn2.close()
+
+
+class ApplyThread(QThread):
+    update_progress = pyqtSignal(int)
+    apply_done = pyqtSignal(object)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, store, direction, batch_size, atomic, connect=connect_dsn):
+        super().__init__()
+        self.store = store
+        self.direction = direction
+        self.batch_size = batch_size
+        self.atomic = atomic
+        self.connect = connect
+
+    def run(self):
+        try:
+            # Comandos parametrizados com fast_executemany, confirmados a cada lote
+            counts = apply_store(self.store, self.direction, self.batch_size, self.atomic,
+                                 on_progress=lambda progress: self.update_progress.emit(progress.percent),
+                                 connect=self.connect)
+            self.apply_done.emit(counts)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+
+class TableDiscoveryThread(QThread):
+    # Lê a lista de tabelas de um DSN fora da thread da interface, entregando-a em blocos
+    tables_found = pyqtSignal(int, list)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, catalog, side, dsn):
+        super().__init__()
+        self.catalog = catalog
+        self.side = side
+        self.dsn = dsn
+
+    def run(self):
+        try:
+            self.catalog.stream_tables(self.dsn, lambda tables: self.tables_found.emit(self.side, tables))
+        except Exception as e:
+            self.error_occurred.emit(f"{self.dsn}: {str(e)}")
+
+
+class ColumnDiscoveryThread(QThread):
+    # Colunas pelo catálogo (cursor.columns), sem consultar a tabela
+    columns_found = pyqtSignal(str, list)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, catalog, dsn, table_name):
+        super().__init__()
+        self.catalog = catalog
+        self.dsn = dsn
+        self.table_name = table_name
+
+    def run(self):
+        try:
+            self.columns_found.emit(self.table_name, self.catalog.columns(self.dsn, self.table_name))
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+
+class ResultTableModel(QAbstractTableModel):
+    # Modelo de uma coluna sobre um ResultFile: busca as linhas em páginas, conforme
+    # a QTableView pede, e mantém só as páginas usadas recentemente em memória
+    PAGE_SIZE = 256
+    MAX_PAGES = 16
+
+    def __init__(self, result_file, render):
+        super().__init__()
+        self.result_file = result_file
+        self.render = render
+        self.pages = OrderedDict()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.result_file)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self.render(self.result_file, self.record(index.row()))
+
+    def record(self, number):
+        page_number, offset = divmod(number, self.PAGE_SIZE)
+        page = self.pages.get(page_number)
+        if page is None:
+            start = page_number * self.PAGE_SIZE
+            page = list(self.result_file.records(start, start + self.PAGE_SIZE))
+            self.pages[page_number] = page
+            if len(self.pages) > self.MAX_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_number)
+        return page[offset]
+
+    def refresh(self):
+        self.dataChanged.emit(self.index(0, 0), self.index(max(0, self.rowCount() - 1), 0))
 
 
 class ResultDialog(QDialog):
-    def __init__(self, db1, db2, table_name, result_db1, result_db2):
+    def __init__(self, db1, db2, table_name, result_db1, result_db2, connect=connect_dsn):
         super().__init__()
         self.setWindowTitle("Resultado da Comparação")
         self.setGeometry(200, 200, 800, 400)
 
         # Guarde o nome da tabela como um atributo da instância
         self.table_name = table_name
+        self.db1 = db1
+        self.db2 = db2
+        self.connect = connect
 
         layout = QVBoxLayout()
 
@@ -229,10 +295,9 @@ class ResultDialog(QDialog):
 
         self.label_db1 = QLabel(f"{len(result_db1)} Registros presentes somente no banco {db1} na tabela {table_name}:")
 
-        self.text_browser_db1 = QTextBrowser()
-        self.text_browser_db1.setLineWrapMode(QTextBrowser.NoWrap)
-        self.text_browser_db1.setOpenExternalLinks(True)
-        self.text_browser_db1.setReadOnly(True)
+        # Os registros são lidos do arquivo de resultado só quando ficam visíveis
+        self.model_db1 = ResultTableModel(result_db1, self.render_row)
+        self.table_view_db1 = self.create_table_view(self.model_db1)
 
         copy_button_db1 = QPushButton("Copiar do Banco 1")
 
@@ -240,17 +305,20 @@ class ResultDialog(QDialog):
         copy_button_db1.clicked.connect(lambda: self.copy_result(result_db1, self.table_name))
 
         self.label_db2 = QLabel(f"{len(result_db2)} Registros presentes somente no banco {db2} na tabela {table_name}:")
-        self.text_browser_db2 = QTextBrowser()
-        self.text_browser_db2.setLineWrapMode(QTextBrowser.NoWrap)
-        self.text_browser_db2.setOpenExternalLinks(True)
-        self.text_browser_db2.setReadOnly(True)
+        self.model_db2 = ResultTableModel(result_db2, self.render_row)
+        self.table_view_db2 = self.create_table_view(self.model_db2)
 
         layout.addLayout(button_layout)  # Adicione o layout dos botões
+
+        # Quais colunas mudaram nas linhas presentes nos dois bancos com valores diferentes
+        store = result_db1.owner
+        if store is not None and store.column_counts:
+            layout.addWidget(QLabel(f"Colunas alteradas: {format_column_counts(store.column_counts)}"))
         layout.addWidget(self.label_db1)
-        layout.addWidget(self.text_browser_db1)
+        layout.addWidget(self.table_view_db1)
         layout.addWidget(copy_button_db1)
         layout.addWidget(self.label_db2)
-        layout.addWidget(self.text_browser_db2)
+        layout.addWidget(self.table_view_db2)
 
         copy_button_db2 = QPushButton("Copiar do Banco 2")
 
@@ -259,41 +327,254 @@ class ResultDialog(QDialog):
 
         layout.addWidget(copy_button_db2)
 
+        sync_button = QPushButton("Gerar Script de Sincronização")
+        sync_button.clicked.connect(self.save_sync_script)
+        layout.addWidget(sync_button)
+
+        # Cópia dos arquivos binários do resultado, para reabrir depois sem consultar os bancos
+        save_result_button = QPushButton("Salvar Resultado (reabrir depois)")
+        save_result_button.clicked.connect(self.save_result)
+        layout.addWidget(save_result_button)
+
+        # Aplicação direta no banco de destino, em transações de tamanho configurável
+        apply_layout = QHBoxLayout()
+        self.apply_db2_button = QPushButton(f"Aplicar no Banco 2 ({db2})")
+        self.apply_db1_button = QPushButton(f"Aplicar no Banco 1 ({db1})")
+        self.apply_batch_size = QSpinBox()
+        self.apply_batch_size.setRange(1, 1000000)
+        self.apply_batch_size.setValue(DEFAULT_APPLY_BATCH_SIZE)
+        self.apply_batch_size.setPrefix("Lote da transação: ")
+        self.atomic_checkbox = QCheckBox("Transação única (desfaz tudo em caso de erro)")
+        apply_layout.addWidget(self.apply_db2_button)
+        apply_layout.addWidget(self.apply_db1_button)
+        apply_layout.addWidget(self.apply_batch_size)
+        apply_layout.addWidget(self.atomic_checkbox)
+        layout.addLayout(apply_layout)
+
+        self.apply_progress = QProgressBar()
+        layout.addWidget(self.apply_progress)
+
+        self.apply_db2_button.clicked.connect(lambda: self.apply_differences(DB1_TO_DB2))
+        self.apply_db1_button.clicked.connect(lambda: self.apply_differences(DB2_TO_DB1))
+
         self.setLayout(layout)
 
-        # Conecte os sinais dos botões às funções de atualização do texto do QTextBrowser
-        self.insert_button.toggled.connect(self.update_text_browser)
-        self.values_button.toggled.connect(self.update_text_browser)
+        # Inicialmente, exiba os resultados como "Insert"
+        self.insert_button.setChecked(True)
+
+        # Conecte os sinais dos botões à troca de formato das tabelas
+        self.insert_button.toggled.connect(self.update_views)
+        self.values_button.toggled.connect(self.update_views)
 
         # Armazene os resultados para uso posterior
         self.result_db1 = result_db1
         self.result_db2 = result_db2
 
-        # Inicialmente, exiba os resultados como "Insert"
-        self.insert_button.setChecked(True)
-        self.update_text_browser()
+    def create_table_view(self, model):
+        table_view = QTableView()
+        table_view.setModel(model)
+        table_view.horizontalHeader().hide()
+        table_view.setWordWrap(False)
+        table_view.setSelectionBehavior(QTableView.SelectRows)
+        # Altura fixa das linhas e largura calculada por amostra: nada percorre o resultado inteiro
+        table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table_view.horizontalHeader().setResizeContentsPrecision(100)
+        table_view.resizeColumnToContents(0)
+        return table_view
+
+    def render_row(self, result_file, row):
+        # A linha guarda os valores originais; o formato é aplicado só na exibição
+        render = render_values if self.values_button.isChecked() else render_insert
+        return f"{render(result_file.table_name, result_file.schema, row)};"
 
     def copy_result(self, data, table_name):
         # Implemente a ação de copiar os registros, por exemplo, copiando-os para a área de transferência
         clipboard = QApplication.clipboard()
+        clipboard.setText("\n".join(self.render_row(data, row) for row in data))
+
+    def save_sync_script(self):
+        # INSERTs em lote, UPDATEs só das colunas alteradas e DELETEs pela chave, na direção escolhida
+        directions = {
+            f"Deixar {self.db2} igual a {self.db1}": DB1_TO_DB2,
+            f"Deixar {self.db1} igual a {self.db2}": DB2_TO_DB1,
+        }
+        direction, ok = QInputDialog.getItem(self, "Script de Sincronização", "Direção:", list(directions), 0, False)
+        if not ok:
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(self, "Salvar script de sincronização", f"{self.table_name}_sync.sql",
+                                                   "Script SQL (*.sql)")
+        if not file_path:
+            return
+        try:
+            # O ResultStore dono dos arquivos guarda a ordem das diferenças e a chave usada
+            count = write_sync_script(self.result_db1.owner, file_path, directions[direction])
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao gerar o script: {str(e)}")
+            return
+        QMessageBox.information(self, "Script de Sincronização", f"{count} comandos gravados em {file_path}")
+
+    def save_result(self):
+        directory = QFileDialog.getExistingDirectory(self, "Salvar resultado em")
+        if not directory:
+            return
+        try:
+            meta_path = self.result_db1.owner.save(directory)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao salvar o resultado: {str(e)}")
+            return
+        QMessageBox.information(self, "Salvar Resultado", f"Resultado salvo; abra {meta_path} para vê-lo de novo.")
+
+    def apply_differences(self, direction):
+        target = self.db2 if direction == DB1_TO_DB2 else self.db1
+        answer = QMessageBox.question(self, "Aplicar Diferenças",
+                                      f"Alterar a tabela {self.table_name} no banco {target} para ficar igual ao outro banco?")
+        if answer != QMessageBox.Yes:
+            return
+
+        self.apply_db1_button.setEnabled(False)
+        self.apply_db2_button.setEnabled(False)
+        self.apply_progress.setValue(0)
+
+        self.apply_thread = ApplyThread(self.result_db1.owner, direction, self.apply_batch_size.value(),
+                                        self.atomic_checkbox.isChecked(), self.connect)
+        self.apply_thread.update_progress.connect(self.apply_progress.setValue)
+        self.apply_thread.apply_done.connect(self.show_apply_result)
+        self.apply_thread.error_occurred.connect(self.show_apply_error)
+        self.apply_thread.finished.connect(lambda: self.apply_db1_button.setEnabled(True))
+        self.apply_thread.finished.connect(lambda: self.apply_db2_button.setEnabled(True))
+        self.apply_thread.start()
+
+    def show_apply_result(self, counts):
+        QMessageBox.information(self, "Aplicar Diferenças", f"{counts['insert']} linhas inseridas, "
+                                f"{counts['update']} alteradas e {counts['delete']} apagadas.")
+
+    def show_apply_error(self, message):
+        # A transação em andamento foi desfeita; lotes já confirmados permanecem
+        QMessageBox.critical(self, "Erro", f"Erro ao aplicar as diferenças (a transação em andamento foi desfeita): {message}")
+
+    def update_views(self, checked):
+        # Só a forma de exibir muda; as linhas visíveis são formatadas de novo sob demanda
+        if checked:
+            self.model_db1.refresh()
+            self.model_db2.refresh()
+
+class MultiTableWindow(QDialog):
+    # Compara várias tabelas mantendo no máximo max_workers ComparisonThread ao mesmo tempo;
+    # cada thread usa o seu próprio par de conexões, emprestadas do pool da janela principal
+    STATUS_COLUMN = 1
+    PROGRESS_COLUMN = 2
+    DB1_COLUMN = 3
+    DB2_COLUMN = 4
+
+    def __init__(self, db1, db2, tables, max_workers, batch_size, checksum_rows, connect=connect_dsn,
+                 process_pool=None):
+        super().__init__()
+        self.setWindowTitle("Comparação de Todas as Tabelas")
+        self.setGeometry(200, 200, 800, 500)
+
+        self.db1 = db1
+        self.db2 = db2
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.checksum_rows = checksum_rows
+        self.connect = connect
+        self.process_pool = process_pool
+
+        self.pending = list(tables)
+        self.running = {}
+        self.results = {}
+        self.errors = {}
+        self.grid_rows = {table: index for index, table in enumerate(tables)}
+
+        layout = QVBoxLayout()
+
+        self.summary_label = QLabel()
+
+        # Grade com o status de cada tabela; duplo clique abre o resultado da tabela
+        self.grid = QTableWidget(len(tables), 5)
+        self.grid.setHorizontalHeaderLabels(["Tabela", "Status", "Progresso", f"Diferenças em {db1}", f"Diferenças em {db2}"])
+        self.grid.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.grid.setSelectionBehavior(QTableWidget.SelectRows)
+        for table, row in self.grid_rows.items():
+            self.grid.setItem(row, 0, QTableWidgetItem(table))
+            for column in range(1, 5):
+                self.grid.setItem(row, column, QTableWidgetItem(""))
+            self.set_cell(table, self.STATUS_COLUMN, "Aguardando")
+        self.grid.cellDoubleClicked.connect(self.show_table_result)
+
+        self.cancel_button = QPushButton("Cancelar Pendentes")
+        self.cancel_button.clicked.connect(self.cancel_pending)
+
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.grid)
+        layout.addWidget(self.cancel_button)
+
+        self.setLayout(layout)
+
+        self.start_next()
+
+    def set_cell(self, table, column, text):
+        self.grid.item(self.grid_rows[table], column).setText(text)
+
+    def start_next(self):
+        # Inicia novas comparações até atingir o limite de tabelas em paralelo
+        while self.pending and len(self.running) < self.max_workers:
+            table = self.pending.pop(0)
+
+            thread = ComparisonThread(self.db1, self.db2, table, "", [], None, self.batch_size, self.checksum_rows,
+                                      self.connect, process_pool=self.process_pool)
+            thread.update_progress.connect(lambda value, table=table: self.set_cell(table, self.PROGRESS_COLUMN, f"{value}%"))
+            thread.comparison_done.connect(lambda result_db1, result_db2, table=table: self.table_done(table, result_db1, result_db2))
+            thread.error_occurred.connect(lambda message, table=table: self.errors.__setitem__(table, message))
+            thread.finished.connect(lambda table=table: self.table_finished(table))
+
+            self.running[table] = thread
+            self.set_cell(table, self.STATUS_COLUMN, "Comparando")
+            thread.start()
+
+        self.update_summary()
+
+    def table_done(self, table, result_db1, result_db2):
+        self.results[table] = (result_db1, result_db2)
+        self.set_cell(table, self.STATUS_COLUMN, "Diferente" if result_db1 or result_db2 else "Igual")
+        self.set_cell(table, self.DB1_COLUMN, str(len(result_db1)))
+        self.set_cell(table, self.DB2_COLUMN, str(len(result_db2)))
+
+    def table_finished(self, table):
+        self.running.pop(table)
+        # A thread termina sem emitir comparison_done quando ocorre um erro
+        if table not in self.results:
+            self.set_cell(table, self.STATUS_COLUMN, self.errors.get(table, "Erro"))
+        self.start_next()
+
+    def cancel_pending(self):
+        for table in self.pending:
+            self.set_cell(table, self.STATUS_COLUMN, "Cancelada")
+        self.pending = []
+        self.update_summary()
+
+    def update_summary(self):
+        self.summary_label.setText(
+            f"{len(self.results)} concluídas, {len(self.running)} em andamento, {len(self.pending)} aguardando "
+            f"(até {self.max_workers} em paralelo)")
+
+    def show_table_result(self, row, column):
+        table = self.grid.item(row, 0).text()
+        if table in self.results and any(self.results[table]):
+            result_db1, result_db2 = self.results[table]
+            ResultDialog(self.db1, self.db2, table, result_db1, result_db2, self.connect).exec_()
+
+    def closeEvent(self, event):
+        # Não inicia novas tabelas e aguarda as que estão em andamento antes de fechar
+        self.cancel_pending()
+        for thread in list(self.running.values()):
+            thread.wait()
+        super().closeEvent(event)
+
+    def reject(self):
+        self.close()
 
-        if self.values_button.isChecked():
-            # Se "Valores" está selecionado, copie os valores com parênteses de abertura e fechamento
-            clipboard.setText("\n".join([f"({row.split('VALUES ')[1][1:-2]});" for row in data]))
-        else:
-            # Caso contrário, copie os dados como "Insert"
-            clipboard.setText("\n".join([f"{str(row)};" for row in data]))
-
-    def update_text_browser(self):
-        # Atualize o conteúdo do QTextBrowser com base na seleção dos botões "Insert" ou "Valores"
-        if self.insert_button.isChecked():
-            self.text_browser_db1.setPlainText("\n".join([f"{str(row)};" for row in self.result_db1]))
-            self.text_browser_db2.setPlainText("\n".join([f"{str(row)};" for row in self.result_db2]))
-        elif self.values_button.isChecked():
-            self.text_browser_db1.setPlainText(
-                "\n".join([f"({row.split('VALUES ')[1][1:-2]});" for row in self.result_db1]))
-            self.text_browser_db2.setPlainText(
-                "\n".join([f"({row.split('VALUES ')[1][1:-2]});" for row in self.result_db2]))
 
 class DatabaseComparer(QMainWindow):
     def __init__(self):
@@ -312,6 +593,12 @@ class DatabaseComparer(QMainWindow):
 
         self.layout = QVBoxLayout()
 
+        # Conexões e listas de tabelas/colunas reaproveitadas entre as operações da sessão
+        self.pool = ConnectionPool()
+        self.catalog = CatalogCache(self.pool.connect)
+        # Processos auxiliares para comparar e formatar as linhas, criados só quando pedidos
+        self.process_pool = None
+
         # Rótulos para as descrições
         label_db1 = QLabel("Selecione o Banco de dados 1:")
         label_db2 = QLabel("Selecione o Banco de dados 2:")
@@ -326,22 +613,80 @@ class DatabaseComparer(QMainWindow):
         self.compare_button = QPushButton("Comparar Tabela")
         self.compare_button.setEnabled(False)  # Inicialmente, desabilite o botão
 
+        # Compara todas as tabelas em comum com várias tabelas em paralelo
+        self.compare_all_button = QPushButton("Comparar Todas as Tabelas")
+        self.compare_all_button.setEnabled(False)
+        # Resultado salvo por "Salvar Resultado", aberto sem consultar os bancos
+        self.open_result_button = QPushButton("Abrir Resultado Salvo")
+        self.max_workers = QSpinBox()
+        self.max_workers.setRange(1, 32)
+        self.max_workers.setValue(4)
+        self.max_workers.setPrefix("Tabelas em paralelo: ")
+        self.multi_table_window = None
+
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
 
+        # Vazão e tempo restante da comparação em andamento
+        self.status_label = QLabel()
+
         self.result_label = QLabel()
         self.layout.addWidget(self.result_label)
 
+        # Tamanho do lote do fetchmany de cada banco, ajustável conforme a rede de cada DSN
+        self.batch_size_db1 = QSpinBox()
+        self.batch_size_db2 = QSpinBox()
+        for spin_box in (self.batch_size_db1, self.batch_size_db2):
+            spin_box.setRange(1, 1000000)
+            spin_box.setSingleStep(1000)
+            spin_box.setValue(DEFAULT_BATCH_SIZE)
+            spin_box.setPrefix("Lote: ")
+            spin_box.setSuffix(" linhas")
+
+        # Pré-verificação por checksum no servidor: faixas iguais nos dois bancos não são lidas
+        self.checksum_rows = QSpinBox()
+        self.checksum_rows.setRange(0, 10000000)
+        self.checksum_rows.setSingleStep(10000)
+        self.checksum_rows.setValue(DEFAULT_CHECKSUM_ROWS)
+        self.checksum_rows.setPrefix("Checksum por faixas de ")
+        self.checksum_rows.setSuffix(" linhas")
+        self.checksum_rows.setSpecialValueText("Checksum desligado")
+
+        # Uma tabela grande pode ser dividida em faixas da chave comparadas em paralelo
+        self.partitions = QSpinBox()
+        self.partitions.setRange(1, 64)
+        self.partitions.setValue(1)
+        self.partitions.setPrefix("Partições da tabela: ")
+        self.max_connections = QSpinBox()
+        self.max_connections.setRange(1, 64)
+        self.max_connections.setValue(DEFAULT_MAX_CONNECTIONS)
+        self.max_connections.setPrefix("Conexões por banco: ")
+        self.processes = QSpinBox()
+        self.processes.setRange(0, max(DEFAULT_PROCESSES, 1))
+        self.processes.setValue(0)
+        self.processes.setPrefix("Processos auxiliares: ")
+        self.processes.setSpecialValueText("Sem processos auxiliares")
+
         # Adicione rótulos e ComboBoxes ao layout
         self.layout.addWidget(label_db1)
         self.layout.addWidget(self.db1_label)
+        self.layout.addWidget(self.batch_size_db1)
         self.layout.addWidget(label_db2)
         self.layout.addWidget(self.db2_label)
+        self.layout.addWidget(self.batch_size_db2)
         self.layout.addWidget(label_table)
         self.layout.addWidget(self.table_label)
+        self.layout.addWidget(self.checksum_rows)
+        self.layout.addWidget(self.partitions)
+        self.layout.addWidget(self.max_connections)
+        self.layout.addWidget(self.processes)
         self.layout.addWidget(self.list_tables_button)
         self.layout.addWidget(self.compare_button)
+        self.layout.addWidget(self.max_workers)
+        self.layout.addWidget(self.compare_all_button)
+        self.layout.addWidget(self.open_result_button)
         self.layout.addWidget(self.progress_bar)
+        self.layout.addWidget(self.status_label)
 
         self.result_db1 = None
         self.result_db2 = None
@@ -366,8 +711,46 @@ class DatabaseComparer(QMainWindow):
 
         self.add_sql_condition_button.clicked.connect(self.add_or_edit_sql_condition)
 
+        # Botão para informar a chave usada no pareamento das linhas
+        self.key_columns_button = QPushButton("Definir Chave (vazio = chave primária)")
+        self.key_columns_button.setEnabled(False)
+        self.layout.addWidget(self.key_columns_button)
+
+        # Colunas da chave informadas pelo usuário
+        self.key_columns = []
+
+        self.key_columns_button.clicked.connect(self.edit_key_columns)
+
+        # Regras por coluna: ignorar, sem maiúsculas, sem espaços, arredondar, truncar datas
+        self.rules_button = QPushButton("Regras de Comparação")
+        self.rules_button.setEnabled(False)
+        self.layout.addWidget(self.rules_button)
+        self.rules = CompareRules()
+        self.rules_button.clicked.connect(self.edit_rules)
+
+        # Coluna de versão: com ela, só as linhas alteradas desde a última comparação são lidas
+        self.watermark_button = QPushButton("Comparação Incremental (coluna de versão)")
+        self.watermark_button.setEnabled(False)
+        self.layout.addWidget(self.watermark_button)
+        self.watermark_column = ""
+        self.watermark_button.clicked.connect(self.edit_watermark_column)
+
+        # Tabelas sem chave que não podem ser ordenadas no servidor
+        self.unordered_checkbox = QCheckBox("Tabela sem chave (compara as linhas inteiras, sem ORDER BY)")
+        self.unordered_checkbox.setEnabled(False)
+        self.layout.addWidget(self.unordered_checkbox)
+
+        # Checkpoint por faixa da chave, para retomar uma comparação longa interrompida
+        self.checkpoint_checkbox = QCheckBox("Checkpoint (reconecta ao perder a conexão e permite retomar)")
+        self.layout.addWidget(self.checkpoint_checkbox)
+        self.resume_button = QPushButton("Retomar Última Comparação")
+        self.layout.addWidget(self.resume_button)
+        self.resume_button.clicked.connect(self.resume_last_comparison)
+
         self.list_tables_button.clicked.connect(self.list_common_tables)
         self.compare_button.clicked.connect(self.compare_table)
+        self.compare_all_button.clicked.connect(self.compare_all_tables)
+        self.open_result_button.clicked.connect(self.open_saved_result)
 
         self.central_widget.setLayout(self.layout)
 
@@ -379,6 +762,28 @@ class DatabaseComparer(QMainWindow):
         if ok:
             self.sql_condition = text
 
+    def edit_key_columns(self):
+        text, ok = QInputDialog.getText(self, "Definir Chave", "Colunas da chave separadas por vírgula:", text=", ".join(self.key_columns))
+        if ok:
+            self.key_columns = [column.strip() for column in text.split(",") if column.strip()]
+
+    def edit_rules(self):
+        text, ok = QInputDialog.getText(self, "Regras de Comparação",
+                                        "Regras por coluna (ex.: nome:case,trim; valor:round=2; data:truncate=minute; obs:ignore):",
+                                        text=str(self.rules))
+        if ok:
+            try:
+                self.rules = CompareRules.parse(text)
+            except ValueError as e:
+                QMessageBox.warning(self, "Aviso", str(e))
+
+    def edit_watermark_column(self):
+        text, ok = QInputDialog.getText(self, "Comparação Incremental",
+                                        "Coluna de versão (rowversion ou data de alteração; vazio = comparação completa):",
+                                        text=self.watermark_column)
+        if ok:
+            self.watermark_column = text.strip()
+
     def populate_dsn_combobox(self, combobox):
         try:
             dsn_list = pyodbc.dataSources()
@@ -391,52 +796,136 @@ class DatabaseComparer(QMainWindow):
         db1 = self.db1_label.currentText()
         db2 = self.db2_label.currentText()
 
-        try:
-            conn1 = pyodbc.connect(f"DSN={db1}")
-            conn2 = pyodbc.connect(f"DSN={db2}")
-
-            cursor1 = conn1.cursor()
-            cursor2 = conn2.cursor()
-
-            tables1 = sorted([row.table_name for row in cursor1.tables(tableType='TABLE')])
-            tables2 = sorted([row.table_name for row in cursor2.tables(tableType='TABLE')])
+        self.table_label.clear()
+        self.list_tables_button.setEnabled(False)
+        self.result_label.setText('Listando tabelas...')
+
+        # Os dois catálogos são lidos ao mesmo tempo, cada um na sua thread; as listas
+        # vêm do cache do catálogo quando possível e as conexões, do pool
+        self.table_matcher = CommonTableMatcher()
+        self.discovery_errors = []
+        self.discovery_threads = [TableDiscoveryThread(self.catalog, side, dsn) for side, dsn in enumerate((db1, db2))]
+        self.pending_discoveries = len(self.discovery_threads)
+        for thread in self.discovery_threads:
+            thread.tables_found.connect(self.add_common_tables)
+            thread.error_occurred.connect(self.discovery_errors.append)
+            thread.finished.connect(self.table_discovery_finished)
+            thread.start()
+
+    def add_common_tables(self, side, tables):
+        # Cada tabela entra no combobox assim que aparece nos dois bancos
+        common_tables = self.table_matcher.add(side, tables)
+        if common_tables:
+            self.table_label.addItems(common_tables)
+            self.result_label.setText(f'{self.table_label.count()} tabelas comuns encontradas...')
 
-            common_tables = sorted(list(set(tables1) & set(tables2)))
+    def table_discovery_finished(self):
+        self.pending_discoveries -= 1
+        if self.pending_discoveries:
+            return
 
-            self.table_label.clear()
-            self.table_label.addItems(common_tables)
+        # Ao final, deixa a lista em ordem sem perder a tabela já escolhida
+        current_table = self.table_label.currentText()
+        self.table_label.clear()
+        self.table_label.addItems(self.table_matcher.common_tables())
+        self.table_label.setCurrentText(current_table)
+        self.list_tables_button.setEnabled(True)
 
+        if self.discovery_errors:
+            self.result_label.setText(f'Erro ao listar tabelas comuns: {"; ".join(self.discovery_errors)}')
+        else:
             self.result_label.setText('Tabelas comuns listadas com sucesso.')
 
-        except pyodbc.Error as e:
-            self.result_label.setText(f'Erro ao listar tabelas comuns: {str(e)}')
-        finally:
-            conn1.close()
-            conn2.close()
-
         self.compare_button.setEnabled(True)
+        self.compare_all_button.setEnabled(True)
         self.add_sql_condition_button.setEnabled(True)
+        self.key_columns_button.setEnabled(True)
+        self.rules_button.setEnabled(True)
+        self.watermark_button.setEnabled(True)
+        self.unordered_checkbox.setEnabled(True)
+        self.checkpoint_checkbox.setEnabled(True)
+        self.resume_button.setEnabled(True)
         self.column_selection_button.setEnabled(True)
     def block_ui(self):
         # Bloqueia todos os botões e ComboBoxes
         self.db1_label.setEnabled(False)
         self.db2_label.setEnabled(False)
+        self.batch_size_db1.setEnabled(False)
+        self.batch_size_db2.setEnabled(False)
         self.table_label.setEnabled(False)
+        self.checksum_rows.setEnabled(False)
+        self.partitions.setEnabled(False)
+        self.max_connections.setEnabled(False)
+        self.processes.setEnabled(False)
         self.list_tables_button.setEnabled(False)
+        self.open_result_button.setEnabled(False)
         self.compare_button.setEnabled(False)
+        self.compare_all_button.setEnabled(False)
+        self.max_workers.setEnabled(False)
         self.add_sql_condition_button.setEnabled(False)
+        self.key_columns_button.setEnabled(False)
+        self.rules_button.setEnabled(False)
+        self.watermark_button.setEnabled(False)
+        self.unordered_checkbox.setEnabled(False)
+        self.checkpoint_checkbox.setEnabled(False)
+        self.resume_button.setEnabled(False)
         self.column_selection_button.setEnabled(False)
 
     def unblock_ui(self):
         # Desbloqueia todos os botões e ComboBoxes
         self.db1_label.setEnabled(True)
         self.db2_label.setEnabled(True)
+        self.batch_size_db1.setEnabled(True)
+        self.batch_size_db2.setEnabled(True)
         self.table_label.setEnabled(True)
+        self.checksum_rows.setEnabled(True)
+        self.partitions.setEnabled(True)
+        self.max_connections.setEnabled(True)
+        self.processes.setEnabled(True)
         self.list_tables_button.setEnabled(True)
+        self.open_result_button.setEnabled(True)
         self.compare_button.setEnabled(True)
+        self.compare_all_button.setEnabled(True)
+        self.max_workers.setEnabled(True)
         self.add_sql_condition_button.setEnabled(True)
+        self.key_columns_button.setEnabled(True)
+        self.rules_button.setEnabled(True)
+        self.watermark_button.setEnabled(True)
+        self.unordered_checkbox.setEnabled(True)
+        self.checkpoint_checkbox.setEnabled(True)
+        self.resume_button.setEnabled(True)
         self.column_selection_button.setEnabled(True)
     def compare_table(self):
+        self.start_comparison(resume=False)
+
+    def resume_last_comparison(self):
+        # Refaz a última comparação interrompida com as mesmas opções, a partir do checkpoint
+        arguments = latest_checkpoint(DEFAULT_CHECKPOINT_DIR)
+        if not arguments:
+            QMessageBox.information(self, "Retomar Comparação", "Nenhuma comparação interrompida encontrada.")
+            return
+        self.db1_label.setCurrentText(arguments["db1"])
+        self.db2_label.setCurrentText(arguments["db2"])
+        if self.table_label.findText(arguments["table_name"]) < 0:
+            self.table_label.addItem(arguments["table_name"])
+        self.table_label.setCurrentText(arguments["table_name"])
+        self.sql_condition = arguments["sql_condition"] or ""
+        self.selected_columns = arguments["selected_columns"] or []
+        self.key_columns = arguments["key_columns"] or []
+        self.rules = arguments["rules"] or CompareRules()
+        batch_size = arguments["batch_size"]
+        batch_sizes = batch_size if isinstance(batch_size, (tuple, list)) else (batch_size, batch_size)
+        self.batch_size_db1.setValue(batch_sizes[0])
+        self.batch_size_db2.setValue(batch_sizes[1])
+        self.checksum_rows.setValue(arguments["checksum_rows"] or 0)
+        self.partitions.setValue(arguments["partitions"])
+        self.max_connections.setValue(arguments["max_connections"])
+        self.watermark_column = ""
+        self.unordered_checkbox.setChecked(False)
+        self.checkpoint_checkbox.setChecked(True)
+        self.start_comparison(resume=True)
+
+    def start_comparison(self, resume):
         db1 = self.db1_label.currentText()
         db2 = self.db2_label.currentText()
         table_name = self.table_label.currentText()
@@ -447,22 +936,76 @@ class DatabaseComparer(QMainWindow):
         self.block_ui()
 
         # Cria uma nova instância da classe ComparisonThread com a condição SQL
-        self.comparison_thread = ComparisonThread(db1, db2, table_name, self.sql_condition, self.selected_columns)
+        self.comparison_thread = ComparisonThread(db1, db2, table_name, self.sql_condition, self.selected_columns, self.key_columns,
+                                                  (self.batch_size_db1.value(), self.batch_size_db2.value()),
+                                                  self.checksum_rows.value(), self.pool.connect, self.rules,
+                                                  self.partitions.value(), self.max_connections.value(),
+                                                  self.get_process_pool(), self.watermark_column,
+                                                  self.unordered_checkbox.isChecked(),
+                                                  self.checkpoint_checkbox.isChecked(), resume)
 
         # Conecta os sinais e slots novamente
         self.comparison_thread.update_progress.connect(self.update_progress)
+        self.comparison_thread.update_status.connect(self.status_label.setText)
+        self.comparison_thread.schema_mismatch.connect(self.show_schema_mismatch)
         self.comparison_thread.comparison_done.connect(self.show_comparison_result)
+        self.comparison_thread.error_occurred.connect(self.show_comparison_error)
         self.comparison_thread.finished.connect(self.unblock_ui)  # Desbloqueia após a conclusão
 
         # Inicializa a barra de progresso com 0
         self.progress_bar.setValue(0)
+        self.status_label.clear()
 
         # Inicia a nova instância da thread
         self.comparison_thread.start()
 
+    def compare_all_tables(self):
+        db1 = self.db1_label.currentText()
+        db2 = self.db2_label.currentText()
+        tables = [self.table_label.itemText(index) for index in range(self.table_label.count())]
+
+        if not tables:
+            QMessageBox.warning(self, "Aviso", "Nenhuma tabela em comum listada.")
+            return
+
+        self.result_label.setText(f'Comparando {len(tables)} tabelas...')
+
+        self.block_ui()
+        self.multi_table_window = MultiTableWindow(db1, db2, tables, self.max_workers.value(),
+                                                   (self.batch_size_db1.value(), self.batch_size_db2.value()),
+                                                   self.checksum_rows.value(), self.pool.connect,
+                                                   self.get_process_pool())
+        self.multi_table_window.exec_()
+        self.unblock_ui()
+
+        self.result_label.setText(f'Comparação de {len(self.multi_table_window.results)} tabelas concluída.')
+
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
+    def show_comparison_error(self, message):
+        if self.checkpoint_checkbox.isChecked():
+            message += "\n\nAs faixas já comparadas foram guardadas; use \"Retomar Última Comparação\" para continuar."
+        self.result_label.setText(message)
+        QMessageBox.critical(self, "Erro", message)
+
+    def show_schema_mismatch(self, message):
+        # As colunas afetadas são comparadas pelo valor, não acusam diferença em cada linha
+        QMessageBox.warning(self, "Estrutura diferente", f"As tabelas têm estrutura diferente nos dois bancos:\n{message}")
+
+    def open_saved_result(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Abrir resultado salvo", "", "Resultado (*.meta)")
+        if not file_path:
+            return
+        try:
+            store = ResultStore.open(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao abrir o resultado: {str(e)}")
+            return
+        db1, db2 = store.names
+        self.result_dialog = ResultDialog(db1, db2, store.table_name, store.db1, store.db2, self.pool.connect)
+        self.result_dialog.exec_()
+
     def show_comparison_result(self, result_db1, result_db2):
         self.result_db1 = result_db1
         self.result_db2 = result_db2
@@ -491,7 +1034,7 @@ class DatabaseComparer(QMainWindow):
 
             if result == QMessageBox.Ok:
                 if result_db1 or result_db2:
-                    self.result_dialog = ResultDialog(db1, db2, table_name, result_db1, result_db2)
+                    self.result_dialog = ResultDialog(db1, db2, table_name, result_db1, result_db2, self.pool.connect)
                     self.result_dialog.exec_()
 
     def open_column_selection_window(self):
@@ -499,17 +1042,15 @@ class DatabaseComparer(QMainWindow):
 
         # Get the list of columns for the selected table
         db1 = self.db1_label.currentText()
-        try:
-            conn1 = pyodbc.connect(f"DSN={db1}")
-            cursor1 = conn1.cursor()
-            cursor1.execute(f"SELECT TOP 1 * FROM {table_name}")
-            columns = [column[0] for column in cursor1.description]
-        except pyodbc.Error as e:
-            QMessageBox.critical(self, "Error", f"Error retrieving columns: {str(e)}")
-            return
-        finally:
-            conn1.close()
-
+        self.column_selection_button.setEnabled(False)
+        self.column_discovery_thread = ColumnDiscoveryThread(self.catalog, db1, table_name)
+        self.column_discovery_thread.columns_found.connect(self.show_column_selection_window)
+        self.column_discovery_thread.error_occurred.connect(
+            lambda message: QMessageBox.critical(self, "Error", f"Error retrieving columns: {message}"))
+        self.column_discovery_thread.finished.connect(lambda: self.column_selection_button.setEnabled(True))
+        self.column_discovery_thread.start()
+
+    def show_column_selection_window(self, table_name, columns):
         self.column_selection_window = ColumnSelectionWindow(table_name, columns)
 
         # Connect the custom columns_selected signal to the handle_column_selection slot
@@ -524,6 +1065,22 @@ class DatabaseComparer(QMainWindow):
         print("Selected columns:", self.selected_columns)
         print("Selected columns as a string:", selected_columns_str)
 
+    def get_process_pool(self):
+        # Recria os processos só quando a quantidade pedida muda
+        processes = self.processes.value()
+        if self.process_pool and self.process_pool.processes != processes:
+            self.process_pool.close()
+            self.process_pool = None
+        if processes and self.process_pool is None:
+            self.process_pool = ProcessPool(processes)
+        return self.process_pool
+
+    def closeEvent(self, event):
+        self.pool.close()
+        if self.process_pool:
+            self.process_pool.close()
+        super().closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     window = DatabaseComparer()
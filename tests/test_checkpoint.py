@@ -0,0 +1,135 @@
+"""Retomada da comparação com checkpoint (comparador.checkpoint), com sqlite3 na memória."""
+import sqlite3
+
+import pytest
+
+from comparador import CheckpointedComparison, Comparison, ONLY_DB1
+
+
+def connect_memory(name):
+    # Bancos compartilhados pelo nome enquanto alguma conexão estiver aberta
+    return sqlite3.connect(f"file:{name}?mode=memory&cache=shared", uri=True, check_same_thread=False)
+
+
+@pytest.fixture
+def databases():
+    connections = [connect_memory(name) for name in ("checkpoint_db1", "checkpoint_db2")]
+    for connection in connections:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT)")
+        connection.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"n{i}") for i in range(1, 1001)])
+        connection.commit()
+    connections[1].execute("UPDATE t SET nome = 'x' WHERE id % 50 = 0")
+    connections[1].commit()
+    yield connections
+    for connection in connections:
+        connection.close()
+
+
+def checkpointed(path, resume=True):
+    return CheckpointedComparison("checkpoint_db1", "checkpoint_db2", "t", key_columns=["id"],
+                                  connect=connect_memory, checkpoint_path=path, checkpoint_ranges=8,
+                                  max_connections=1, resume=resume)
+
+
+def test_resume_reads_rows_inserted_outside_saved_bounds(databases, tmp_path):
+    path = str(tmp_path / "checkpoint")
+    expected = list(Comparison("checkpoint_db1", "checkpoint_db2", "t", key_columns=["id"],
+                               connect=connect_memory))
+
+    # Interrompe depois de todas as faixas concluídas, antes de o checkpoint ser apagado
+    differences = iter(checkpointed(path, resume=False))
+    assert [next(differences) for _ in expected] == expected
+    differences.close()
+
+    databases[0].executemany("INSERT INTO t VALUES (?, ?)", [(5000, "acima"), (-3, "abaixo")])
+    databases[0].commit()
+
+    comparison = checkpointed(path)
+    resumed = list(comparison)
+    fresh = list(Comparison("checkpoint_db1", "checkpoint_db2", "t", key_columns=["id"], connect=connect_memory))
+    assert resumed == fresh
+    assert comparison.counts[ONLY_DB1] == 2
+
+
+def test_resume_reuses_inner_ranges(databases, tmp_path):
+    path = str(tmp_path / "checkpoint")
+    expected = list(Comparison("checkpoint_db1", "checkpoint_db2", "t", key_columns=["id"],
+                               connect=connect_memory))
+    # Interrompe no meio: só as primeiras faixas ficam concluídas
+    differences = iter(checkpointed(path, resume=False))
+    for _ in expected[:len(expected) // 2]:
+        next(differences)
+    differences.close()
+
+    queries = []
+
+    def connect_counting(name):
+        connection = connect_memory(name)
+        connection.set_trace_callback(queries.append)
+        return connection
+
+    comparison = checkpointed(path)
+    comparison.connect = connect_counting
+    assert list(comparison) == expected
+    # A faixa da chave NULL e as duas faixas abertas são refeitas; as internas concluídas, não
+    ranges = len([query for query in queries if "ORDER BY" in query]) // 2
+    assert ranges < len(comparison.state["ranges"])
+
+
+class FlakyConnection:
+    # Conexão cuja leitura cai uma vez, depois de alguns lotes já contados no progresso
+    failures = 1
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self):
+        return FlakyCursor(self.connection.cursor())
+
+    def close(self):
+        self.connection.close()
+
+
+class FlakyCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.fetches = 0
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        if self.fetches == 3 and FlakyConnection.failures:
+            FlakyConnection.failures -= 1
+            raise ConnectionError("conexão perdida")
+        return self.cursor.fetchmany(size)
+
+
+def test_retried_range_is_counted_once(databases, tmp_path):
+    updates = []
+    comparison = CheckpointedComparison("checkpoint_db1", "checkpoint_db2", "t", key_columns=["id"],
+                                        connect=lambda name: FlakyConnection(connect_memory(name)),
+                                        checkpoint_path=str(tmp_path / "checkpoint"), checkpoint_ranges=8,
+                                        max_connections=1, resume=False, batch_size=20, retry_delay=0,
+                                        on_progress=updates.append)
+    FlakyConnection.failures = 1
+    list(comparison)
+    assert FlakyConnection.failures == 0
+    assert updates[-1].processed_rows == updates[-1].total_rows == 2000
+
+
+def test_resumed_run_counts_reused_ranges(databases, tmp_path):
+    path = str(tmp_path / "checkpoint")
+    differences = iter(checkpointed(path, resume=False))
+    for _ in range(10):
+        next(differences)
+    differences.close()
+
+    updates = []
+    comparison = checkpointed(path)
+    comparison.on_progress = updates.append
+    list(comparison)
+    # Sem finish(): o último avanço das faixas já chega ao total
+    assert updates[-2].processed_rows == updates[-2].total_rows == 2000
+    assert updates[-2].percent == 100
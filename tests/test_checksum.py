@@ -0,0 +1,99 @@
+"""Pré-verificação por checksum (comparador.checksum), com sqlite3 na memória.
+
+O sqlite3 recebe as funções do MySQL usadas pelo hash agregado (MD5, CONV,
+CONCAT_WS), de modo que a expressão testada é a mesma enviada ao MySQL.
+"""
+import hashlib
+import sqlite3
+
+import pytest
+
+import comparador.checksum
+from comparador import compare_table
+from comparador.checksum import changed_ranges
+
+
+def concat_ws(separator, *values):
+    return separator.join(str(value) for value in values if value is not None)
+
+
+def connect_mysql_like():
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.create_function("MD5", 1, lambda text: hashlib.md5(str(text).encode()).hexdigest())
+    connection.create_function("CONV", 3, lambda text, base, to_base: str(int(text, base)))
+    connection.create_function("CONCAT_WS", -1, concat_ws)
+    connection.execute("CREATE TABLE t (id INTEGER, a TEXT, b TEXT)")
+    return connection
+
+
+def load(rows1, rows2):
+    connections = [connect_mysql_like(), connect_mysql_like()]
+    for connection, rows in zip(connections, (rows1, rows2)):
+        connection.executemany("INSERT INTO t VALUES (?, ?, ?)", rows)
+    return [connection.cursor() for connection in connections]
+
+
+def ranges(rows1, rows2, min_rows=10, on_skip=None):
+    cursor1, cursor2 = load(rows1, rows2)
+    return list(changed_ranges(cursor1, cursor2, "t", "id", ["id", "a", "b"], "mysql", min_rows=min_rows,
+                               on_skip=on_skip))
+
+
+def covers(key_ranges, key):
+    return any((start is None or start <= key) and (end is None or (key <= end if inclusive else key < end))
+               for start, end, inclusive in key_ranges)
+
+
+ROWS = [(i, f"a{i}", f"b{i}") for i in range(1, 1001)]
+
+
+def test_equal_tables_skip_every_range():
+    skipped = []
+    assert ranges(ROWS, ROWS, on_skip=skipped.append) == []
+    assert sum(skipped) == 2 * len(ROWS)
+
+
+def test_values_swapped_between_rows_of_one_range_are_detected():
+    # Com XOR dos hashes das linhas, trocar os valores de duas linhas mantinha o agregado
+    swapped = [(1, "a2", "b1"), (2, "a1", "b2")] + ROWS[2:]
+    key_ranges = ranges(ROWS, swapped, min_rows=len(ROWS))
+    assert covers(key_ranges, 1) and covers(key_ranges, 2)
+
+
+def test_null_position_is_part_of_the_hash():
+    rows1 = [(500, None, "x")]
+    rows2 = [(500, "x", None)]
+    key_ranges = ranges(ROWS[:499] + rows1 + ROWS[500:], ROWS[:499] + rows2 + ROWS[500:])
+    assert covers(key_ranges, 500)
+    assert not covers(key_ranges, 1) and not covers(key_ranges, 1000)
+
+
+def test_user_key_with_nulls_uses_checksum_and_finds_null_keys(monkeypatch):
+    monkeypatch.setattr(comparador.checksum, "detect_dialect", lambda cursor: "mysql")
+    rows1 = ROWS + [(None, "n1", "x"), (None, "n2", "x")]
+    rows2 = ROWS[:700] + [(701, "mudou", "b701")] + ROWS[701:] + [(None, "n1", "x"), (None, "n3", "x")]
+    expected = list(compare_table(*load(rows1, rows2), "t", key_columns=["id", "a"]))
+
+    skipped = []
+
+    class Progress:
+        def advance(self, rows, size=0):
+            skipped.append(rows)
+
+    cursor1, cursor2 = load(rows1, rows2)
+    queries = []
+    cursor1.connection.set_trace_callback(queries.append)
+    differences = list(compare_table(cursor1, cursor2, "t", key_columns=["id", "a"], checksum_rows=50,
+                                     progress=Progress()))
+    assert differences == expected
+    # As linhas com a chave NULL vêm antes, como em make_key
+    assert [row1 or row2 for _, row1, row2 in differences][:2] == [(None, "n2", "x"), (None, "n3", "x")]
+    assert any("MD5" in query for query in queries)
+    assert len([query for query in queries if "ORDER BY" in query]) < 10
+
+
+@pytest.mark.parametrize("dialect", ["sqlserver", "mysql", "postgresql", "oracle"])
+def test_every_dialect_sums_row_hashes(dialect):
+    cursor1, cursor2 = load([], [])
+    aggregate = comparador.checksum.checksum_aggregate(cursor1, cursor2, "t", ["id", "a"], dialect)
+    assert aggregate.startswith("SUM(") and "XOR" not in aggregate and "CHECKSUM_AGG" not in aggregate
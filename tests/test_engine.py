@@ -0,0 +1,105 @@
+"""Ordem da chave no ORDER BY e no merge join (comparador.engine), com sqlite3 na memória.
+
+O sqlite3 recebe uma collation que imita a ordem nativa do uniqueidentifier do
+SQL Server (os últimos 12 dígitos primeiro) e a Latin1_General_BIN2, de modo
+que o ORDER BY testado é o mesmo enviado ao SQL Server.
+"""
+import sqlite3
+
+import pytest
+
+import comparador.engine
+from comparador import CHANGED, ONLY_DB1, ONLY_DB2, CompareRules, compare_table, fetch_text_columns, key_order
+
+GUIDS = ["6F9619FF-8B86-D011-B42D-00C04FC964FF", "0E984725-C51C-4BF4-9960-E1C80E27ABA0",
+         "A0000000-0000-0000-0000-000000000001", "10000000-0000-0000-0000-0000000000FF"]
+
+
+def guid_order(a, b):
+    # Ordem do SQL Server: o último grupo do GUID decide antes dos primeiros
+    a, b = (value[24:] + value[:24] for value in (a, b))
+    return (a > b) - (a < b)
+
+
+def binary_order(a, b):
+    return (a > b) - (a < b)
+
+
+def connect_sqlserver_like(rows):
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.create_collation("SQLSERVER_GUID", guid_order)
+    connection.create_collation("Latin1_General_BIN2", binary_order)
+    connection.execute("CREATE TABLE t (id TEXT COLLATE SQLSERVER_GUID, nome TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", rows)
+    return connection.cursor()
+
+
+def compare(rows1, rows2):
+    return list(compare_table(connect_sqlserver_like(rows1), connect_sqlserver_like(rows2), "t", key_columns=["id"]))
+
+
+ROWS = [(guid, f"n{i}") for i, guid in enumerate(GUIDS)]
+
+
+def test_native_guid_order_breaks_the_merge():
+    assert sorted(GUIDS) != [row[0] for row in connect_sqlserver_like(ROWS).execute("SELECT id FROM t ORDER BY id")]
+    with pytest.raises(ValueError):
+        compare(ROWS, ROWS[1:])
+
+
+def test_guid_key_is_ordered_by_its_text(monkeypatch):
+    monkeypatch.setattr(comparador.engine, "detect_dialect", lambda cursor: "sqlserver")
+    monkeypatch.setattr(comparador.engine, "fetch_column_types", lambda cursor, table: {"id": "uniqueidentifier"})
+    rows2 = [ROWS[0], (GUIDS[1], "mudou"), ROWS[3]]
+    differences = compare(ROWS, rows2)
+    assert [(kind, (row1 or row2)[0]) for kind, row1, row2 in differences] == [
+        (CHANGED, GUIDS[1]), (ONLY_DB1, GUIDS[2])]
+    assert not any(kind == ONLY_DB2 for kind, _, _ in differences)
+
+
+def test_normalized_key_is_ordered_by_its_expression(monkeypatch):
+    monkeypatch.setattr(comparador.engine, "detect_dialect", lambda cursor: "sqlserver")
+    monkeypatch.setattr(comparador.engine, "common_dialect", lambda cursor1, cursor2: "sqlserver")
+    monkeypatch.setattr(comparador.engine, "fetch_column_types", lambda cursor, table: {"nome": "varchar"})
+    monkeypatch.setattr(comparador.engine, "fetch_text_columns", lambda cursor, table, columns, types: ["nome"])
+    rows1 = [(str(i), name) for i, name in enumerate(["b", "A", "_c", "Z", None])]
+    rows2 = [(str(i), name) for i, name in enumerate(["B", "a", "_C", "y", None])]
+    cursor1, cursor2 = connect_sqlserver_like(rows1), connect_sqlserver_like(rows2)
+    queries = []
+    cursor1.connection.set_trace_callback(queries.append)
+    differences = list(compare_table(cursor1, cursor2, "t", selected_columns=["nome"], key_columns=["nome"],
+                                     rules=CompareRules.parse("nome:case")))
+    assert any("ORDER BY UPPER(nome) COLLATE Latin1_General_BIN2" in query for query in queries)
+    assert [(kind, (row1 or row2)[0]) for kind, row1, row2 in differences] == [(ONLY_DB2, "Y"), (ONLY_DB1, "Z")]
+
+
+@pytest.mark.parametrize("dialect, expected", [
+    ("sqlserver", ["CAST(id AS CHAR(36)) COLLATE Latin1_General_BIN2", "nome COLLATE Latin1_General_BIN2", "doc"]),
+    ("postgresql", ["id NULLS FIRST", 'nome COLLATE "C" NULLS FIRST', "doc NULLS FIRST"]),
+])
+def test_key_order_uses_catalog_types(dialect, expected):
+    column_types = {"id": "uniqueidentifier", "nome": "varchar", "doc": "xml"}
+    assert key_order(["id", "nome", "doc"], dialect, ["nome"], column_types) == expected
+
+
+@pytest.mark.parametrize("dialect, expected", [
+    ("sqlserver", ["UPPER(nome) COLLATE Latin1_General_BIN2"]),
+    ("postgresql", ['UPPER(nome) COLLATE "C" NULLS FIRST']),
+    ("oracle", ["NLSSORT(UPPER(nome), 'NLS_SORT=BINARY') NULLS FIRST"]),
+])
+def test_key_order_applies_to_normalized_expressions(dialect, expected):
+    assert key_order(["nome"], dialect, ["nome"], expressions={"nome": "UPPER(nome)"}) == expected
+
+
+def test_text_columns_skip_types_described_as_str():
+    class Cursor:
+        description = [("id", str), ("nome", str), ("doc", str), ("valor", int)]
+
+        def execute(self, query):
+            pass
+
+        def fetchall(self):
+            return []
+
+    column_types = {"id": "uniqueidentifier", "nome": "nvarchar", "doc": "xml", "valor": "int"}
+    assert fetch_text_columns(Cursor(), "t", ["id", "nome", "doc", "valor"], column_types) == ["nome"]
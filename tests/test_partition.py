@@ -0,0 +1,50 @@
+"""Divisão da chave em partições (comparador.partition), com sqlite3 na memória."""
+import sqlite3
+
+import pytest
+
+import comparador.partition
+from comparador import Comparison, PartitionedComparison
+
+
+def connect_memory(name):
+    return sqlite3.connect(f"file:{name}?mode=memory&cache=shared", uri=True, check_same_thread=False)
+
+
+@pytest.fixture
+def databases():
+    connections = [connect_memory(name) for name in ("partition_db1", "partition_db2")]
+    for connection in connections:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT)")
+        connection.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"n{i}") for i in range(1, 1001)])
+        connection.commit()
+    connections[1].execute("DELETE FROM t WHERE id % 70 = 0")
+    connections[1].commit()
+    yield connections
+    for connection in connections:
+        connection.close()
+
+
+def partitioned(key_columns):
+    comparison = PartitionedComparison("partition_db1", "partition_db2", "t", key_columns=key_columns,
+                                       connect=connect_memory, partitions=4)
+    comparison.open()
+    return comparison
+
+
+def test_numeric_key_is_partitioned(databases):
+    comparison = partitioned(["id"])
+    assert len(comparison.plan_ranges(4)) > 1
+    comparison.release_connections()
+    expected = list(Comparison("partition_db1", "partition_db2", "t", key_columns=["id"], connect=connect_memory))
+    assert list(PartitionedComparison("partition_db1", "partition_db2", "t", key_columns=["id"],
+                                      connect=connect_memory, partitions=4)) == expected
+
+
+def test_text_key_is_not_partitioned(databases, monkeypatch):
+    # O sqlite3 não informa o tipo na descrição: simula o driver que descreve a coluna como str
+    monkeypatch.setattr(comparador.partition, "fetch_text_columns",
+                        lambda cursor, table_name, columns: [column for column in columns if column == "nome"])
+    comparison = partitioned(["nome"])
+    assert comparison.plan_ranges(4) == []
+    comparison.release_connections()
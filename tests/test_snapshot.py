@@ -0,0 +1,73 @@
+"""Comparação incremental pela marca d'água (comparador.snapshot), com sqlite3 na memória."""
+import sqlite3
+
+import pytest
+
+from comparador import Comparison, CompareRules, IncrementalComparison
+
+
+def connect_memory(name):
+    return sqlite3.connect(f"file:{name}?mode=memory&cache=shared", uri=True, check_same_thread=False)
+
+
+# A versão é local de cada banco: fica fora da comparação
+RULES = "versao:ignore"
+
+
+@pytest.fixture
+def databases():
+    connections = [connect_memory(name) for name in ("snapshot_db1", "snapshot_db2")]
+    for connection in connections:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT, versao INTEGER)")
+        connection.executemany("INSERT INTO t VALUES (?, ?, ?)", [(i, f"n{i}", i) for i in range(1, 501)])
+        connection.commit()
+    connections[1].execute("UPDATE t SET nome = 'x' WHERE id % 100 = 0")
+    connections[1].commit()
+    yield connections
+    for connection in connections:
+        connection.close()
+
+
+def incremental(path, updates):
+    return IncrementalComparison("snapshot_db1", "snapshot_db2", "t", key_columns=["id"], connect=connect_memory,
+                                 rules=CompareRules.parse(RULES), snapshot_path=path, watermark_column="versao",
+                                 on_progress=updates.append)
+
+
+def full():
+    return list(Comparison("snapshot_db1", "snapshot_db2", "t", key_columns=["id"], connect=connect_memory,
+                           rules=CompareRules.parse(RULES)))
+
+
+def test_second_run_reads_from_watermark_and_matches_full_comparison(databases, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+    updates = []
+    assert list(incremental(path, updates)) == full()
+    assert updates[-1].total_rows == 1000
+
+    db1, db2 = databases
+    db1.execute("UPDATE t SET nome = 'novo', versao = 1001 WHERE id IN (7, 8)")
+    db1.execute("INSERT INTO t VALUES (600, 'incluída', 1001)")
+    db1.commit()
+    db2.execute("UPDATE t SET nome = 'n100', versao = 1001 WHERE id = 100")
+    db2.execute("DELETE FROM t WHERE id = 9")
+    db2.commit()
+
+    updates = []
+    assert list(incremental(path, updates)) == full()
+    # Só as linhas a partir da marca de cada banco (500): a da própria marca é relida
+    assert updates[-1].total_rows == (1 + 3) + (1 + 1)
+    assert updates[-1].processed_rows <= updates[-1].total_rows
+
+
+def test_changed_signature_counts_whole_table(databases, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+    list(incremental(path, []))
+    databases[0].execute("UPDATE t SET versao = 1001 WHERE id = 1")
+    databases[0].commit()
+
+    updates = []
+    comparison = incremental(path, updates)
+    comparison.sql_condition = "id > 0"
+    assert list(comparison) == full()
+    assert updates[-1].total_rows == 1000
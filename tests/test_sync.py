@@ -0,0 +1,58 @@
+"""Script de sincronização (comparador.sync): literais por SGBD e aplicação em sqlite3."""
+import datetime
+import sqlite3
+
+import pytest
+
+from comparador import compare_table
+from comparador.sync import script_formatter, sync_statements
+
+ROWS = [(1, "simples", b"\x00\x01", 1.5), (2, "aspas ' e barra \\", b"\xff", None), (3, None, None, 2.0)]
+
+
+def connect(rows):
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT, dados BLOB, valor REAL)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", rows)
+    return connection
+
+
+def compare(connection1, connection2, schemas=None):
+    def on_schema(schema1, schema2, key_columns):
+        schemas.extend((schema1, schema2))
+
+    return list(compare_table(connection1.cursor(), connection2.cursor(), "t", concurrent=False,
+                              on_schema=on_schema if schemas is not None else None))
+
+
+def test_script_makes_target_equal_to_source():
+    connection1 = connect(ROWS + [(4, "só no 1", b"'", 0.0)])
+    connection2 = connect([(1, "outro", b"\x00", 1.5), (2, "aspas ' e barra \\", b"\xfe", 3.0), (5, "só no 2", None, None)])
+    schemas = []
+    differences = compare(connection1, connection2, schemas)
+    assert differences
+    for statement in sync_statements(differences, "t", *schemas, ["id"]):
+        connection2.execute(statement)
+    assert compare(connection1, connection2) == []
+
+
+DATETIME = datetime.datetime(2024, 1, 2, 3, 4, 5, 123456)
+
+
+@pytest.mark.parametrize("dialect, type_code, val, expected", [
+    ("postgresql", bool, True, "TRUE"),
+    ("sqlserver", bool, False, "0"),
+    ("postgresql", bytes, b"\x01\xff", "'\\x01ff'::bytea"),
+    ("sqlserver", bytes, b"\x01\xff", "0x01ff"),
+    ("oracle", bytes, b"\x01\xff", "HEXTORAW('01ff')"),
+    (None, bytes, b"\x01\xff", "X'01ff'"),
+    ("mysql", str, "a\\'b", "'a\\\\''b'"),
+    ("postgresql", str, "a\\'b", "'a\\''b'"),
+    ("oracle", datetime.datetime, DATETIME, "TO_TIMESTAMP('2024-01-02 03:04:05.123', 'YYYY-MM-DD HH24:MI:SS.FF3')"),
+    ("sqlserver", datetime.datetime, DATETIME, "'2024-01-02 03:04:05.123'"),
+    ("oracle", datetime.date, DATETIME.date(), "DATE '2024-01-02'"),
+    ("postgresql", datetime.date, DATETIME.date(), "'2024-01-02'"),
+])
+def test_literals_follow_target_dialect(dialect, type_code, val, expected):
+    target_column = ("c", type_code, None, None, None, 3, True)
+    assert script_formatter(type_code, target_column, dialect)(val) == expected